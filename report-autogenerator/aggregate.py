@@ -0,0 +1,137 @@
+import numpy as np
+
+# 集計の次元
+NUM_CATEGORIES = 12          # API分類 1〜12（行0は未分類）
+NUM_DAYS = 5                 # 実習日数（Day1〜Day5、これより多い日があれば自動で拡張）
+
+# API分類の名称定義
+CATEGORY_NAMES = {
+    1: '医療倫理',
+    2: '地域医療',
+    3: '医学的知識',
+    4: '診察・手技',
+    5: '問題解決能力',
+    6: '統合的臨床能力',
+    7: '多職種連携',
+    8: 'コミュニケーション',
+    9: '一般教養',
+    10: '保健・福祉',
+    11: '行政',
+    12: '社会医学'
+}
+
+def _codes(df):
+    """DAYを0始まり、API検証を分類番号の整数コードに変換（分類外・欠損は0=未分類、日の欠損は除外）"""
+    import pandas as pd
+    day = pd.to_numeric(df['DAY'], errors='coerce').to_numpy(dtype=float)
+    category = pd.to_numeric(df['API検証'], errors='coerce').to_numpy(dtype=float)
+    category = np.where((category >= 1) & (category <= NUM_CATEGORIES), category, 0)
+    valid = day >= 1
+    return day[valid].astype(np.int64) - 1, category[valid].astype(np.int64)
+
+def cohort_count_matrices(frames, num_days=None):
+    """
+    全学生の分類×日別の記録数を1回のbincountで集計
+
+    Parameters:
+        frames (list): 学生ごとのDataFrame（DAY・API検証カラムを持つ）
+        num_days (int): 日数（省略時はNUM_DAYSとデータ中の最大日の大きい方）
+
+    Returns:
+        np.ndarray: (学生数, 13, 日数) の整数配列。[s, c, d-1] が学生s・分類c・Day dの記録数
+            （c=0は未分類。分類1〜12は [:, 1:, :] が12×日数の行列）
+    """
+    codes = [_codes(df) for df in frames]
+    if num_days is None:
+        max_day = max((int(day.max()) + 1 for day, _ in codes if len(day)), default=0)
+        num_days = max(NUM_DAYS, max_day)
+
+    # (学生, 分類, 日) を1つの整数コードにまとめて数える
+    student = np.repeat(np.arange(len(codes)), [len(day) for day, _ in codes])
+    day = np.concatenate([d for d, _ in codes]) if codes else np.empty(0, dtype=np.int64)
+    category = np.concatenate([c for _, c in codes]) if codes else np.empty(0, dtype=np.int64)
+    in_range = day < num_days
+    rows = NUM_CATEGORIES + 1
+    combined = (student * rows + category) * num_days + day
+    counts = np.bincount(combined[in_range], minlength=len(codes) * rows * num_days)
+    return counts.reshape(len(codes), rows, num_days)
+
+def count_matrix(df, num_days=None):
+    """1人分の分類×日別の記録数行列 (13, 日数) を作成"""
+    return cohort_count_matrices([df], num_days)[0]
+
+def category_totals(matrix):
+    """分類1〜12ごとの記録数を {分類: 件数} で返す（未分類は含まない）"""
+    return {c: int(n) for c, n in enumerate(matrix.sum(axis=1)) if c >= 1}
+
+def day_totals(matrix):
+    """日ごとの記録数を {日: 件数} で返す（未分類を含む）"""
+    return {d + 1: int(n) for d, n in enumerate(matrix.sum(axis=0))}
+
+# 全体比較に使うパーセンタイル（p50が中央値）
+COHORT_PERCENTILES = (25, 50, 75, 90)
+
+def cohort_summary(matrices, percentiles=COHORT_PERCENTILES):
+    """
+    全学生の記録数行列から、学生間の平均・パーセンタイルを1回で計算
+
+    Parameters:
+        matrices (np.ndarray): cohort_count_matricesの戻り値 (学生数, 13, 日数)
+
+    Returns:
+        dict: JSONにできる形式（学生がいなければNone）
+            'students': 人数
+            'cell': 分類×日ごとの記録数の分布 {'mean': 13×日数, 'p25': ..., 'p50': ...}
+            'category': 分類ごとの記録数の分布（長さ13、0は未分類）
+            'day': 日ごとの記録数の分布（未分類を含む）
+            'total': 1人あたりの総記録数の分布
+            'classified': 1人あたりの分類1〜12の記録数の分布（未分類を除く）
+    """
+    if len(matrices) == 0:
+        return None
+
+    def describe(values):
+        stats = {'mean': values.mean(axis=0)}
+        for p, v in zip(percentiles, np.percentile(values, percentiles, axis=0)):
+            stats[f'p{p}'] = v
+        return {k: np.round(v, 3).tolist() for k, v in stats.items()}
+
+    return {
+        'students': len(matrices),
+        'cell': describe(matrices),
+        'category': describe(matrices.sum(axis=2)),
+        'day': describe(matrices.sum(axis=1)),
+        'total': describe(matrices.sum(axis=(1, 2))),
+        'classified': describe(matrices[:, 1:, :].sum(axis=(1, 2))),
+    }
+
+def cohort_category_values(summary, stat='mean'):
+    """全体の分類1〜12ごとの値を {分類: 値} で返す（レーダーチャートの比較線用）"""
+    return {c: v for c, v in enumerate(summary['category'][stat]) if c >= 1}
+
+# 全体の統計のうち各資料が表示する値 (統計の種類, 値)
+COHORT_FIELDS = {
+    'radar': (('category', 'mean'),),
+    'stats': (
+        ('category', 'mean'), ('category', 'p50'), ('day', 'mean'),
+        ('total', 'mean'), ('classified', 'mean'), ('classified', 'p50'),
+    ),
+}
+
+# 全体の統計を表示する桁数（統計PDFの表は小数1桁）
+COHORT_DIGITS = 1
+
+def displayed_cohort(summary, view):
+    """
+    全体の統計（cohort_summaryの戻り値）から資料（'radar' または 'stats'）が表示する値だけを取り出す
+
+    値は表示の桁数に丸める。一括生成・各スクリプトの単独実行・全体版PDFで同じ値を表示し、
+    一括生成では成果物の入力キーにもこの値を使う（キーが同じなら出力も同じになる）
+    """
+    shown = {}
+    for group, stat in COHORT_FIELDS[view]:
+        value = summary[group][stat]
+        shown.setdefault(group, {})[stat] = (
+            [round(v, COHORT_DIGITS) for v in value] if isinstance(value, list) else round(value, COHORT_DIGITS)
+        )
+    return shown
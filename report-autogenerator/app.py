@@ -1,23 +1,27 @@
 import streamlit as st
 import pandas as pd
-from pptx import Presentation
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-import tempfile
+import hashlib
+import io
 import os
+import threading
+import time
+from quality import PROFILES, DEFAULT_PROFILE
+from aggregate import CATEGORY_NAMES
 
-st.title('Excel発表資料自動生成ツール')
+# 一括生成・全文検索などで使うモジュール（pipeline・reportlab・MeCabなど）は、
+# アップロード画面の表示を遅くしないよう使うときに読み込む
 
-uploaded_file = st.file_uploader('Excelファイルをアップロードしてください', type=['xlsx'])
+# 解析済みワークブックを保持する件数（古いものから破棄）
+MAX_CACHED_UPLOADS = 8
 
-if uploaded_file:
-    # Excelファイルの読み込み
-    df = pd.read_excel(uploaded_file)
-    st.write('アップロードされたデータ:')
-    st.dataframe(df)
+@st.cache_data(max_entries=MAX_CACHED_UPLOADS, show_spinner='Excelファイルを読み込み中...')
+def load_upload(file_hash, _data):
+    """アップロードされたExcelを解析（同じ内容のファイルは1回だけ解析する）"""
+    return pd.read_excel(io.BytesIO(_data))
 
-    # PPT生成
-    pptx_path = os.path.join(tempfile.gettempdir(), 'output.pptx')
+def build_pptx(df):
+    """PPTXを生成してバイト列で返す"""
+    from pptx import Presentation
     prs = Presentation()
     slide = prs.slides.add_slide(prs.slide_layouts[5])
     title = slide.shapes.title
@@ -25,20 +29,220 @@ if uploaded_file:
     # 1行目をテキストとして追加
     text = '\n'.join([str(row) for row in df.iloc[0]])
     slide.shapes.add_textbox(100, 100, 500, 300).text = text
-    prs.save(pptx_path)
-    with open(pptx_path, 'rb') as f:
-        st.download_button('PPTXダウンロード', f, file_name='output.pptx')
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
 
-    # PDF生成
-    pdf_path = os.path.join(tempfile.gettempdir(), 'output.pdf')
-    c = canvas.Canvas(pdf_path, pagesize=A4)
+def build_pdf(df):
+    """PDFを生成してバイト列で返す"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
     c.drawString(100, 800, '自動生成PDF')
     for i, row in enumerate(df.values.tolist()[:10]):
         c.drawString(100, 780 - i*20, str(row))
     c.save()
-    with open(pdf_path, 'rb') as f:
-        st.download_button('PDFダウンロード', f, file_name='output.pdf')
+    return buffer.getvalue()
+
+def build_csv(df):
+    """rawデータ（CSV）をバイト列で返す"""
+    return df.to_csv(index=False).encode('utf-8')
+
+@st.cache_resource
+def job_manager():
+    """全セッションで共有するジョブ管理（サーバープロセスに1つ）"""
+    from jobs import JobManager
+    return JobManager()
+
+@st.cache_resource
+def search_index(path):
+    """記録ストアごとの全文検索索引（MeCabと読み込んだ転置リストを全セッションで共有）と排他用のロック"""
+    from search_index import SearchIndex
+    return SearchIndex(path), threading.Lock()
+
+def read_file(path):
+    """ダウンロードボタンが押されたときにファイルを読む関数を返す"""
+    def get():
+        with open(path, 'rb') as f:
+            return f.read()
+    return get
+
+# タスクの状態の表示
+TASK_LABELS = {
+    'pending': '待機中',
+    'running': '実行中',
+    'done': '完了',
+    'cached': '完了（前回の結果）',
+    'failed': '失敗',
+    'skipped': 'スキップ',
+    'cancelled': 'キャンセル',
+}
+
+PROFILE_LABELS = {
+    'preview': '下書き（高速）',
+    'screen': '画面表示',
+    'print': '印刷',
+}
+
+JOB_LABELS = {
+    'queued': '順番待ち',
+    'running': '実行中',
+    'done': '完了',
+    'failed': '失敗',
+    'cancelled': 'キャンセル',
+}
+
+@st.fragment(run_every=1.0)
+def show_job_progress(job):
+    """ジョブの進捗を1秒ごとに更新して表示"""
+    students, finished, total = job.progress()
+    st.write(f'状態: {JOB_LABELS[job.status]}')
+    st.progress(finished / total if total else 0.0, text=f'{finished}/{total} タスク')
+    if students:
+        table = pd.DataFrame.from_dict(
+            {sheet: {stage: TASK_LABELS[state] for stage, state in stages.items()}
+             for sheet, stages in students.items()},
+            orient='index',
+        )
+        st.dataframe(table)
+    if not job.finished and st.button('キャンセル'):
+        job.cancel()
+    if job.finished:
+        # 結果の表示に切り替えるためページ全体を再実行
+        st.rerun()
+
+def bundle_zip(job):
+    """ボタンが押されたときにジョブの成果物を学生別フォルダのZIPにまとめる関数を返す"""
+    def get():
+        from bundle import write_bundle
+        path = os.path.join(job.work_dir, 'output.zip')
+        write_bundle(path, job.output_dir)
+        with open(path, 'rb') as f:
+            return f.read()
+    return get
+
+def cohort_pdf(job):
+    """ボタンが押されたときに全学生の統計・レポートをしおり付きの1つのPDFにまとめる関数を返す"""
+    def get():
+        from cohort_pdf import write_cohort_pdfs
+        path, = write_cohort_pdfs(job.data_dir, job.work_dir, profile=job.profile)
+        with open(path, 'rb') as f:
+            return f.read()
+    return get
+
+def show_job_results(job):
+    """完了したジョブの学生別の成果物をダウンロードできるようにする"""
+    st.write(f'状態: {JOB_LABELS[job.status]}')
+    if job.error:
+        st.error(job.error)
+    for sheet, stage, error in job.failed:
+        with st.expander(f'失敗: {sheet} - {stage}'):
+            st.code(error)
+    results = job.results()
+    if not results:
+        return
+    st.download_button('全学生の成果物(ZIP)ダウンロード', bundle_zip(job), file_name='output.zip',
+                       key=f'{job.id}/zip', on_click='ignore')
+    st.download_button('全学生の統合PDFダウンロード', cohort_pdf(job), file_name='cohort.pdf',
+                       key=f'{job.id}/cohort', on_click='ignore')
+    sheet = st.selectbox('学生', sorted(results))
+    for path in results[sheet]:
+        name = os.path.basename(path)
+        st.download_button(name, read_file(path), file_name=name, key=f'{job.id}/{name}', on_click='ignore')
+    show_entry_filter(job)
+    show_entry_search(job)
+
+def show_entry_filter(job):
+    """ジョブで取り込んだ全学生の記録を日・分類で絞り込んで表示（記録ストアの索引で必要な行だけ読む）"""
+    from data_ingest import frame_memory
+    from entry_store import EntryStore, default_store_path
+    path = default_store_path(job.data_dir)
+    if not os.path.exists(path):
+        return
+    with st.expander('記録の絞り込み'):
+        day = st.selectbox('日', [None, 1, 2, 3, 4, 5], format_func=lambda d: 'すべて' if d is None else f'Day {d}',
+                           key=f'{job.id}/day')
+        category = st.selectbox('API分類', [None] + list(CATEGORY_NAMES), key=f'{job.id}/category',
+                                format_func=lambda c: 'すべて' if c is None else f'{c}: {CATEGORY_NAMES[c]}')
+        with EntryStore(path, readonly=True) as store:
+            entries = store.entries(day=day, category=category)
+        st.write(f'{len(entries)}件（メモリ {sum(frame_memory(entries).values()) / 1024:,.0f}KB）')
+        st.dataframe(entries, hide_index=True)
+
+def show_entry_search(job):
+    """ジョブで取り込んだ全学生の記録を入力内容で全文検索（BM25の順位で表示）"""
+    from entry_store import default_store_path
+    path = default_store_path(job.data_dir)
+    if not os.path.exists(path):
+        return
+    with st.expander('記録の全文検索'):
+        query = st.text_input('検索語', placeholder='例: 在宅', key=f'{job.id}/query')
+        if not query:
+            return
+        index, lock = search_index(path)
+        with lock:
+            with st.spinner('索引を更新中...'):
+                # Streamlitのプロセスからはワーカープロセスを起動しない
+                index.update(workers=1)
+            start = time.perf_counter()
+            hits = index.search(query)
+            elapsed = (time.perf_counter() - start) * 1000
+        st.write(f'{len(hits)}件（{elapsed:.0f}ms）')
+        hits = hits.drop(columns='source').rename(columns={'student': '学生', 'score': 'スコア'})
+        hits['API検証'] = hits['API検証'].map(lambda c: CATEGORY_NAMES.get(c, c))
+        st.dataframe(hits, hide_index=True)
+
+def lazy_artifact(file_hash, kind, builder, df):
+    """
+    ダウンロードボタンが押されたときに初めて生成する関数を返す
+
+    生成結果はこのセッションのメモリ上にだけ保持する（他のユーザーと共有しない）
+    """
+    artifacts = st.session_state.setdefault('artifacts', {})
+    # 別のファイルに切り替えたら前のファイルの成果物は破棄
+    for key in [k for k in artifacts if k[0] != file_hash]:
+        del artifacts[key]
+
+    def get():
+        key = (file_hash, kind)
+        if key not in artifacts:
+            artifacts[key] = builder(df)
+        return artifacts[key]
+    return get
+
+st.title('Excel発表資料自動生成ツール')
+
+uploaded_file = st.file_uploader('Excelファイルをアップロードしてください', type=['xlsx'])
+
+if uploaded_file:
+    # Excelファイルの読み込み（内容のハッシュでキャッシュ）
+    data = uploaded_file.getvalue()
+    file_hash = hashlib.sha256(data).hexdigest()
+    df = load_upload(file_hash, data)
+    st.write('アップロードされたデータ:')
+    st.dataframe(df)
+
+    # 各資料はボタンが押されたときに生成（再実行のたびには作らない）
+    st.download_button('PPTXダウンロード', lazy_artifact(file_hash, 'pptx', build_pptx, df),
+                       file_name='output.pptx', on_click='ignore')
+    st.download_button('PDFダウンロード', lazy_artifact(file_hash, 'pdf', build_pdf, df),
+                       file_name='output.pdf', on_click='ignore')
+    st.download_button('rawデータ(CSV)ダウンロード', lazy_artifact(file_hash, 'csv', build_csv, df),
+                       file_name='output.csv', on_click='ignore')
+
+    # 全学生の成果物をバックグラウンドで生成（ページを離れても処理は続く）
+    st.subheader('全学生の資料を一括生成')
+    profile = st.radio('出力品質', list(PROFILES), index=list(PROFILES).index(DEFAULT_PROFILE), horizontal=True,
+                       format_func=PROFILE_LABELS.get)
+    if st.button('全学生の資料を生成'):
+        job = job_manager().submit(uploaded_file.name, data, profile=profile)
+        st.session_state['job_id'] = job.id
 
-    # rawデータ（CSV）
-    csv = df.to_csv(index=False).encode('utf-8')
-    st.download_button('rawデータ(CSV)ダウンロード', csv, file_name='output.csv')
+# ジョブを投入していないセッションではジョブ管理（pipeline）を読み込まない
+job = job_manager().get(st.session_state['job_id']) if 'job_id' in st.session_state else None
+if job is not None:
+    if job.finished:
+        show_job_results(job)
+    else:
+        show_job_progress(job)
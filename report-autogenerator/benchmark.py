@@ -0,0 +1,223 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from data_ingest import BASE_DIR, load_json, write_json
+from instrument import peak_rss_mb
+from quality import PROFILES, DEFAULT_PROFILE
+
+# 前回保存した測定結果（比較の基準）
+BASELINE_PATH = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+
+# 合成ワークブックの置き場所（同じ条件なら作り直さない）
+BENCH_DIR = os.path.join(BASE_DIR, '.cache', 'bench')
+
+# 測定するステージ（実行順）
+BENCH_STAGES = ('ingest', 'aggregate', 'radar', 'stats', 'report', 'wordcloud')
+
+# 基準よりこの倍率以上遅い・メモリが多い場合を劣化とみなす
+DEFAULT_THRESHOLD = 1.25
+
+def _store_sheets(store_path, sample=None):
+    """ingestで作った記録ストアから学生ごとの (シート名, DataFrame) を読む（sampleで人数を絞れる）"""
+    from entry_store import EntryStore
+    with EntryStore(store_path, readonly=True) as store:
+        students = list(store.students().items())[:sample]
+        return [(sheet, store.entries(sheet, sources=[source])) for sheet, (source, _) in students]
+
+def _measure(stage, workbook, work_dir, sample, profile=None):
+    """
+    1ステージを測定（ステージごとに新しいプロセスで実行され、最大メモリが混ざらない）
+
+    入力の読み込みとライブラリのimportは測定に含めない
+
+    Returns:
+        dict: 経過時間・CPU時間・処理件数・最大メモリ
+    """
+    cache_dir = os.path.join(work_dir, 'sheets')
+    store_path = os.path.join(work_dir, 'entries.sqlite3')
+    out_dir = os.path.join(work_dir, 'output', stage)
+    os.makedirs(out_dir, exist_ok=True)
+
+    if stage == 'ingest':
+        import pandas  # noqa: F401
+        from entry_store import EntryStore
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(store_path + suffix):
+                os.remove(store_path + suffix)
+        # ワークブックの解析（シートのキャッシュ作成）と記録ストアへの取り込みを合わせて測る
+        def run():
+            with EntryStore(store_path) as store:
+                return store.ingest(workbook, cache_dir)
+    elif stage == 'aggregate':
+        from aggregate import cohort_count_matrices
+        frames = [df for _, df in _store_sheets(store_path)]
+        run = lambda: len(cohort_count_matrices(frames))
+    else:
+        from aggregate import count_matrix, category_totals
+        sheets = _store_sheets(store_path, sample)
+        if stage == 'radar':
+            import radar_chart
+            from fonts import setup_matplotlib_font
+            setup_matplotlib_font()
+            def run():
+                for sheet, df in sheets:
+                    radar_chart.create_radar_chart(category_totals(count_matrix(df)), sheet, out_dir, profile=profile)
+                return len(sheets)
+        elif stage == 'stats':
+            import stats_analysis
+            import radar_chart  # noqa: F401
+            from fonts import register_pdf_font
+            register_pdf_font()
+            def run():
+                for sheet, df in sheets:
+                    stats_analysis.create_stats_report(df, sheet, os.path.join(out_dir, f'{sheet}_stats.pdf'),
+                                                       profile=profile)
+                return len(sheets)
+        elif stage == 'report':
+            import pdf_report
+            from fonts import register_pdf_font
+            register_pdf_font()
+            def run():
+                for sheet, df in sheets:
+                    pdf_report.create_pdf_report(df, sheet, os.path.join(out_dir, f'{sheet}_report.pdf'), profile)
+                return len(sheets)
+        elif stage == 'wordcloud':
+            import MeCab
+            import word_cloud
+            from fonts import setup_matplotlib_font
+            from tokenizer import TokenCache, dictionary_version
+            setup_matplotlib_font()
+            mecab = MeCab.Tagger()
+            # 形態素解析の時間も測るため、空のトークンキャッシュを使う
+            cache = TokenCache(dictionary_version(mecab), path=os.path.join(work_dir, 'tokens.sqlite3'))
+            def run():
+                for sheet, df in sheets:
+                    word_cloud.create_student_wordclouds(df, sheet, out_dir, mecab, cache, profile=profile)
+                return len(sheets)
+        else:
+            raise ValueError(f'不明なステージ: {stage}')
+
+    rss_before = peak_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    items = run()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {
+        'wall_seconds': round(wall, 4),
+        'cpu_seconds': round(cpu, 4),
+        'items': items,
+        'per_item_ms': round(wall * 1000 / items, 3) if items else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+    }
+
+def prepare_workbook(students, entries, seed):
+    """合成ワークブックを用意（同じ条件のものがあれば再利用）"""
+    from synth_data import generate_workbook
+    path = os.path.join(BENCH_DIR, f'synthetic_s{students}_e{entries}_seed{seed}.xlsx')
+    if not os.path.exists(path):
+        print(f'合成ワークブックを作成中: {students}人 x {entries}件')
+        tmp_path = path + '.tmp.xlsx'
+        generate_workbook(tmp_path, students, entries, seed)
+        os.replace(tmp_path, path)
+    return path
+
+def run_benchmark(workbook, stages=BENCH_STAGES, sample=10, profile=None):
+    """
+    各ステージを別々のプロセスで順に測定
+
+    Parameters:
+        workbook (str): 測定に使うワークブック
+        stages (iterable): 測定するステージ（ingest以外はingestで作った記録ストアを読む）
+        sample (int): 描画系ステージ（radar・stats・report・wordcloud）で処理する学生数
+        profile (str): 描画系ステージの出力品質のプロファイル名（省略時は印刷用）
+
+    Returns:
+        dict: {ステージ: 測定結果}
+    """
+    work_dir = tempfile.mkdtemp(prefix='multas_bench_')
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    try:
+        # ingestを測らない場合も、他のステージのために記録ストアは作る
+        for stage in ['ingest'] + [s for s in stages if s != 'ingest']:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(_measure, stage, workbook, work_dir, sample, profile).result()
+            if stage in stages:
+                results[stage] = result
+                print(f'{stage:10s} {result["wall_seconds"]:8.3f}s  CPU {result["cpu_seconds"]:8.3f}s  '
+                      f'{result["items"]:6d}件  最大メモリ {result["peak_rss_mb"]:8.1f}MB')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    基準の測定結果と比較
+
+    Returns:
+        list: 劣化した項目の説明
+    """
+    regressions = []
+    for stage, result in results.items():
+        base = baseline.get(stage)
+        if base is None:
+            continue
+        for metric in ('per_item_ms', 'peak_rss_mb'):
+            if not base.get(metric) or result.get(metric) is None:
+                continue
+            ratio = result[metric] / base[metric]
+            mark = '劣化' if ratio >= threshold else ''
+            print(f'{stage:10s} {metric:12s} {base[metric]:10.2f} -> {result[metric]:10.2f} ({ratio:5.2f}倍) {mark}')
+            if ratio >= threshold:
+                regressions.append(f'{stage} {metric}: {base[metric]} -> {result[metric]} ({ratio:.2f}倍)')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合成データで各ステージの処理時間と最大メモリを測定')
+    parser.add_argument('--students', type=int, default=200, help='合成ワークブックの学生数')
+    parser.add_argument('--entries', type=int, default=100, help='1人あたりの記録数')
+    parser.add_argument('--seed', type=int, default=0, help='合成データの乱数シード')
+    parser.add_argument('--workbook', default=None, help='合成データの代わりに使うワークブック')
+    parser.add_argument('--stages', default=','.join(BENCH_STAGES),
+                        help=f'測定するステージ（カンマ区切り）: {",".join(BENCH_STAGES)}')
+    parser.add_argument('--sample', type=int, default=10, help='描画系ステージで処理する学生数')
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE,
+                        help='描画系ステージの出力品質のプロファイル（基準と比べる場合は同じものを使う）')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='比較する基準の測定結果')
+    parser.add_argument('--save-baseline', action='store_true', help='今回の結果を基準として保存')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='基準に対してこの倍率以上なら劣化とみなす')
+    args = parser.parse_args(argv)
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    for stage in stages:
+        if stage not in BENCH_STAGES:
+            parser.error(f'不明なステージ: {stage}')
+    workbook = args.workbook or prepare_workbook(args.students, args.entries, args.seed)
+    results = run_benchmark(workbook, stages, args.sample, args.profile)
+
+    if args.save_baseline:
+        baseline = load_json(args.baseline, {})
+        baseline.update(results)
+        write_json(args.baseline, baseline)
+        print(f'基準を保存しました: {args.baseline}')
+        return 0
+
+    baseline = load_json(args.baseline, None)
+    if baseline is None:
+        print('基準の測定結果がありません（--save-baseline で保存できます）')
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f'劣化: {line}', file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import argparse
+import os
+import re
+import sys
+import zipfile
+from manifest import Manifest, MANIFEST_NAME
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# 1回に読み込んで書き出すサイズ
+CHUNK_SIZE = 1024 * 1024
+
+# すでに圧縮されている形式は再圧縮せずにそのまま格納する
+STORED_EXTENSIONS = ('.png', '.pdf')
+
+# manifest.jsonに記録されていない出力からシート名を取り出す（{シート名}_xxx.pdf など）
+ARTIFACT_PATTERN = re.compile(r'^(?P<sheet>.+?)_(report\.pdf|stats\.pdf|radar\.png|category\d+_wordcloud\.png)$')
+
+def student_artifacts(output_dir=OUTPUT_DIR):
+    """
+    出力フォルダの成果物を学生ごとにまとめる
+
+    manifest.jsonの記録を優先し、記録のないファイル（各スクリプトを直接実行した場合など）は
+    ファイル名からシート名を判定する
+
+    Returns:
+        dict: {シート名: [ファイル名, ...]}
+    """
+    owner = {}
+    for sheet, stages in Manifest(output_dir).data['students'].items():
+        for entry in stages.values():
+            for name in entry['outputs']:
+                owner[name] = sheet
+
+    students = {}
+    for name in sorted(os.listdir(output_dir)) if os.path.isdir(output_dir) else []:
+        if name == MANIFEST_NAME or not os.path.isfile(os.path.join(output_dir, name)):
+            continue
+        sheet = owner.get(name)
+        if sheet is None:
+            match = ARTIFACT_PATTERN.match(name)
+            if match is None:
+                continue
+            sheet = match.group('sheet')
+        students.setdefault(sheet, []).append(name)
+    return students
+
+class _ChunkBuffer:
+    """ZipFileの書き込み先（シークできないストリームとして扱われ、書かれた分を順に取り出せる）"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def iter_zip(files, chunk_size=CHUNK_SIZE):
+    """
+    ZIPファイルの内容を少しずつ生成する（全体をメモリに載せない）
+
+    Parameters:
+        files (iterable): (ZIP内のパス, ファイルパス) の組
+
+    Yields:
+        bytes: ZIPファイルの一部
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for arcname, path in files:
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            if path.lower().endswith(STORED_EXTENSIONS):
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as src, zf.open(info, 'w') as dst:
+                while True:
+                    data = src.read(chunk_size)
+                    if not data:
+                        break
+                    dst.write(data)
+                    chunk = buffer.take()
+                    if chunk:
+                        yield chunk
+            chunk = buffer.take()
+            if chunk:
+                yield chunk
+    # 末尾のセントラルディレクトリ
+    yield buffer.take()
+
+def bundle_files(output_dir=OUTPUT_DIR, students=None):
+    """学生ごとのフォルダに分けたZIP内のパスと実ファイルの一覧（studentsで対象を絞り込める）"""
+    files = []
+    for sheet, names in student_artifacts(output_dir).items():
+        if students is not None and sheet not in students:
+            continue
+        files.extend((f'{sheet}/{name}', os.path.join(output_dir, name)) for name in names)
+    return files
+
+def write_bundle(dest_path, output_dir=OUTPUT_DIR, students=None):
+    """成果物のZIPをファイルに書き出す"""
+    files = bundle_files(output_dir, students)
+    tmp_path = dest_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for chunk in iter_zip(files):
+            f.write(chunk)
+    os.replace(tmp_path, dest_path)
+    return len(files)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='学生ごとの成果物を1つのZIPファイルにまとめる')
+    parser.add_argument('dest', nargs='?', default='output.zip', help='書き出すZIPファイル')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='成果物のフォルダ')
+    parser.add_argument('--students', default=None, help='対象のシート名（カンマ区切り、既定: 全員）')
+    args = parser.parse_args(argv)
+
+    students = None
+    if args.students:
+        students = {s.strip() for s in args.students.split(',') if s.strip()}
+    count = write_bundle(args.dest, args.output_dir, students)
+    print(f'{count}ファイルを {args.dest} にまとめました')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
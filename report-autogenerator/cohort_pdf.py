@@ -0,0 +1,197 @@
+import argparse
+import os
+import sys
+import time
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, PageBreak, Flowable
+from data_ingest import DATA_DIR
+from entry_store import ingest_workbooks, class_year
+from fonts import register_pdf_font
+from instrument import span
+from quality import PROFILES, DEFAULT_PROFILE, get_profile
+
+# 出力フォルダ
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# 全体版PDFに含める資料（順番どおりに1人分ずつ並べる）
+SECTIONS = ('stats', 'report')
+SECTION_TITLES = {'stats': '統計', 'report': '記録'}
+
+class Bookmark(Flowable):
+    """しおり（アウトライン）の項目を置く大きさのないflowable"""
+
+    def __init__(self, key, title, level=0):
+        super().__init__()
+        self.key = key
+        self.title = title
+        self.level = level
+
+    def wrap(self, availWidth, availHeight):
+        return 0, 0
+
+    def draw(self):
+        self.canv.bookmarkPage(self.key)
+        self.canv.addOutlineEntry(self.title, self.key, self.level, closed=True)
+
+def _build_per_student(doc, stories):
+    """
+    学生ごとのflowable一覧を順に描画して1つのPDFにする（doc.buildの代わり）
+
+    doc.buildは全体のflowableのリストを受け取るため、1人分ずつ作って描画し、
+    描画し終えたら次の学生の分を作る。しおりはPDFを開いたときに表示する
+    """
+    doc._startBuild()
+    doc.canv.showOutline()
+    # 表の分割などでflowableが描画中の文書を参照する（doc.buildと同じ）
+    doc.canv._doctemplate = doc
+    try:
+        for story in stories:
+            # handle_flowableは先頭のflowableを描画して取り除く（分割した残りは先頭に戻す）
+            while story:
+                doc.clean_hanging()
+                doc.handle_flowable(story)
+    finally:
+        del doc.canv._doctemplate
+    doc._endBuild()
+
+def create_cohort_pdf(students, output_path, cohort=None, sections=SECTIONS, profile=None):
+    """
+    複数の学生の統計PDF・レポートPDFを1つのPDFにまとめて生成
+
+    フォントと段落スタイルは文書全体で1回だけ登録・埋め込みされる。
+    学生ごとのflowableは描画する直前に作るため、学生数が多くてもflowableは1人分しか保持しない
+
+    Parameters:
+        students (iterable): (シート名, DataFrame, 各日の日付) の並び（ジェネレータでもよい）
+        output_path (str): 出力PDFのパス
+        cohort (dict): 全体の統計（aggregate.cohort_summaryの戻り値）。統計ページに全体平均などを併記する
+        sections (tuple): 含める資料（SECTIONS参照）
+        profile (str): 出力品質のプロファイル名（quality.PROFILES参照、省略時は印刷用）
+
+    Returns:
+        int: まとめた学生数
+    """
+    from aggregate import count_matrix
+    from pdf_report import add_report_styles, report_table_style, create_report_story
+    from stats_analysis import add_stats_styles, create_stats_story
+
+    register_pdf_font()
+    doc = BaseDocTemplate(
+        output_path,
+        pagesize=A4,
+        rightMargin=25*mm,
+        leftMargin=25*mm,
+        topMargin=20*mm,
+        bottomMargin=20*mm,
+        title=os.path.splitext(os.path.basename(output_path))[0],
+        pageCompression=get_profile(profile)['page_compression'],
+    )
+    doc.addPageTemplates([
+        PageTemplate(id='cohort', frames=[Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height)])
+    ])
+    styles = add_report_styles(add_stats_styles(getSampleStyleSheet()))
+    table_style = report_table_style()
+    count = 0
+
+    def stories():
+        nonlocal count
+        for index, (sheet, df, day_dates) in enumerate(students):
+            story = [] if index == 0 else [PageBreak()]
+            story.append(Bookmark(f's{index}', sheet, 0))
+            for i, section in enumerate(sections):
+                if i > 0:
+                    story.append(PageBreak())
+                story.append(Bookmark(f's{index}_{section}', SECTION_TITLES[section], 1))
+                if section == 'stats':
+                    # 全体版ではレーダーチャートは常にベクター図形で描く（PNGを読み込まない）
+                    story.extend(create_stats_story(
+                        count_matrix(df), sheet, None, styles, doc.width, 'vector', cohort
+                    ))
+                else:
+                    story.extend(create_report_story(df, sheet, styles, doc.width, table_style, day_dates))
+            count += 1
+            yield story
+
+    with span('cohort_pdf.build', file=os.path.basename(output_path)):
+        _build_per_student(doc, stories())
+    return count
+
+def iter_cohort_sheets(store, students, year=None):
+    """
+    記録ストアから学生ごとに最新の回の記録を (シート名, DataFrame, 各日の日付) で順に返す
+
+    studentsは {シート名: 使う回のワークブック名}。yearを指定するとその学年の学生の記録だけを読む
+    """
+    for sheet, source in students.items():
+        if year is not None and (class_year(sheet) or 'other') != year:
+            continue
+        yield sheet, store.entries(sheet, sources=[source]), store.day_dates(source)
+
+def write_cohort_pdfs(data_dir=DATA_DIR, output_dir=OUTPUT_DIR, by_year=False, sections=SECTIONS, cohort=True,
+                      profile=None):
+    """
+    全体版PDFを生成
+
+    Parameters:
+        by_year (bool): 学年ごとに cohort_M1.pdf・cohort_M4.pdf に分ける（既定は cohort.pdf の1ファイル）
+        cohort (bool): 統計ページに全体平均などを併記する（全体の統計は学年によらず全学生から計算）
+        profile (str): 出力品質のプロファイル名（quality.PROFILES参照）
+
+    Returns:
+        list: 生成したPDFのパス
+    """
+    from aggregate import displayed_cohort
+    from pipeline import cohort_statistics, list_students
+    os.makedirs(output_dir, exist_ok=True)
+    store, sources = ingest_workbooks(data_dir)
+    with store:
+        _, students = list_students(store, sources)
+        summary = None
+        if cohort and 'stats' in sections:
+            # 学生別の統計PDFと同じ桁数に丸めた値を表示する
+            summary = displayed_cohort(cohort_statistics(store, students), 'stats')
+
+        if by_year:
+            years = sorted({class_year(sheet) or 'other' for sheet in students})
+            targets = [(year, os.path.join(output_dir, f'cohort_{year}.pdf')) for year in years]
+        else:
+            targets = [(None, os.path.join(output_dir, 'cohort.pdf'))]
+
+        paths = []
+        for year, path in targets:
+            # 途中で失敗しても前回のPDFが壊れないよう一時ファイルに書いてから置き換える
+            tmp_path = path + '.tmp'
+            create_cohort_pdf(iter_cohort_sheets(store, students, year), tmp_path, summary, sections, profile)
+            os.replace(tmp_path, path)
+            paths.append(path)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='全学生の統計PDF・レポートPDFをしおり付きの1つのPDFにまとめる')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='出力フォルダ')
+    parser.add_argument('--by-year', action='store_true', help='学年（M1・M4）ごとに別のPDFにする')
+    parser.add_argument('--sections', default=','.join(SECTIONS),
+                        help=f'含める資料（カンマ区切り、この順に並べる）: {",".join(SECTIONS)}')
+    parser.add_argument('--no-cohort', action='store_true', help='統計ページに全体平均などを併記しない')
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE, help='出力品質のプロファイル')
+    args = parser.parse_args(argv)
+
+    sections = tuple(s.strip() for s in args.sections.split(',') if s.strip())
+    for section in sections:
+        if section not in SECTIONS:
+            parser.error(f'不明な資料: {section}')
+    if not sections:
+        parser.error('資料を1つ以上指定してください')
+
+    start = time.perf_counter()
+    paths = write_cohort_pdfs(args.data_dir, args.output_dir, args.by_year, sections, not args.no_cohort, args.profile)
+    for path in paths:
+        print(f'{path} ({os.path.getsize(path) / 1024:.0f}KB)')
+    print(f'{time.perf_counter() - start:.1f}秒')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+from instrument import span
+
+# ディレクトリ定義
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'source_data')
+CACHE_DIR = os.path.join(BASE_DIR, '.cache', 'sheets')
+
+# 学生シート以外の集計シート名
+OVERALL_SHEET = 'overall'
+
+# キャッシュ形式のバージョン（形式を変えたら上げる）
+CACHE_VERSION = 4
+
+# キャッシュに取り込む列（生成器が使う列だけ）と型
+# date/timeはoverallシートにだけあり、実習の日程を求めるのに使う
+INGEST_COLUMNS = ('DAY', 'API検証', '入力内容', 'date/time')
+INT_COLUMNS = ('DAY', 'API検証')
+DATETIME_COLUMNS = ('date/time',)
+
+# 省メモリ形式（compact_table）で日・分類をint8のコードにするときの範囲。空欄・範囲外は0にする
+# （aggregateと同じく、日0は集計外・分類0は未分類として扱われる）
+CODE_RANGE = (1, 127)
+
+# ワークブックを読むときに1回に扱う行数（ワークブックの大きさによらずメモリ使用量を一定に保つ）
+CHUNK_ROWS = 5000
+
+def list_workbooks(data_dir=DATA_DIR):
+    """フォルダ内のExcelファイル一覧を取得"""
+    return [
+        os.path.join(data_dir, f)
+        for f in sorted(os.listdir(data_dir))
+        if f.endswith('.xlsx') and not f.startswith('~$')
+    ]
+
+def file_hash(file_path):
+    """ファイル内容のSHA-256ハッシュを計算"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_json(path, default):
+    """JSONを読み込む（存在しない・壊れている場合は既定値）"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def write_json(path, data):
+    """一時ファイル経由でJSONを書き込む（途中で中断されても壊れないように）"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+def workbook_key(file_path, cache_dir=CACHE_DIR):
+    """
+    ワークブックのキャッシュキー（内容ハッシュ）を取得
+
+    mtimeとサイズが前回と同じならハッシュ計算を省略する
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, 'index.json')
+    index = load_json(index_path, {})
+
+    stat = os.stat(file_path)
+    abs_path = os.path.abspath(file_path)
+    entry = index.get(abs_path)
+    if entry and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+        return entry['sha256']
+
+    digest = file_hash(file_path)
+    index[abs_path] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}
+    write_json(index_path, index)
+    return digest
+
+def workbook_sheet_names(file_path):
+    """ワークブックのシート名一覧をxl/workbook.xmlだけから取得（シートの中身は読まない）"""
+    import zipfile
+    from xml.etree import ElementTree
+    ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    with zipfile.ZipFile(file_path) as zf:
+        root = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    return [sheet.get('name') for sheet in root.iter(f'{ns}sheet')]
+
+def iter_sheet_chunks(file_path, columns=INGEST_COLUMNS, chunk_rows=CHUNK_ROWS):
+    """
+    ワークブックを読み取り専用モードで先頭から順に読み、シートごとに行をchunk_rows行ずつ返す
+
+    ワークブック全体をメモリに載せないため、大きなファイルでもメモリ使用量は一定
+
+    Parameters:
+        columns (tuple): 取り出す列名（1行目の見出しで判定、ない列は空欄）。Noneならすべての列
+        chunk_rows (int): 1回に返す最大行数
+
+    Yields:
+        (シート名, 列名のリスト, 行のタプルのリスト)。空のシートも1回は返す
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            # 書き出し元によってはシートの範囲情報が不正確なため、実際の行を最後まで読む
+            ws.reset_dimensions()
+            rows = ws.iter_rows(values_only=True)
+            header = [str(c) if c is not None else f'Unnamed: {i}' for i, c in enumerate(next(rows, ()))]
+            names = list(header) if columns is None else list(columns)
+            picks = [header.index(c) if c in header else None for c in names]
+
+            chunk, emitted = [], False
+            for row in rows:
+                values = tuple(row[i] if i is not None and i < len(row) else None for i in picks)
+                if all(v is None for v in values):
+                    continue
+                chunk.append(values)
+                if len(chunk) >= chunk_rows:
+                    yield ws.title, names, chunk
+                    chunk, emitted = [], True
+            if chunk or not emitted:
+                yield ws.title, names, chunk
+    finally:
+        wb.close()
+
+def _to_int(value):
+    """数値のセルを整数に変換（数値でない・空欄はNone）"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if float(value).is_integer() else None
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+def _to_text(value):
+    return None if value is None else str(value)
+
+def _to_datetime(value):
+    """日時のセルをそのまま返す（日時でない・空欄はNone）"""
+    import datetime
+    return value if isinstance(value, datetime.datetime) else None
+
+def _column_type(column):
+    """キャッシュの列の (pyarrowの型, 変換関数)"""
+    import pyarrow as pa
+    if column in INT_COLUMNS:
+        return pa.int64(), _to_int
+    if column in DATETIME_COLUMNS:
+        return pa.timestamp('us'), _to_datetime
+    return pa.string(), _to_text
+
+def _build_cache(file_path, entry_dir):
+    """ワークブックを1回だけ先頭から読み、全シートの必要な列をParquetで保存（内容ハッシュも同時に計算）"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, _column_type(c)[0]) for c in INGEST_COLUMNS])
+    converters = [_column_type(c)[1] for c in INGEST_COLUMNS]
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+    meta = {'version': CACHE_VERSION, 'source': os.path.basename(file_path), 'sheets': []}
+
+    writer, current = None, None
+    def finish():
+        if writer is not None:
+            writer.close()
+            current['hash'] = current.pop('_hash').hexdigest()
+            meta['sheets'].append(current)
+
+    try:
+        with span('ingest.read_excel', file=os.path.basename(file_path)):
+            for sheet, names, chunk in iter_sheet_chunks(file_path):
+                if current is None or sheet != current['name']:
+                    finish()
+                    filename = f'{len(meta["sheets"]):04d}.parquet'
+                    writer = pq.ParquetWriter(os.path.join(tmp_dir, filename), schema)
+                    current = {'name': sheet, 'file': filename, 'rows': 0, '_hash': hashlib.sha256()}
+                    current['_hash'].update(json.dumps(names, ensure_ascii=False).encode('utf-8'))
+                rows = [tuple(convert(v) for convert, v in zip(converters, row)) for row in chunk]
+                for row in rows:
+                    current['_hash'].update(json.dumps(row, ensure_ascii=False, default=str).encode('utf-8'))
+                columns = list(zip(*rows)) if rows else [[] for _ in INGEST_COLUMNS]
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+                ))
+                current['rows'] += len(rows)
+            finish()
+        write_json(os.path.join(tmp_dir, 'meta.json'), meta)
+    except BaseException:
+        # 途中で失敗した場合は作りかけのキャッシュを残さない
+        if writer is not None and writer.is_open:
+            writer.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    # 他プロセスが同時に作成した場合は先に完成した方を使う
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def ensure_cached(file_path, cache_dir=CACHE_DIR):
+    """キャッシュを用意し、キャッシュディレクトリとメタ情報を返す"""
+    entry_dir = os.path.join(cache_dir, workbook_key(file_path, cache_dir))
+    meta = load_json(os.path.join(entry_dir, 'meta.json'), None)
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        _build_cache(file_path, entry_dir)
+        meta = load_json(os.path.join(entry_dir, 'meta.json'), None)
+    return entry_dir, meta
+
+def discard_cached(key, cache_dir=CACHE_DIR):
+    """workbook_keyで得たキーのキャッシュを削除（更新されて使われなくなったワークブックの分）"""
+    shutil.rmtree(os.path.join(cache_dir, key), ignore_errors=True)
+
+def sheet_names(file_path, cache_dir=CACHE_DIR):
+    """ワークブックのシート名一覧を取得"""
+    _, meta = ensure_cached(file_path, cache_dir)
+    return [s['name'] for s in meta['sheets']]
+
+def sheet_hashes(file_path, cache_dir=CACHE_DIR):
+    """シート名ごとの内容ハッシュを取得（解析済みのメタ情報から読むだけ）"""
+    _, meta = ensure_cached(file_path, cache_dir)
+    return {s['name']: s['hash'] for s in meta['sheets']}
+
+def compact_table(table):
+    """
+    pyarrowのTableを省メモリ形式のDataFrameに変換
+
+    DAY・API検証はint8のコード（空欄・CODE_RANGE外は0）、学生（student列）は辞書で符号化した
+    category型、入力内容などの文字列はArrowの文字列のまま（Pythonの文字列オブジェクトを作らない）。
+    生成器はどれもこの形式と、変換前の形式（int64・欠損のあるfloat64）のどちらも受け付ける
+    """
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    low, high = CODE_RANGE
+    arrays = []
+    for name, column in zip(table.column_names, table.columns):
+        if name in INT_COLUMNS:
+            valid = pc.fill_null(pc.and_(pc.greater_equal(column, low), pc.less_equal(column, high)), False)
+            column = pc.if_else(valid, column, 0).cast(pa.int8())
+        elif name == 'student':
+            column = column.dictionary_encode()
+        arrays.append(column)
+    text_dtype = pd.StringDtype('pyarrow', na_value=np.nan)
+    return pa.table(arrays, names=table.column_names).to_pandas(
+        types_mapper=lambda t: text_dtype if t == pa.string() else None
+    )
+
+def frame_memory(df):
+    """DataFrameの列ごとのメモリ使用量（バイト、文字列の中身・カテゴリの辞書を含む）"""
+    return {c: int(n) for c, n in df.memory_usage(deep=True, index=False).items()}
+
+def read_sheet(file_path, sheet, cache_dir=CACHE_DIR):
+    """キャッシュから1シートを省メモリ形式（compact_table）で読み込む"""
+    import pyarrow.parquet as pq
+    entry_dir, meta = ensure_cached(file_path, cache_dir)
+    for s in meta['sheets']:
+        if s['name'] == sheet:
+            with span('ingest.read_sheet'):
+                return compact_table(pq.read_table(os.path.join(entry_dir, s['file'])))
+    raise KeyError(f'シートが見つかりません: {sheet}')
+
+def iter_workbook_sheets(file_path, include_overall=False, cache_dir=CACHE_DIR, columns=None):
+    """
+    ワークブック内の各シートを (シート名, DataFrame) で順に返す（columnsで読む列を絞れる）
+
+    DataFrameは省メモリ形式（compact_table）
+    """
+    import pyarrow.parquet as pq
+    entry_dir, meta = ensure_cached(file_path, cache_dir)
+    for s in meta['sheets']:
+        if s['name'] == OVERALL_SHEET and not include_overall:
+            continue
+        yield s['name'], compact_table(pq.read_table(os.path.join(entry_dir, s['file']), columns=columns))
+
+def iter_student_sheets(data_dir=DATA_DIR, cache_dir=CACHE_DIR, columns=None):
+    """全ワークブックの学生シートを (シート名, DataFrame) で順に返す"""
+    for file_path in list_workbooks(data_dir):
+        yield from iter_workbook_sheets(file_path, cache_dir=cache_dir, columns=columns)
+
+if __name__ == '__main__':
+    # キャッシュを事前に作成
+    for file_path in list_workbooks():
+        entry_dir, meta = ensure_cached(file_path)
+        print(f'--- {os.path.basename(file_path)} ---')
+        for s in meta['sheets']:
+            print(f"{s['name']}: {s['rows']}行")
+        print(f'キャッシュ: {entry_dir}')
@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import sys
+import time
+import unicodedata
+import zlib
+import numpy as np
+from data_ingest import DATA_DIR
+from entry_store import ingest_workbooks
+from instrument import span
+
+# 文字n-gramの長さ
+NGRAM = 3
+# MinHashの署名の長さと、LSHのバンド数（1バンド = NUM_PERM // BANDS 行）
+# 一致度0.55前後から候補になり、0.8以上はほぼ確実に候補に入る
+NUM_PERM = 100
+BANDS = 20
+# この一致度（n-gram集合のJaccard係数）以上を重複とみなす
+THRESHOLD = 0.8
+# 短すぎる記録（「特になし」など）は重複として扱わない
+MIN_CHARS = 10
+
+# MinHashの置換に使うハッシュ関数 (a * x + b) mod p の係数（実行ごとに同じ値）
+_PRIME = (1 << 31) - 1
+_COEFFICIENTS = np.random.RandomState(1).randint(1, _PRIME, size=(2, NUM_PERM)).astype(np.uint64)
+# 署名をまとめて計算するときの1回あたりのn-gram数（メモリ使用量を一定に保つ）
+CHUNK_SHINGLES = 1 << 15
+
+def normalize(text):
+    """比較用に全角・半角をそろえ、空白・改行を除く"""
+    return ''.join(unicodedata.normalize('NFKC', text).split())
+
+def shingles(text):
+    """文字n-gramのハッシュ値の集合（MIN_CHARS文字未満はNone）"""
+    text = normalize(text) if isinstance(text, str) else ''
+    if len(text) < MIN_CHARS:
+        return None
+    return {zlib.crc32(text[i:i + NGRAM].encode('utf-8')) for i in range(len(text) - NGRAM + 1)}
+
+def minhash_signatures(sets):
+    """
+    n-gram集合ごとのMinHash署名を計算
+
+    Returns:
+        np.ndarray: (集合の数, NUM_PERM) の配列
+    """
+    signatures = np.empty((len(sets), NUM_PERM), dtype=np.uint64)
+    start = 0
+    while start < len(sets):
+        # n-gramの合計がCHUNK_SHINGLES程度になるまでの集合をまとめて計算
+        end, size = start, 0
+        while end < len(sets) and (end == start or size + len(sets[end]) <= CHUNK_SHINGLES):
+            size += len(sets[end])
+            end += 1
+        values = np.fromiter((v for s in sets[start:end] for v in s), dtype=np.uint64, count=size)
+        hashed = (values[:, None] * _COEFFICIENTS[0] + _COEFFICIENTS[1]) % _PRIME
+        offsets = np.cumsum([0] + [len(s) for s in sets[start:end - 1]])
+        signatures[start:end] = np.minimum.reduceat(hashed, offsets, axis=0)
+        start = end
+    return signatures
+
+def candidate_pairs(signatures):
+    """
+    LSHで同じバケットに入った記録の組を候補にする
+
+    バケット内は先頭の記録との組だけを候補にするため、同じ文を何度も貼った場合でも
+    候補の数は記録数に比例する（他のバンドで別の組み合わせが拾われる）
+    """
+    rows = NUM_PERM // BANDS
+    pairs = set()
+    for band in range(BANDS):
+        buckets = {}
+        for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            first = buckets.setdefault(key, i)
+            if first != i:
+                pairs.add((first, i))
+    return pairs
+
+def find_duplicates(entries, threshold=THRESHOLD):
+    """
+    重複している記録を探す
+
+    Parameters:
+        entries (list): (ワークブック名, 学生, 行番号, テキスト) のリスト（この順を記録の順とする）
+
+    Returns:
+        list: 重複する記録ごとの (ワークブック名, 学生, 行番号, グループ番号,
+            最も近い記録のワークブック名, 学生, 行番号, 一致度, 集計から除くか) のリスト。
+            同じ学生の同じグループの記録のうち最初のもの以外を集計から除く
+            （他の学生と同じ内容の記録は印を付けるだけで、どちらも集計に残す）
+    """
+    with span('dedup.signatures'):
+        keyed = [(entry, shingles(entry[3])) for entry in entries]
+        keyed = [(entry, s) for entry, s in keyed if s]
+        sets = [s for _, s in keyed]
+        signatures = minhash_signatures(sets)
+
+    with span('dedup.lsh'):
+        parent = list(range(len(sets)))
+        def root(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        best = {}
+        for i, j in candidate_pairs(signatures):
+            similarity = len(sets[i] & sets[j]) / len(sets[i] | sets[j])
+            if similarity < threshold:
+                continue
+            parent[root(j)] = root(i)
+            for a, b in ((i, j), (j, i)):
+                same = keyed[a][0][1] == keyed[b][0][1]
+                # 最も近い記録（同じ一致度なら同じ学生・先の記録を優先）
+                rank = (similarity, same, -b)
+                if a not in best or rank > best[a][0]:
+                    best[a] = (rank, b)
+
+    results, seen = [], set()
+    for i in sorted(best):
+        (source, student, seq, _), group = keyed[i][0], root(i)
+        match = keyed[best[i][1]][0]
+        excluded = (group, source, student) in seen
+        seen.add((group, source, student))
+        results.append((source, student, seq, group, match[0], match[1], match[2], best[i][0][0], excluded))
+    return results
+
+def detect_duplicates(store, students):
+    """
+    学生ごとの回の記録から重複を探し、記録ストアのduplicatesに保存
+
+    Parameters:
+        store (EntryStore): 書き込み可能な記録ストア
+        students (dict): {学生: ワークブック名}（学生ごとに対象にする回）
+
+    Returns:
+        dict: {学生: {'marks': レポートPDFの印のハッシュ, 'excluded': 集計から除く記録のハッシュ}}
+            （重複のない学生は含まず、除く記録のない学生は'excluded'を含まない）。
+            成果物の入力キーに含め、その学生の判定が変わった成果物だけ作り直す
+    """
+    entries, days = [], {}
+    for student, source in students.items():
+        df = store.entries(student, sources=[source], columns=['DAY', '入力内容'])
+        entries.extend((source, student, seq, text) for seq, text in enumerate(df['入力内容']))
+        days.update(((source, student, seq), int(day)) for seq, day in enumerate(df['DAY']))
+    rows = find_duplicates(entries)
+    store.replace_duplicates(rows)
+
+    # 印の文に出る内容（最も近い記録の学生・日と一致度）と除く記録の行番号だけから計算する
+    # （グループ番号は他の学生の記録で変わるため含めない）
+    marks, excluded = {}, {}
+    for source, student, seq, _, match_source, match_student, match_seq, similarity, exclude in rows:
+        note = (seq, match_student, days[(match_source, match_student, match_seq)], f'{similarity:.0%}')
+        marks.setdefault(student, hashlib.sha256()).update(repr(note).encode('utf-8'))
+        if exclude:
+            excluded.setdefault(student, hashlib.sha256()).update(f'{seq}\0'.encode('utf-8'))
+    digests = {student: {'marks': h.hexdigest()} for student, h in marks.items()}
+    for student, h in excluded.items():
+        digests[student]['excluded'] = h.hexdigest()
+    return digests
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ほぼ同じ内容の記録（学生内・学生間）をMinHash/LSHで探す')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ')
+    parser.add_argument('--store', default=None, help='記録ストアのパス（既定: データフォルダと同じ階層の store/）')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    store, sources = ingest_workbooks(args.data_dir, args.store)
+    with store:
+        students = {sheet: source for sheet, (source, _) in store.students(sources).items()}
+        start = time.perf_counter()
+        detect_duplicates(store, students)
+        elapsed = time.perf_counter() - start
+        rows = store.duplicates()
+    for row in rows.itertuples(index=False):
+        mark = '除外' if row.excluded else '    '
+        day, match_day = (f'Day{int(d)}' if pd.notna(d) else 'Day-' for d in (row.day, row.match_day))
+        print(f'{mark} {row.student} {day} ~ {row.match_student} {match_day}'
+              f' ({row.similarity:.0%}) | {str(row.text).replace(chr(10), " ")[:60]}')
+    print(f'{len(students)}人の記録から重複{len(rows)}件（うち集計から除く{int(rows["excluded"].sum())}件、'
+          f'{elapsed:.2f}秒）')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
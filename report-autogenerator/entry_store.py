@@ -0,0 +1,511 @@
+import argparse
+import datetime
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import numpy as np
+from data_ingest import (
+    BASE_DIR, DATA_DIR, CACHE_DIR, OVERALL_SHEET, list_workbooks, ensure_cached, compact_table, frame_memory
+)
+from aggregate import NUM_CATEGORIES, NUM_DAYS
+from instrument import span
+
+# 記録ストアの保存先（source_data/ と同じ階層の store/）
+STORE_PATH = os.path.join(BASE_DIR, 'store', 'entries.sqlite3')
+
+# ストアの列とDataFrameの列名（生成器はワークブックと同じ列名で受け取る）
+FRAME_COLUMNS = {'day': 'DAY', 'category': 'API検証', 'text': '入力内容'}
+
+# ストアの形式のバージョン（PRAGMA user_versionに記録し、形式を変えたら上げる）
+STORE_VERSION = 3
+
+# 学年はシート名の先頭（M1_〇〇・M4_〇〇）から判定する
+CLASS_YEAR_PATTERN = re.compile(r'^(M\d)_')
+
+SCHEMA = (
+    # 取り込んだワークブック＝実習の回（ワークブックを消しても記録は残す）
+    # start_dateはDay1の日付（ISO形式）。manual=1は取り込み時に指定されたもので、自動では上書きしない
+    'CREATE TABLE IF NOT EXISTS rounds ('
+    ' source TEXT PRIMARY KEY, name TEXT NOT NULL, start_date TEXT, manual INTEGER NOT NULL DEFAULT 0,'
+    ' seq INTEGER NOT NULL, overall_hash TEXT)',
+    # 取り込んだシートと内容ハッシュ（同じ内容のシートは取り込み直さない）
+    # personは学年の接頭辞を除いた名前（M1_〇〇とM4_〇〇を同じ学生として回をまたいで集計する）
+    'CREATE TABLE IF NOT EXISTS sheets ('
+    ' source TEXT NOT NULL, student TEXT NOT NULL, person TEXT NOT NULL, hash TEXT NOT NULL,'
+    ' rows INTEGER NOT NULL, PRIMARY KEY (source, student))',
+    # 1件の記録が1行（seqはシート内の行順）
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' source TEXT NOT NULL, student TEXT NOT NULL, seq INTEGER NOT NULL,'
+    ' day INTEGER, category INTEGER, text TEXT,'
+    ' PRIMARY KEY (source, student, seq)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS entries_student_category_day ON entries(student, category, day)',
+    # 学生を指定しない絞り込み（全学生の分類7・Day3など）用
+    'CREATE INDEX IF NOT EXISTS entries_category_day ON entries(category, day)',
+    # 学生・回ごとの分類×日別の記録数（シートを取り込むときにその回の分だけ更新する）
+    'CREATE TABLE IF NOT EXISTS round_counts ('
+    ' person TEXT NOT NULL, source TEXT NOT NULL, category INTEGER NOT NULL, day INTEGER NOT NULL,'
+    ' count INTEGER NOT NULL, PRIMARY KEY (person, source, category, day)) WITHOUT ROWID',
+    # ほぼ同じ内容の記録（dedup.detect_duplicatesで作り直す）。matchは最も近い記録、excluded=1は集計から除く記録
+    'CREATE TABLE IF NOT EXISTS duplicates ('
+    ' source TEXT NOT NULL, student TEXT NOT NULL, seq INTEGER NOT NULL, grp INTEGER NOT NULL,'
+    ' match_source TEXT NOT NULL, match_student TEXT NOT NULL, match_seq INTEGER NOT NULL,'
+    ' similarity REAL NOT NULL, excluded INTEGER NOT NULL, PRIMARY KEY (source, student, seq)) WITHOUT ROWID',
+)
+
+def class_year(sheet):
+    """シート名から学年（M1・M4など）を取得（判定できなければNone）"""
+    match = CLASS_YEAR_PATTERN.match(sheet)
+    return match.group(1) if match else None
+
+def person_key(sheet):
+    """回をまたいで同じ学生として扱うための名前（シート名から学年の接頭辞を除いたもの）"""
+    return CLASS_YEAR_PATTERN.sub('', sheet)
+
+def format_date(value):
+    """ISO形式の日付を 2025/7/28 の形式にする"""
+    date = datetime.date.fromisoformat(value)
+    return f'{date.year}/{date.month}/{date.day}'
+
+def _start_date(path):
+    """
+    overallシートの記録日時からDay1の日付を推定（ISO形式、判定できなければNone）
+
+    記録はその日のうちか翌日以降に書かれるため、Day1の記録のうち最も早い日時の日付を使う
+    """
+    import pyarrow.parquet as pq
+    import pyarrow.compute as pc
+    table = pq.read_table(path, columns=['DAY', 'date/time'])
+    earliest = pc.min(table.filter(pc.equal(table['DAY'], 1))['date/time']).as_py()
+    return earliest.date().isoformat() if earliest is not None else None
+
+def default_store_path(data_dir=DATA_DIR):
+    """データフォルダに対応する記録ストアのパス（データフォルダと同じ階層の store/entries.sqlite3）"""
+    if os.path.abspath(data_dir) == os.path.abspath(DATA_DIR):
+        return STORE_PATH
+    return os.path.join(os.path.dirname(os.path.abspath(data_dir)), 'store', 'entries.sqlite3')
+
+def _where(conditions):
+    """(条件式, 値) の並びからWHERE句とパラメータを作成（値がNoneの条件は使わない）"""
+    clauses, params = [], []
+    for clause, value in conditions:
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set, frozenset)):
+            value = list(value)
+            clauses.append(f'{clause} IN ({",".join("?" * len(value))})')
+            params.extend(value)
+        else:
+            clauses.append(f'{clause} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+class EntryStore:
+    """
+    全学生・全実習回の記録を1つの表に持つSQLiteのストア
+
+    entries(student, day, category, text) を (student, category, day) の索引で引けるようにし、
+    生成器はワークブックを読む代わりに必要な学生・日・分類の記録だけを問い合わせる。
+    ワークブック1つを実習の1回（round）として、回ごとに追記していく。新しい回を取り込んでも
+    前の回の記録は読み直さず、学生・回ごとの記録数（round_counts）もその回の分だけ更新する
+    """
+
+    def __init__(self, path=STORE_PATH, readonly=False):
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=30)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.conn = sqlite3.connect(path, timeout=30)
+            # 取り込み中もワーカープロセスから読めるようにWALモードにする
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self._migrate()
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+            self.conn.execute(f'PRAGMA user_version = {STORE_VERSION}')
+            self.conn.commit()
+
+    def _migrate(self):
+        """
+        古い形式のストアを作り直す
+
+        実習回の情報がない形式（バージョン1以前）は、表を消してワークブックから取り込み直す。
+        それ以降の形式は足りない表を追加するだけ（取り込み済みの回の記録は残す）
+        """
+        version, = self.conn.execute('PRAGMA user_version').fetchone()
+        tables = [name for name, in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        if version >= 2 or not tables:
+            return
+        with self.conn:
+            for name in tables:
+                self.conn.execute(f'DROP TABLE IF EXISTS {name}')
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def ingest(self, file_path, cache_dir=CACHE_DIR, name=None, start_date=None):
+        """
+        ワークブックを実習の1回として取り込む
+
+        シートの内容ハッシュが前回と同じなら何もしない（同じファイルを何度取り込んでも重複しない）。
+        内容が変わったシートはその学生の記録を入れ替え、なくなったシートの記録は削除する。
+        他のワークブック（回）の記録・集計には触れない
+
+        Parameters:
+            name (str): 回の名前（省略時はファイル名、2回目以降の取り込みでは前回の名前のまま）
+            start_date (str): Day1の日付（YYYY-MM-DD）。省略時はoverallシートの記録日時から推定する
+
+        Returns:
+            int: 取り込み直したシート数
+        """
+        import pyarrow.parquet as pq
+        source = os.path.basename(file_path)
+        entry_dir, meta = ensure_cached(file_path, cache_dir)
+        known = dict(self.conn.execute('SELECT student, hash FROM sheets WHERE source = ?', (source,)))
+        changed = 0
+        with span('store.ingest', file=source), self.conn:
+            self._add_round(source, name, start_date)
+            for s in meta['sheets']:
+                if s['name'] == OVERALL_SHEET:
+                    self._update_start_date(source, s['hash'], os.path.join(entry_dir, s['file']))
+                    continue
+                if known.pop(s['name'], None) == s['hash']:
+                    continue
+                columns = pq.read_table(
+                    os.path.join(entry_dir, s['file']), columns=list(FRAME_COLUMNS.values())
+                ).to_pydict()
+                self._delete(source, s['name'])
+                self.conn.executemany(
+                    'INSERT INTO entries (source, student, seq, day, category, text) VALUES (?, ?, ?, ?, ?, ?)',
+                    ((source, s['name'], seq, *row) for seq, row in enumerate(zip(
+                        *(columns[name] for name in FRAME_COLUMNS.values())
+                    )))
+                )
+                self.conn.execute(
+                    'INSERT INTO sheets (source, student, person, hash, rows) VALUES (?, ?, ?, ?, ?)',
+                    (source, s['name'], person_key(s['name']), s['hash'], s['rows'])
+                )
+                self._update_counts(source, person_key(s['name']))
+                changed += 1
+            for student in known:
+                self._delete(source, student)
+                self._update_counts(source, person_key(student))
+        return changed + len(known)
+
+    def _add_round(self, source, name, start_date):
+        """回を登録（登録済みなら指定された名前・開始日だけ更新）"""
+        self.conn.execute(
+            'INSERT OR IGNORE INTO rounds (source, name, seq)'
+            ' VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM rounds))',
+            (source, os.path.splitext(source)[0])
+        )
+        if name:
+            self.conn.execute('UPDATE rounds SET name = ? WHERE source = ?', (name, source))
+        if start_date:
+            start_date = datetime.date.fromisoformat(start_date).isoformat()
+            self.conn.execute('UPDATE rounds SET start_date = ?, manual = 1 WHERE source = ?', (start_date, source))
+
+    def _update_start_date(self, source, overall_hash, path):
+        """overallシートが変わっていれば開始日を推定し直す（指定された開始日はそのまま）"""
+        manual, known = self.conn.execute(
+            'SELECT manual, overall_hash FROM rounds WHERE source = ?', (source,)
+        ).fetchone()
+        if manual or known == overall_hash:
+            return
+        self.conn.execute(
+            'UPDATE rounds SET start_date = ?, overall_hash = ? WHERE source = ?',
+            (_start_date(path), overall_hash, source)
+        )
+
+    def _update_counts(self, source, person):
+        """1人・1回分の分類×日別の記録数を集計し直す（分類外は0にまとめる）"""
+        self.conn.execute('DELETE FROM round_counts WHERE person = ? AND source = ?', (person, source))
+        self.conn.execute(
+            'INSERT INTO round_counts (person, source, category, day, count)'
+            ' SELECT s.person, e.source, CASE WHEN e.category BETWEEN 1 AND ? THEN e.category ELSE 0 END AS c,'
+            ' e.day, COUNT(*) FROM entries e JOIN sheets s USING (source, student)'
+            ' WHERE s.source = ? AND s.person = ? AND e.day >= 1 GROUP BY c, e.day',
+            (NUM_CATEGORIES, source, person)
+        )
+
+    def _delete(self, source, student):
+        self.conn.execute('DELETE FROM entries WHERE source = ? AND student = ?', (source, student))
+        self.conn.execute('DELETE FROM sheets WHERE source = ? AND student = ?', (source, student))
+
+    def rounds(self):
+        """
+        取り込んだ実習回の一覧（開始日順、開始日が不明な回は取り込み順で最後）
+
+        Returns:
+            list: (ワークブック名, 回の名前, 開始日（ISO形式またはNone）, 学生数) のリスト
+        """
+        return self.conn.execute(
+            'SELECT r.source, r.name, r.start_date, COUNT(s.student) FROM rounds r'
+            ' LEFT JOIN sheets s USING (source) GROUP BY r.source'
+            ' ORDER BY r.start_date IS NULL, r.start_date, r.seq'
+        ).fetchall()
+
+    def day_dates(self, source, num_days=NUM_DAYS):
+        """
+        回の各日の日付
+
+        Returns:
+            dict: {日: '2025/7/28' の形式の日付}。開始日が不明なら空
+        """
+        row = self.conn.execute('SELECT start_date FROM rounds WHERE source = ?', (source,)).fetchone()
+        if row is None or row[0] is None:
+            return {}
+        days = self.conn.execute('SELECT MAX(day) FROM entries WHERE source = ?', (source,)).fetchone()[0]
+        start = datetime.date.fromisoformat(row[0])
+        return {
+            day: format_date((start + datetime.timedelta(days=day - 1)).isoformat())
+            for day in range(1, max(num_days, days or 0) + 1)
+        }
+
+    def students(self, sources=None):
+        """
+        学生ごとの最新の回と内容ハッシュの一覧
+
+        複数の回（ワークブック）に同じシート名がある場合は開始日が最も新しい回を使う
+
+        Parameters:
+            sources (list): 対象のワークブック名（Noneならすべて）
+
+        Returns:
+            dict: {学生: (ワークブック名, 内容ハッシュ)}。ハッシュにはその回の日程も含める
+        """
+        where, params = _where([('s.source', sources)])
+        latest = {}
+        for student, source, h, start_date in self.conn.execute(
+            'SELECT s.student, s.source, s.hash, r.start_date FROM sheets s JOIN rounds r USING (source)'
+            f'{where} ORDER BY s.student, r.start_date IS NULL, r.start_date, r.seq', params
+        ):
+            if start_date is not None:
+                h = hashlib.sha256(f'{h}\0{start_date}'.encode('utf-8')).hexdigest()
+            latest[student] = (source, h)
+        return latest
+
+    def entries(self, student=None, day=None, category=None, sources=None, columns=None, compact=True):
+        """
+        条件に合う記録をDataFrameで取得（ワークブック・シート内の順）
+
+        Parameters:
+            student, day, category: 絞り込む学生・日・分類（値のリストも可、Noneなら絞り込まない）
+            sources (list): 対象のワークブック名（Noneならすべての回）
+            columns (list): 取得する列（DAY・API検証・入力内容、Noneならすべて）。学生を指定しない場合は学生列も付く
+            compact (bool): 省メモリ形式（data_ingest.compact_table）にする。Falseなら日・分類はint64
+                （空欄があればfloat64）、学生は文字列
+
+        Returns:
+            DataFrame: ワークブックから読んだ場合と同じ列名
+        """
+        import pyarrow as pa
+        names = {frame: column for column, frame in FRAME_COLUMNS.items()}
+        selected = [names[c] for c in (columns or FRAME_COLUMNS.values())]
+        if student is None or isinstance(student, (list, tuple, set, frozenset)):
+            selected = ['student'] + selected
+        where, params = _where([('student', student), ('day', day), ('category', category), ('source', sources)])
+        with span('store.query'):
+            rows = self.conn.execute(
+                f'SELECT {", ".join(selected)} FROM entries{where} ORDER BY source, student, seq', params
+            ).fetchall()
+        values = list(zip(*rows)) if rows else [[] for _ in selected]
+        table = pa.table({
+            FRAME_COLUMNS.get(c, c): pa.array(v, type=pa.string() if c in ('student', 'text') else pa.int64())
+            for c, v in zip(selected, values)
+        })
+        return compact_table(table) if compact else table.to_pandas()
+
+    def count_matrices(self, students, num_days=None, exclude_duplicates=False):
+        """
+        学生ごとの分類×日別の記録数を索引だけから集計（本文は読まない）
+
+        Parameters:
+            students (dict): {学生: ワークブック名}（学生ごとに集計する回）
+            exclude_duplicates (bool): 集計から除く重複の記録（duplicatesのexcluded）を数えない
+
+        Returns:
+            ndarray: aggregate.cohort_count_matricesと同じ形式 (学生数, 13, 日数)
+        """
+        index = {(source, student): i for i, (student, source) in enumerate(students.items())}
+        where, params = _where([('source', sorted(set(students.values())))])
+        where = f'{where} AND day >= 1' if where else ' WHERE day >= 1'
+        if exclude_duplicates:
+            where += (' AND NOT EXISTS (SELECT 1 FROM duplicates d WHERE d.source = entries.source'
+                      ' AND d.student = entries.student AND d.seq = entries.seq AND d.excluded)')
+        rows = [
+            (index[(source, student)], c, day, count) for source, student, c, day, count in self.conn.execute(
+                'SELECT source, student, CASE WHEN category BETWEEN 1 AND ? THEN category ELSE 0 END AS c,'
+                f' day, COUNT(*) FROM entries{where} GROUP BY source, student, c, day', [NUM_CATEGORIES] + params
+            ) if (source, student) in index
+        ]
+        return _count_array(rows, len(students), num_days)
+
+    def replace_duplicates(self, rows):
+        """重複の判定結果を入れ替える（dedup.find_duplicatesの戻り値）"""
+        with self.conn:
+            self.conn.execute('DELETE FROM duplicates')
+            self.conn.executemany('INSERT INTO duplicates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def duplicates(self, student=None, source=None):
+        """
+        重複と判定された記録と最も近い記録の一覧
+
+        seqはstore.entries(student, sources=[source]) で読んだ記録の行番号と同じ
+
+        Returns:
+            DataFrame: source・student・seq・day・text・match_student・match_day・similarity・excluded の列
+        """
+        import pandas as pd
+        where, params = _where([('d.student', student), ('d.source', source)])
+        columns = ['source', 'student', 'seq', 'day', 'text', 'match_student', 'match_day', 'similarity', 'excluded']
+        rows = self.conn.execute(
+            'SELECT d.source, d.student, d.seq, e.day, e.text, d.match_student, m.day, d.similarity, d.excluded'
+            ' FROM duplicates d JOIN entries e USING (source, student, seq)'
+            ' JOIN entries m ON m.source = d.match_source AND m.student = d.match_student AND m.seq = d.match_seq'
+            f'{where} ORDER BY d.grp, d.source, d.student, d.seq', params
+        ).fetchall()
+        df = pd.DataFrame(rows, columns=columns)
+        df['excluded'] = df['excluded'].astype(bool)
+        return df
+
+    def persons(self):
+        """回をまたいだ学生（学年の接頭辞を除いた名前）の一覧"""
+        return [person for person, in self.conn.execute('SELECT DISTINCT person FROM sheets ORDER BY person')]
+
+    def person_history(self, person, num_days=None):
+        """
+        1人の学生の回ごとの分類×日別の記録数（round_countsから読むだけで記録は読まない）
+
+        Returns:
+            list: その学生が参加した回の (ワークブック名, 回の名前, 開始日) のリスト（開始日順）
+            ndarray: (回数, 13, 日数) の記録数
+        """
+        rounds = [
+            (source, name, start_date) for source, name, start_date, _ in self.rounds()
+            if self.conn.execute(
+                'SELECT 1 FROM sheets WHERE source = ? AND person = ? LIMIT 1', (source, person)
+            ).fetchone()
+        ]
+        index = {source: i for i, (source, _, _) in enumerate(rounds)}
+        rows = [
+            (index[source], category, day, count) for source, category, day, count in self.conn.execute(
+                'SELECT source, category, day, count FROM round_counts WHERE person = ?', (person,)
+            ) if source in index
+        ]
+        return rounds, _count_array(rows, len(rounds), num_days)
+
+def _count_array(rows, size, num_days=None):
+    """(行番号, 分類, 日, 記録数) の並びを (size, 13, 日数) の配列にまとめる"""
+    rows = np.array(rows, dtype=np.int64).reshape(-1, 4)
+    if num_days is None:
+        num_days = max(NUM_DAYS, int(rows[:, 2].max()) if len(rows) else 0)
+    matrices = np.zeros((size, NUM_CATEGORIES + 1, num_days), dtype=np.int64)
+    rows = rows[rows[:, 2] <= num_days]
+    np.add.at(matrices, (rows[:, 0], rows[:, 1], rows[:, 2] - 1), rows[:, 3])
+    return matrices
+
+def ingest_workbooks(data_dir=DATA_DIR, store_path=None):
+    """
+    データフォルダの全ワークブックを記録ストアに取り込む
+
+    Returns:
+        EntryStore: 取り込み済みのストア（呼び出し側で閉じる）
+        list: 取り込んだワークブック名
+    """
+    store = EntryStore(store_path or default_store_path(data_dir))
+    sources = []
+    for file_path in list_workbooks(data_dir):
+        store.ingest(file_path)
+        sources.append(os.path.basename(file_path))
+    return store, sources
+
+def iter_student_rounds(data_dir=DATA_DIR, columns=None, store_path=None):
+    """
+    全ワークブックを記録ストアに取り込み、学生ごとに最新の回の (シート名, DataFrame, 各日の日付) を順に返す
+
+    各日の日付はEntryStore.day_datesの形式
+    """
+    store, sources = ingest_workbooks(data_dir, store_path)
+    try:
+        for student, (source, _) in store.students(sources).items():
+            yield student, store.entries(student, sources=[source], columns=columns), store.day_dates(source)
+    finally:
+        store.close()
+
+def iter_students(data_dir=DATA_DIR, columns=None, store_path=None):
+    """
+    全ワークブックを記録ストアに取り込み、学生ごとに (シート名, DataFrame) を順に返す
+
+    data_ingest.iter_student_sheetsと同じ形式（DAY・API検証・入力内容）。同じシート名が
+    複数の回にある学生は最新の回の記録を返す
+    """
+    for student, df, _ in iter_student_rounds(data_dir, columns, store_path):
+        yield student, df
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ワークブックを記録ストア（SQLite）に取り込む・記録を検索する')
+    parser.add_argument('--store', default=None, help='記録ストアのパス（既定: データフォルダと同じ階層の store/）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = commands.add_parser('ingest', help='ワークブックを取り込む（変更のないシートは省略）')
+    ingest_parser.add_argument('files', nargs='*', help='取り込むxlsxファイル（既定: データフォルダのすべて）')
+    ingest_parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ')
+    ingest_parser.add_argument('--round-name', default=None, help='実習の回の名前（ファイルを1つ指定したときのみ）')
+    ingest_parser.add_argument('--start-date', default=None,
+                               help='Day1の日付 YYYY-MM-DD（既定: 記録日時から推定、ファイルを1つ指定したときのみ）')
+
+    commands.add_parser('rounds', help='取り込んだ実習の回の一覧を表示')
+    commands.add_parser('footprint', help='全記録を読み込んだときのメモリ使用量を省メモリ形式と比べて表示')
+
+    query_parser = commands.add_parser('query', help='学生・日・分類で記録を絞り込んで表示')
+    query_parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ（ストアの場所の決定に使う）')
+    query_parser.add_argument('--student', default=None, help='学生（シート名）')
+    query_parser.add_argument('--day', type=int, default=None, help='日（1〜）')
+    query_parser.add_argument('--category', type=int, default=None, help='API分類（1〜12）')
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest' and (args.round_name or args.start_date) and len(args.files) != 1:
+        parser.error('--round-name・--start-dateはファイルを1つ指定したときのみ使えます')
+    try:
+        if args.command == 'ingest' and args.start_date:
+            datetime.date.fromisoformat(args.start_date)
+    except ValueError:
+        parser.error(f'日付の形式が正しくありません: {args.start_date}')
+
+    store = EntryStore(args.store or default_store_path(getattr(args, 'data_dir', DATA_DIR)))
+    try:
+        if args.command == 'ingest':
+            for file_path in args.files or list_workbooks(args.data_dir):
+                changed = store.ingest(file_path, name=args.round_name, start_date=args.start_date)
+                print(f'{os.path.basename(file_path)}: {changed}シートを取り込みました')
+            print(f'{len(store.persons())}人・{len(store.rounds())}回の記録: {store.path}')
+        elif args.command == 'rounds':
+            for source, name, start_date, count in store.rounds():
+                print(f'{name} | {format_date(start_date) if start_date else "開始日不明"} | {count}人 | {source}')
+        elif args.command == 'footprint':
+            plain, compact = (frame_memory(store.entries(compact=c)) for c in (False, True))
+            print(f'{"列":<8}{"変換前":>12}{"省メモリ形式":>14}')
+            for column in plain:
+                print(f'{column:<8}{plain[column]:>12,}{compact[column]:>14,}')
+            total, compact_total = sum(plain.values()), sum(compact.values())
+            print(f'{"合計":<8}{total:>12,}{compact_total:>14,}（{compact_total / max(total, 1):.0%}）')
+        else:
+            df = store.entries(args.student, args.day, args.category)
+            for row in df.itertuples(index=False):
+                print(' | '.join(str(v).replace('\n', ' ') for v in row))
+            print(f'{len(df)}件')
+    finally:
+        store.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
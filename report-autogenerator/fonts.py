@@ -0,0 +1,24 @@
+import functools
+
+# 日本語フォント（IPAゴシック）
+FONT_NAME = 'IPAGothic'
+FONT_PATH = '/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf'
+
+@functools.lru_cache(maxsize=None)
+def register_pdf_font():
+    """reportlabにIPAフォントを登録（プロセスごとに1回だけ実行され、2回目以降は何もしない）"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    return FONT_NAME
+
+@functools.lru_cache(maxsize=None)
+def setup_matplotlib_font():
+    """matplotlibの既定フォントをIPAフォントにする（プロセスごとに1回だけ実行）"""
+    import matplotlib
+    from matplotlib import font_manager
+    font_manager.fontManager.addfont(FONT_PATH)
+    # 環境によってはIPAexGothicなど別名で登録されるため、フォントファイルの名前を使う
+    family = font_manager.FontProperties(fname=FONT_PATH).get_name()
+    matplotlib.rcParams['font.family'] = family
+    return family
@@ -1,20 +1,22 @@
 import pandas as pd
 import os
+from data_ingest import DATA_DIR, list_workbooks, workbook_sheet_names, iter_sheet_chunks
 
-# source_dataフォルダ内のExcelファイル一覧を取得
-data_dir = os.path.join(os.path.dirname(__file__), 'source_data')
-files = [f for f in os.listdir(data_dir) if f.endswith('.xlsx')]
+# 先頭から読む行数
+HEAD_ROWS = 5
 
-for file in files:
-    file_path = os.path.join(data_dir, file)
-    print(f'--- {file} ---')
-    # Excelファイルの全シート名を取得
-    xls = pd.ExcelFile(file_path)
-    print('シート一覧:', xls.sheet_names)
-    # 1つ目のシートを読み込んで先頭5行を表示
-    df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
+# source_dataフォルダ内のExcelファイル一覧を取得
+for file_path in list_workbooks(DATA_DIR):
+    print(f'--- {os.path.basename(file_path)} ---')
+    # Excelファイルの全シート名を取得（シートの中身は読まない）
+    print('シート一覧:', workbook_sheet_names(file_path))
+    # 1つ目のシートの先頭5行だけを読み取り専用モードで読む（ワークブック全体は読み込まない）
+    chunks = iter_sheet_chunks(file_path, columns=None, chunk_rows=HEAD_ROWS)
+    _, columns, rows = next(chunks)
+    chunks.close()
+    df = pd.DataFrame(rows, columns=columns)
     print('先頭5行:')
     print(df.head())
-    print('カラム情報:')
+    print('カラム情報（先頭5行から推定）:')
     print(df.dtypes)
     print('\n')
@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import resource
+import contextlib
+
+# 計測の有効・無効（無効の間はspanは何もしない）
+_enabled = False
+# 記録済みのspan
+_records = []
+# 実行中のspanのラベル（入れ子のspanは外側のラベルを引き継ぐ）
+_label_stack = [{}]
+
+# 無効時に返す何もしないコンテキスト（毎回作らない）
+_NULL_SPAN = contextlib.nullcontext()
+
+def enable(flag=True):
+    """計測を有効にする（ワーカープロセスでは各プロセスで呼ぶ）"""
+    global _enabled
+    _enabled = flag
+
+def is_enabled():
+    return _enabled
+
+def peak_rss_mb():
+    """このプロセスの最大常駐メモリ（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOSはバイト、Linuxはキロバイト単位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class _Span:
+    """経過時間・CPU時間・最大メモリを記録するコンテキスト"""
+
+    __slots__ = ('name', 'labels', 'wall', 'cpu', 'rss')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        _label_stack.append(self.labels)
+        self.rss = peak_rss_mb()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        _label_stack.pop()
+        peak = peak_rss_mb()
+        _records.append({
+            'name': self.name,
+            **self.labels,
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(cpu, 6),
+            'peak_rss_mb': round(peak, 1),
+            'rss_growth_mb': round(peak - self.rss, 1),
+            'pid': os.getpid(),
+        })
+        return False
+
+def span(name, **labels):
+    """
+    処理区間を計測するコンテキストマネージャ
+
+    with span('report.build'):
+        doc.build(story)
+
+    ラベル（student・stageなど）は外側のspanから引き継ぐ。計測が無効の場合は何もしない
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, {**_label_stack[-1], **labels})
+
+def drain():
+    """記録済みのspanを取り出して消去（ワーカーから親プロセスへ渡す）"""
+    records = list(_records)
+    _records.clear()
+    return records
+
+def summarize(records, keys):
+    """
+    spanをキーごとに集計
+
+    Returns:
+        list: キーの値と回数・合計時間・最大メモリの辞書
+    """
+    groups = {}
+    for r in records:
+        key = tuple(r.get(k) for k in keys)
+        g = groups.setdefault(key, {'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': 0.0})
+        g['count'] += 1
+        g['wall_seconds'] += r['wall_seconds']
+        g['cpu_seconds'] += r['cpu_seconds']
+        g['peak_rss_mb'] = max(g['peak_rss_mb'], r['peak_rss_mb'])
+    return [
+        {**dict(zip(keys, key)), **{k: round(v, 6) if isinstance(v, float) else v for k, v in g.items()}}
+        for key, g in sorted(groups.items(), key=lambda item: -item[1]['wall_seconds'])
+    ]
+
+def write_report(path, records, run_info=None):
+    """実行レポート（全span・span名別・学生×ステージ別の集計）をJSONで保存"""
+    from data_ingest import write_json
+    tasks = [r for r in records if r['name'] == 'task']
+    write_json(path, {
+        'run': run_info or {},
+        'by_span': summarize(records, ('name', 'stage')),
+        'by_student_stage': summarize(tasks, ('student', 'stage')),
+        'spans': records,
+    })
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def write_prometheus(path, records, prefix='multas'):
+    """node_exporterのtextfile collector形式で、span名・ステージ別の集計を書き出す"""
+    # (集計のキー, メトリクス名, 種類, 説明)
+    metrics = (
+        ('wall_seconds', 'wall_seconds_total', 'counter', 'Wall-clock seconds spent in the span'),
+        ('cpu_seconds', 'cpu_seconds_total', 'counter', 'CPU seconds spent in the span'),
+        ('count', 'runs_total', 'counter', 'Number of times the span ran'),
+        ('peak_rss_mb', 'peak_rss_megabytes', 'gauge', 'Peak resident memory of the process at span end'),
+    )
+    summary = summarize(records, ('name', 'stage'))
+    lines = []
+    for metric, name, kind, help_text in metrics:
+        full_name = f'{prefix}_span_{name}'
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        for row in summary:
+            labels = f'span="{_escape(row["name"])}",stage="{_escape(row["stage"] or "")}"'
+            lines.append(f'{full_name}{{{labels}}} {row[metric]}')
+    # 収集中に読まれても途中の内容にならないよう一時ファイルから置き換える
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
@@ -0,0 +1,133 @@
+import os
+import uuid
+import shutil
+import tempfile
+import threading
+import traceback
+import multiprocessing
+from pipeline import run_pipeline, DEFAULT_STAGES
+from quality import DEFAULT_PROFILE
+from manifest import Manifest
+
+# 同時に実行するジョブ数（それ以上は順番待ち）
+MAX_RUNNING_JOBS = 1
+# 終了後も保持しておくジョブ数（古いものから作業フォルダごと削除）
+MAX_FINISHED_JOBS = 10
+
+class CohortJob:
+    """
+    全学生の成果物生成をバックグラウンドスレッドで実行するジョブ
+
+    ジョブごとに作業フォルダを作り、アップロードされたワークブックと出力をそこに置く
+    """
+
+    def __init__(self, filename, data, stages=DEFAULT_STAGES, workers=None, profile=DEFAULT_PROFILE):
+        self.id = uuid.uuid4().hex[:12]
+        self.filename = filename
+        self.stages = stages
+        self.workers = workers
+        self.profile = profile
+        self.work_dir = tempfile.mkdtemp(prefix=f'multas_job_{self.id}_')
+        self.data_dir = os.path.join(self.work_dir, 'source_data')
+        self.output_dir = os.path.join(self.work_dir, 'output')
+        os.makedirs(self.data_dir)
+        with open(os.path.join(self.data_dir, os.path.basename(filename)), 'wb') as f:
+            f.write(data)
+
+        self.status = 'queued'  # queued / running / done / failed / cancelled
+        self.tasks = {}         # (シート名, ステージ) -> タスクの状態
+        self.failed = []        # 失敗したタスクの (シート名, ステージ, エラー内容)
+        self.error = None
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    def run(self, slots):
+        """ジョブを実行（slotsで同時実行数を制限）"""
+        with slots:
+            if self._cancel.is_set():
+                self.status = 'cancelled'
+                return
+            self.status = 'running'
+            try:
+                self.failed = run_pipeline(
+                    stages=self.stages,
+                    data_dir=self.data_dir,
+                    output_dir=self.output_dir,
+                    workers=self.workers,
+                    profile=self.profile,
+                    on_event=self._on_event,
+                    cancel_event=self._cancel,
+                    # Streamlitのようなマルチスレッドのプロセスからforkしない
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                self.status = 'cancelled' if self._cancel.is_set() else 'done'
+            except Exception:
+                self.error = traceback.format_exc()
+                self.status = 'failed'
+
+    def _on_event(self, sheet, stage, state):
+        with self._lock:
+            self.tasks[(sheet, stage)] = state
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def progress(self):
+        """
+        学生ごとの進捗
+
+        Returns:
+            dict: {シート名: {ステージ: 状態}}
+            int: 終了したタスク数
+            int: 全タスク数
+        """
+        with self._lock:
+            tasks = dict(self.tasks)
+        students = {}
+        for (sheet, stage), state in tasks.items():
+            students.setdefault(sheet, {})[stage] = state
+        finished = sum(state not in ('pending', 'running') for state in tasks.values())
+        return students, finished, len(tasks)
+
+    def results(self):
+        """学生ごとの出力ファイルのパス {シート名: [パス, ...]}"""
+        students = Manifest(self.output_dir).data['students']
+        return {
+            sheet: [os.path.join(self.output_dir, f) for stage in artifacts.values() for f in stage['outputs']]
+            for sheet, artifacts in students.items()
+        }
+
+    def cleanup(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+class JobManager:
+    """ジョブの受付・実行・保持（Streamlitではst.cache_resourceで1つだけ作る）"""
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_finished=MAX_FINISHED_JOBS):
+        self.jobs = {}
+        self.max_finished = max_finished
+        self._slots = threading.BoundedSemaphore(max_running)
+        self._lock = threading.Lock()
+
+    def submit(self, filename, data, **kwargs):
+        """ワークブックの内容を受け取ってジョブを登録し、バックグラウンドで開始"""
+        job = CohortJob(filename, data, **kwargs)
+        with self._lock:
+            self.jobs[job.id] = job
+            self._prune()
+        threading.Thread(target=job.run, args=(self._slots,), daemon=True).start()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        """終了したジョブが多すぎる場合は古いものから削除"""
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            job.cleanup()
+            del self.jobs[job.id]
@@ -0,0 +1,153 @@
+import argparse
+import os
+import sys
+import time
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from aggregate import CATEGORY_NAMES, category_totals
+from data_ingest import DATA_DIR
+from entry_store import ingest_workbooks, format_date
+from fonts import FONT_NAME, register_pdf_font
+from instrument import span
+from quality import PROFILES, DEFAULT_PROFILE, get_profile
+from stats_analysis import RADAR_WIDTH, add_stats_styles
+
+# 出力フォルダ
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# 前回までの回の線の色（古い回から順に使う。最新の回はradar_chart.LINE_COLOR）
+ROUND_COLORS = ('#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#bcbd22', '#17becf')
+
+def round_label(index, start_date):
+    """回の表示名（回1 (2025/7/28) など）"""
+    return f'回{index + 1}' + (f' ({format_date(start_date)})' if start_date else '')
+
+def create_round_table(rounds, matrices):
+    """分類×回の記録数テーブルを作成（未分類は合計にだけ含める）"""
+    header = ['分類 \\ 回'] + [f'回{i + 1}' for i in range(len(rounds))]
+    data = [header]
+    for category in range(1, 13):
+        data.append([CATEGORY_NAMES[category]] + [str(m[category].sum()) for m in matrices])
+    data.append(['合計'] + [str(m.sum()) for m in matrices])
+
+    round_width = min(45, (A4[0] - 50*mm - 130) / max(len(rounds), 1))
+    table = Table(data, colWidths=[130] + [round_width] * len(rounds))
+    table.setStyle(TableStyle([
+        ('FONT', (0, 0), (-1, -1), FONT_NAME),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),  # ヘッダー行の背景
+        ('BACKGROUND', (0, -1), (-1, -1), colors.grey),  # 合計行の背景
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ]))
+    return table
+
+def create_longitudinal_story(person, rounds, matrices, styles, doc_width):
+    """
+    1人分の実習ごとの推移のflowable一覧を作成
+
+    Parameters:
+        person (str): 学生（学年の接頭辞を除いた名前）
+        rounds (list): EntryStore.person_historyの回の一覧
+        matrices (np.ndarray): EntryStore.person_historyの記録数 (回数, 13, 日数)
+        styles: add_stats_stylesを適用したスタイルシート
+    """
+    from radar_chart import create_radar_drawing
+
+    story = [Paragraph(f'{person}の実習ごとの経験の推移', styles['StatsTitle']), Spacer(1, 10)]
+
+    # 最新の回を塗りつぶし、前回までの回を線で重ねる
+    labels = [round_label(i, start_date) for i, (_, _, start_date) in enumerate(rounds)]
+    series = [
+        (label, category_totals(matrix), ROUND_COLORS[i % len(ROUND_COLORS)])
+        for i, (label, matrix) in enumerate(zip(labels[:-1], matrices[:-1]))
+    ]
+    radar = create_radar_drawing(
+        category_totals(matrices[-1]), labels[-1], RADAR_WIDTH, FONT_NAME, series=series,
+        title=f'{person}の臨床実習経験レーダーチャート（回ごと）'
+    )
+    chart_table = Table([[radar]], colWidths=[doc_width])
+    chart_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    story.append(chart_table)
+    story.append(Spacer(1, 20))
+
+    story.append(Paragraph('分類別記録数の推移', styles['StatsHeading']))
+    story.append(Spacer(1, 6))
+    story.append(create_round_table(rounds, matrices))
+    story.append(Spacer(1, 10))
+    for label, (_, name, _) in zip(labels, rounds):
+        story.append(Paragraph(f'{label}: {name}', styles['Normal']))
+    return story
+
+def create_longitudinal_report(person, rounds, matrices, output_path, profile=None):
+    """1人分の実習ごとの推移のPDFを生成（profileは出力品質のプロファイル名、省略時は印刷用）"""
+    register_pdf_font()
+    doc = SimpleDocTemplate(
+        output_path,
+        pagesize=A4,
+        rightMargin=25*mm,
+        leftMargin=25*mm,
+        topMargin=20*mm,
+        bottomMargin=20*mm,
+        pageCompression=get_profile(profile)['page_compression']
+    )
+    styles = add_stats_styles(getSampleStyleSheet())
+    styles['Normal'].fontName = FONT_NAME
+    story = create_longitudinal_story(person, rounds, matrices, styles, doc.width)
+    with span('longitudinal.build'):
+        doc.build(story)
+
+def write_longitudinal_reports(data_dir=DATA_DIR, output_dir=OUTPUT_DIR, persons=None, store_path=None,
+                               profile=None):
+    """
+    学生ごとの実習ごとの推移のPDF（{学生}_longitudinal.pdf）を生成
+
+    データフォルダのワークブックを取り込んでから、記録ストアの回ごとの集計（round_counts）だけを読む。
+    ワークブックを消した過去の回もストアに残っていれば推移に含める
+
+    Parameters:
+        persons (list): 対象の学生（学年の接頭辞を除いた名前、Noneなら全員）
+
+    Returns:
+        list: 生成したPDFのパス
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    store, _ = ingest_workbooks(data_dir, store_path)
+    paths = []
+    with store:
+        for person in persons or store.persons():
+            rounds, matrices = store.person_history(person)
+            if not rounds:
+                print(f'記録がありません: {person}', file=sys.stderr)
+                continue
+            path = os.path.join(output_dir, f'{person}_longitudinal.pdf')
+            create_longitudinal_report(person, rounds, matrices, path, profile)
+            paths.append(path)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='記録ストアの回ごとの集計から学生ごとの実習の推移のPDFを生成')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='出力フォルダ')
+    parser.add_argument('--store', default=None, help='記録ストアのパス（既定: データフォルダと同じ階層の store/）')
+    parser.add_argument('--person', action='append', default=None,
+                        help='対象の学生（学年の接頭辞を除いた名前、複数指定可。既定: 全員）')
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE, help='出力品質のプロファイル')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    paths = write_longitudinal_reports(args.data_dir, args.output_dir, args.person, args.store, args.profile)
+    print(f'{len(paths)}人分を生成しました（{time.perf_counter() - start:.1f}秒）')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
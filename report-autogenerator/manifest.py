@@ -0,0 +1,63 @@
+import os
+import json
+import hashlib
+from data_ingest import load_json, write_json
+
+MANIFEST_NAME = 'manifest.json'
+
+def artifact_key(input_hash, stage, version, dep_keys=(), options=None):
+    """成果物の入力キーを計算（シート内容・生成器バージョン・依存成果物のキー・出力オプション）"""
+    h = hashlib.sha256()
+    options = json.dumps(options or {}, sort_keys=True)
+    for part in (input_hash, stage, str(version), *dep_keys, options):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class Manifest:
+    """
+    output/ 内の成果物とその入力キーの記録
+
+    {"students": {シート名: {ステージ: {"key", "version", "outputs"}}}}
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.data = load_json(self.path, {'students': {}})
+
+    def entry(self, sheet, stage):
+        return self.data['students'].get(sheet, {}).get(stage)
+
+    def is_fresh(self, sheet, stage, key):
+        """記録済みのキーが一致し、出力ファイルがすべて残っていれば最新"""
+        entry = self.entry(sheet, stage)
+        if entry is None or entry['key'] != key:
+            return False
+        return all(os.path.exists(os.path.join(self.output_dir, f)) for f in entry['outputs'])
+
+    def record(self, sheet, stage, key, version, outputs):
+        """成果物を記録し、前回あって今回作られなかった出力は削除する"""
+        previous = self.entry(sheet, stage)
+        if previous:
+            for f in set(previous['outputs']) - set(outputs):
+                path = os.path.join(self.output_dir, f)
+                if os.path.exists(path):
+                    os.remove(path)
+        self.data['students'].setdefault(sheet, {})[stage] = {
+            'key': key,
+            'version': version,
+            'outputs': sorted(outputs),
+        }
+
+    def forget(self, sheet):
+        """学生の記録と出力ファイルを削除（ワークブックからシートがなくなった場合）"""
+        for entry in self.data['students'].pop(sheet, {}).values():
+            for f in entry['outputs']:
+                path = os.path.join(self.output_dir, f)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        write_json(self.path, self.data)
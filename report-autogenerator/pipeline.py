@@ -0,0 +1,485 @@
+import argparse
+import contextlib
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from data_ingest import DATA_DIR
+from entry_store import EntryStore, ingest_workbooks
+from manifest import Manifest, artifact_key
+import instrument
+from instrument import span
+from quality import PROFILES, DEFAULT_PROFILE
+
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# ステージ定義（ステージ名: 依存するステージ）
+# radarはPNG画像の書き出し。統計PDFは既定ではレーダーチャートをベクター図形で直接描画する
+STAGES = {
+    'radar': (),
+    'stats': (),
+    'report': (),
+    'wordcloud': (),
+}
+
+# 統計PDFにPNG画像を埋め込む場合は、radarの完了後に実行する
+PNG_RADAR_STAGES = dict(STAGES, stats=('radar',))
+
+# 既定で実行するステージ（レーダーチャートPNGは必要な場合のみ --stages で指定）
+DEFAULT_STAGES = ('stats', 'report', 'wordcloud')
+
+# 生成器のバージョン（出力内容が変わる修正をしたら上げると再生成される）
+STAGE_VERSIONS = {
+    'radar': 2,
+    'stats': 3,
+    'report': 3,
+    'wordcloud': 1,
+}
+
+# 全体平均などを重ねて表示するステージ
+COHORT_STAGES = ('radar', 'stats')
+
+# 分類×日別の記録数を集計するステージ（重複を除く指定のときは同じ学生の重複を数えない）
+AGGREGATE_STAGES = ('radar', 'stats')
+
+# タスクの状態（run_pipelineのon_eventに渡される）
+TASK_STATES = ('pending', 'running', 'done', 'cached', 'failed', 'skipped', 'cancelled')
+
+# 計測を有効にした場合の実行レポートのファイル名
+RUN_REPORT_NAME = 'run_report.json'
+
+# キャンセル要求を確認する間隔（秒）
+CANCEL_POLL_SECONDS = 0.5
+
+# ワーカープロセスごとに1回だけ用意する資源
+_worker = {}
+
+def _init_worker(stages, radar_mode, instrumented=False):
+    """ワーカー起動時に、実行するステージが使う生成器・フォント・MeCabだけを読み込む"""
+    instrument.enable(instrumented)
+    from fonts import register_pdf_font, setup_matplotlib_font
+    if 'radar' in stages or 'wordcloud' in stages:
+        setup_matplotlib_font()
+    if 'stats' in stages or 'report' in stages:
+        register_pdf_font()
+    if 'radar' in stages:
+        import radar_chart  # noqa: F401
+    if 'stats' in stages:
+        import stats_analysis  # noqa: F401
+        if radar_mode == 'vector':
+            import radar_chart  # noqa: F401,F811
+    if 'report' in stages:
+        import pdf_report  # noqa: F401
+    if 'wordcloud' in stages:
+        import MeCab
+        import word_cloud  # noqa: F401
+        from tokenizer import init_tokenizer_worker
+        _worker['mecab'] = MeCab.Tagger()
+        # tokenize_cohortの一括解析にも同じTaggerを使う
+        init_tokenizer_worker(_worker['mecab'])
+
+def _student_store(sheet, options):
+    """記録ストアと学生の記録を読む回を取得（接続はワーカープロセスごとに1つ）"""
+    store = _worker.get('store')
+    if store is None or store.path != options['store']:
+        if store is not None:
+            store.close()
+        store = _worker['store'] = EntryStore(options['store'], readonly=True)
+    return store, options['sources'][sheet]
+
+def run_stage(stage, sheet, output_dir, options, actions=None):
+    """
+    1人分・1ステージを実行（ワーカープロセス内で呼ばれる）
+
+    Parameters:
+        options (dict): 出力オプション（radar_mode、profile: 出力品質、cohort: 全体の統計またはNone、
+            store: 記録ストアのパス、sources: {シート名: 使う回のワークブック名}、
+            dedup: レポートPDFに重複の印を付ける、exclude_duplicates: 集計から同じ学生の重複を除く、
+            duplicates: dedup.detect_duplicatesの学生ごとのハッシュ）
+        actions (dict): wordcloudステージでtokenize_cohortが解析済みの {API分類: [動詞, ...]}
+            （省略時はこのタスクで解析する）
+
+    Returns:
+        list: 出力したファイル名（output_dirからの相対パス）
+    """
+    store, source = _student_store(sheet, options)
+    df = store.entries(sheet, sources=[source])
+    duplicates = store.duplicates(sheet, source) if options.get('dedup') else None
+    if options.get('exclude_duplicates') and stage in AGGREGATE_STAGES:
+        # 同じ学生が繰り返し貼り付けた記録は2件目以降を数えない（行番号 = 記録のseq）
+        df = df.drop(index=duplicates.loc[duplicates['excluded'], 'seq'])
+
+    if stage == 'radar':
+        import radar_chart
+        from aggregate import count_matrix, category_totals, cohort_category_values, displayed_cohort
+        cohort = cohort_category_values(displayed_cohort(options['cohort'], stage)) if options.get('cohort') else None
+        radar_chart.create_radar_chart(
+            category_totals(count_matrix(df)), sheet, output_dir, cohort, options.get('profile')
+        )
+        outputs = [f'{sheet}_radar.png']
+    elif stage == 'stats':
+        import stats_analysis
+        from aggregate import displayed_cohort
+        outputs = [f'{sheet}_stats.pdf']
+        stats_analysis.create_stats_report(
+            df, sheet, os.path.join(output_dir, outputs[0]), radar_mode=options['radar_mode'],
+            cohort=displayed_cohort(options['cohort'], stage) if options.get('cohort') else None,
+            profile=options.get('profile')
+        )
+    elif stage == 'report':
+        import pdf_report
+        outputs = [f'{sheet}_report.pdf']
+        pdf_report.create_pdf_report(
+            df, sheet, os.path.join(output_dir, outputs[0]), options.get('profile'), store.day_dates(source),
+            duplicates
+        )
+    elif stage == 'wordcloud':
+        import word_cloud
+        paths = word_cloud.create_student_wordclouds(
+            df, sheet, output_dir, _worker['mecab'], actions=actions, profile=options.get('profile')
+        )
+        outputs = [os.path.relpath(p, output_dir) for p in paths]
+    else:
+        raise ValueError(f'不明なステージ: {stage}')
+    return outputs
+
+def tokenize_cohort(sheets, options, pool):
+    """
+    ワードクラウドを作る学生の全テキストをワーカーのプールでまとめて形態素解析し、学生・API分類ごとの動詞にまとめる
+
+    解析キャッシュ（tokenizer.TokenCache）の問い合わせと保存はここで1回だけ行い、
+    学生ごとのタスクには動詞の一覧を渡すため、タスク側では解析もキャッシュの読み書きもしない
+
+    Returns:
+        dict: {シート名: {API分類: [動詞の基本形, ...]}}（記録のない学生は空のdict）
+    """
+    import MeCab
+    from tokenizer import TokenCache, batch_tokenize, cohort_texts, dictionary_version, group_actions
+    with EntryStore(options['store'], readonly=True) as store:
+        records = cohort_texts(
+            (sheet, store.entries(sheet, sources=[options['sources'][sheet]], columns=['API検証', '入力内容']))
+            for sheet in sheets
+        )
+    mecab = MeCab.Tagger()
+    cache = TokenCache(dictionary_version(mecab))
+    try:
+        tokens = batch_tokenize([text for _, _, text in records], cache=cache, mecab=mecab, pool=pool)
+    finally:
+        cache.close()
+    actions = {sheet: {} for sheet in sheets}
+    for (sheet, category), verbs in group_actions(records, tokens).items():
+        actions[sheet][category] = verbs
+    return actions
+
+def _run_task(stage, sheet, output_dir, options, actions=None):
+    """run_stageを実行し、出力ファイル名とこのタスクで記録されたspanを返す"""
+    with span('task', student=sheet, stage=stage):
+        outputs = run_stage(stage, sheet, output_dir, options, actions)
+    return outputs, instrument.drain()
+
+def stage_table(radar_mode):
+    """レーダーチャートの埋め込み方法に応じたステージ依存関係"""
+    return PNG_RADAR_STAGES if radar_mode == 'png' else STAGES
+
+def resolve_stages(stages, table=STAGES):
+    """指定ステージに依存ステージを加え、定義順に並べる"""
+    selected = set()
+    def add(stage):
+        if stage not in table:
+            raise ValueError(f'不明なステージ: {stage}')
+        selected.add(stage)
+        for dep in table[stage]:
+            add(dep)
+    for stage in stages:
+        add(stage)
+    return [s for s in table if s in selected]
+
+def stage_options(stage, options, sheet=None):
+    """
+    成果物の内容に影響するオプションだけを取り出す（入力キーに含める）
+
+    全体の統計を重ねるステージは表示する値（aggregate.displayed_cohort）だけを含め、誰か1人の記録が変わっても
+    表示される全体平均などが変わらなければ他の学生の分は作り直さない。
+    重複の判定はその学生（sheet）の判定を使うステージのキーにだけ含める
+    """
+    selected = {'profile': options.get('profile') or DEFAULT_PROFILE}
+    if stage == 'stats':
+        selected['radar_mode'] = options['radar_mode']
+    if stage in COHORT_STAGES and options.get('cohort'):
+        from aggregate import displayed_cohort
+        selected['cohort'] = displayed_cohort(options['cohort'], stage)
+    digests = options.get('duplicates', {}).get(sheet, {})
+    if stage == 'report' and 'marks' in digests:
+        selected['duplicates'] = digests['marks']
+    if stage in AGGREGATE_STAGES and options.get('exclude_duplicates') and 'excluded' in digests:
+        selected['excluded'] = digests['excluded']
+    return selected
+
+def build_task_graph(students, stages, table=STAGES, options=None):
+    """
+    学生ごとのタスクグラフと各タスクの入力キーを作成
+
+    Returns:
+        dict: (シート名, ステージ) -> 依存タスクのリスト
+        dict: (シート名, ステージ) -> 入力キー
+    """
+    graph, keys = {}, {}
+    for sheet, input_hash in students:
+        # stagesは依存順に並んでいるので、依存タスクのキーは先に計算済み
+        for stage in stages:
+            deps = [(sheet, dep) for dep in table[stage] if dep in stages]
+            graph[(sheet, stage)] = deps
+            keys[(sheet, stage)] = artifact_key(
+                input_hash, stage, STAGE_VERSIONS[stage], [keys[dep] for dep in deps],
+                stage_options(stage, options or {}, sheet)
+            )
+    return graph, keys
+
+def list_students(store, sources):
+    """
+    取り込み済みの記録ストアから学生の一覧を取得
+
+    同じシート名が複数のワークブック（実習の回）にある学生は最新の回の記録から生成する
+
+    Parameters:
+        store (EntryStore): entry_store.ingest_workbooksで取り込んだストア
+        sources (list): 対象のワークブック名
+
+    Returns:
+        list: (シート名, 内容ハッシュ) のリスト
+        dict: {シート名: 使う回のワークブック名}
+    """
+    latest = store.students(sources)
+    return [(sheet, h) for sheet, (_, h) in latest.items()], {sheet: source for sheet, (source, _) in latest.items()}
+
+def cohort_statistics(store, students, exclude_duplicates=False):
+    """
+    全学生の分類×日別の記録数を記録ストアの索引から集計し、学生間の平均・パーセンタイルを計算
+
+    studentsは {シート名: 使う回のワークブック名}（list_studentsの戻り値）。
+    exclude_duplicatesを指定すると同じ学生の重複の記録（dedup.detect_duplicatesの判定）を数えない
+    """
+    from aggregate import cohort_summary
+    return cohort_summary(store.count_matrices(students, exclude_duplicates=exclude_duplicates))
+
+def make_pool(stages, workers=None, radar_mode='vector', instrumented=False, mp_context=None):
+    """指定ステージの生成器・フォント・MeCabを読み込んだワーカープロセスのプールを作成"""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(stages, radar_mode, instrumented), mp_context=mp_context)
+
+def run_pipeline(stages=None, data_dir=DATA_DIR, output_dir=OUTPUT_DIR, workers=None, force=False,
+                 radar_mode='vector', on_event=None, cancel_event=None, mp_context=None,
+                 report_path=None, prometheus_path=None, cohort=True, profile=DEFAULT_PROFILE,
+                 sheets=None, pool=None, store_path=None, dedup=False, exclude_duplicates=False):
+    """
+    全学生の指定ステージを依存関係に従って並列実行
+
+    manifest.jsonに記録された入力キーと一致し、出力が残っているタスクは
+    再生成しない（force=Trueの場合はすべて再生成）
+
+    Parameters:
+        on_event (callable): タスクの状態が変わるたびに (シート名, ステージ, 状態) で呼ばれる
+            状態は TASK_STATES のいずれか
+        cancel_event (threading.Event): セットされると未実行のタスクを取り消して終了する
+        mp_context: ワーカープロセスの起動方法（スレッドから呼ぶ場合は 'spawn' のコンテキストを推奨）
+        report_path (str): 指定すると学生・ステージごとの時間とメモリを計測し、実行レポートをJSONで保存
+        prometheus_path (str): 指定すると計測結果をPrometheusのtextfile形式でも保存
+        cohort (bool): レーダーチャート・統計PDFに全体平均などを併記する
+        profile (str): 出力品質のプロファイル名（quality.PROFILES参照）。プロファイルを変えると作り直しになる
+        sheets (iterable): 指定するとこの学生のタスクだけを実行する（全体の統計は全学生から計算）
+        pool (ProcessPoolExecutor): 指定するとワーカーを起動せずこのプールで実行する
+            （make_poolで作ったもの。監視モードのようにフォントやMeCabを読み込んだまま使い回す場合）
+        store_path (str): 記録ストアのパス（既定: データフォルダと同じ階層の store/entries.sqlite3）
+        dedup (bool): ほぼ同じ内容の記録を探し、レポートPDFに印を付ける
+        exclude_duplicates (bool): 同じ学生の重複の記録をレーダーチャート・統計PDF・全体の統計に数えない
+            （dedupを含む。他の学生と同じ内容の記録は印を付けるだけで数える）
+
+    Returns:
+        list: 失敗したタスクの (シート名, ステージ, エラー内容)
+    """
+    table = stage_table(radar_mode)
+    stages = resolve_stages(stages or DEFAULT_STAGES, table)
+    options = {
+        'radar_mode': radar_mode, 'profile': profile,
+        'dedup': dedup or exclude_duplicates, 'exclude_duplicates': exclude_duplicates,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    instrumented = bool(report_path or prometheus_path)
+    instrument.enable(instrumented)
+    started = time.time()
+    records = []
+
+    # 記録ストアへの取り込みは親プロセスで1回だけ行い、ワーカーは読むだけにする
+    with span('ingest', stage='ingest'):
+        store, sources = ingest_workbooks(data_dir, store_path)
+    with store:
+        students, options['sources'] = list_students(store, sources)
+        options['store'] = store.path
+        if options['dedup']:
+            # 重複は学生をまたいで探すため親プロセスで1回だけ判定し、判定が変わった学生の成果物だけ作り直す
+            from dedup import detect_duplicates
+            with span('dedup', stage='dedup'):
+                options['duplicates'] = detect_duplicates(store, options['sources'])
+        if cohort and any(stage in COHORT_STAGES for stage in stages):
+            # 全体の統計は親プロセスで1回だけ計算し、各タスクに渡す
+            with span('cohort', stage='cohort'):
+                options['cohort'] = cohort_statistics(store, options['sources'], exclude_duplicates)
+    # fork したワーカーに親の記録が複製されないよう先に取り出しておく
+    records.extend(instrument.drain())
+    if sheets is not None:
+        sheets = set(sheets)
+        students = [s for s in students if s[0] in sheets]
+    graph, keys = build_task_graph(students, stages, table, options)
+    manifest = Manifest(output_dir)
+    emit = on_event or (lambda sheet, stage, state: None)
+
+    done, failed = set(), []
+    skipped = set()
+    remaining = dict(graph)
+    for task in graph:
+        if not force and manifest.is_fresh(*task, keys[task]):
+            # 入力が変わっていないタスクは完了済みとして扱う
+            done.add(task)
+            del remaining[task]
+            emit(*task, 'cached')
+        else:
+            emit(*task, 'pending')
+    print(f'{len(students)}人 / {len(graph)}タスク中 {len(remaining)}タスクを実行します（ステージ: {", ".join(stages)}）')
+    total, completed = len(remaining), 0
+    running = {}
+    try:
+        if not remaining:
+            return failed
+        if pool is None:
+            executor = make_pool(stages, workers, radar_mode, instrumented, mp_context)
+        else:
+            # 呼び出し側のプールは終了させない
+            executor = contextlib.nullcontext(pool)
+        with executor as pool:
+            wordcloud_sheets = [sheet for sheet, stage in remaining if stage == 'wordcloud']
+            actions = {}
+            if wordcloud_sheets:
+                with span('tokenize', stage='tokenize'):
+                    actions = tokenize_cohort(wordcloud_sheets, options, pool)
+            while remaining or running:
+                if cancel_event is not None and cancel_event.is_set():
+                    # 未開始のタスクを取り消す（実行中のものは終わるまで待つ）
+                    for future, task in running.items():
+                        if future.cancel():
+                            emit(*task, 'cancelled')
+                    for task in remaining:
+                        emit(*task, 'cancelled')
+                    remaining.clear()
+                    running = {f: t for f, t in running.items() if not f.cancelled()}
+                    print('キャンセルされました', file=sys.stderr)
+
+                # 依存が完了したタスクを投入
+                for task, deps in list(remaining.items()):
+                    if any(dep in skipped for dep in deps):
+                        # 依存タスクが失敗した場合は実行しない
+                        skipped.add(task)
+                        del remaining[task]
+                        emit(*task, 'skipped')
+                    elif all(dep in done for dep in deps):
+                        sheet, stage = task
+                        # ワードクラウドのタスクにはその学生の解析結果だけを渡す
+                        future = pool.submit(_run_task, stage, sheet, output_dir, options, actions.get(sheet))
+                        running[future] = task
+                        del remaining[task]
+                        emit(sheet, stage, 'running')
+
+                if not running:
+                    continue
+
+                # キャンセルを確認できるよう、一定時間ごとに待機を抜ける
+                finished, _ = wait(running, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    sheet, stage = task
+                    completed += 1
+                    try:
+                        outputs, task_records = future.result()
+                        records.extend(task_records)
+                        manifest.record(sheet, stage, keys[task], STAGE_VERSIONS[stage], outputs)
+                        done.add(task)
+                        emit(sheet, stage, 'done')
+                        print(f'完了: {sheet} - {stage} ({completed}/{total})')
+                    except Exception:
+                        skipped.add(task)
+                        failed.append((sheet, stage, traceback.format_exc()))
+                        emit(sheet, stage, 'failed')
+                        print(f'失敗: {sheet} - {stage} ({completed}/{total})', file=sys.stderr)
+    finally:
+        # 中断された場合も完了分は記録しておく
+        manifest.save()
+        if instrumented:
+            records.extend(instrument.drain())
+            run_info = {
+                'started': started,
+                'wall_seconds': round(time.time() - started, 3),
+                'stages': stages,
+                'profile': profile,
+                'workers': workers or os.cpu_count(),
+                'students': len(students),
+                'tasks': len(graph),
+                'executed': completed,
+                'failed': len(failed),
+            }
+            if report_path:
+                instrument.write_report(report_path, records, run_info)
+            if prometheus_path:
+                instrument.write_prometheus(prometheus_path, records)
+
+    for sheet, stage in sorted(skipped - {(s, st) for s, st, _ in failed}):
+        print(f'スキップ（依存タスクの失敗）: {sheet} - {stage}', file=sys.stderr)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='レーダーチャート・統計PDF・レポートPDF・ワードクラウドを一括生成')
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f'実行するステージ（カンマ区切り、依存ステージは自動で追加）: {",".join(STAGES)}')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（既定: CPUコア数）')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='出力フォルダ')
+    parser.add_argument('--force', action='store_true', help='変更のない学生も含めてすべて再生成')
+    parser.add_argument('--radar-png', action='store_true',
+                        help='統計PDFにレーダーチャートのPNG画像を埋め込む（既定はベクター図形で直接描画）')
+    parser.add_argument('--no-cohort', action='store_true',
+                        help='レーダーチャート・統計PDFに全体平均などを併記しない')
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE,
+                        help='出力品質のプロファイル（preview: 下書き、screen: 画面表示、print: 印刷）')
+    parser.add_argument('--dedup', action='store_true', help='ほぼ同じ内容の記録を探し、レポートPDFに印を付ける')
+    parser.add_argument('--exclude-duplicates', action='store_true',
+                        help='同じ学生の重複の記録をレーダーチャート・統計PDFの集計から除く（--dedupを含む）')
+    parser.add_argument('--instrument', nargs='?', const='', default=None, metavar='REPORT',
+                        help='学生・ステージごとの時間とメモリを計測し、実行レポートをJSONで保存'
+                             '（既定: 出力フォルダ/run_report.json）')
+    parser.add_argument('--prometheus-textfile', default=None, metavar='PATH',
+                        help='計測結果をPrometheusのtextfile形式でも保存（--instrumentを含む）')
+    args = parser.parse_args(argv)
+
+    report_path = args.instrument
+    if report_path == '' or (report_path is None and args.prometheus_textfile):
+        report_path = os.path.join(args.output_dir, RUN_REPORT_NAME)
+
+    failed = run_pipeline(
+        stages=[s.strip() for s in args.stages.split(',') if s.strip()],
+        data_dir=args.data_dir,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        force=args.force,
+        radar_mode='png' if args.radar_png else 'vector',
+        report_path=report_path,
+        prometheus_path=args.prometheus_textfile,
+        cohort=not args.no_cohort,
+        profile=args.profile,
+        dedup=args.dedup,
+        exclude_duplicates=args.exclude_duplicates,
+    )
+    for sheet, stage, error in failed:
+        print(f'--- {sheet} - {stage} ---\n{error}', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import io
+
+# 出力品質のプロファイル
+# 下書きの確認には preview、画面での配布には screen、印刷には print（従来の設定）を使う
+#
+# dpi: 画像（レーダーチャート・ワードクラウド）の解像度
+# radar_size・wordcloud_size: 図の大きさ（インチ）
+# wordcloud_scale: ワードクラウドの配置を計算するキャンバスの倍率（800x400ピクセルが1.0）
+# png_compress_level: PNGの圧縮レベル（0〜9、小さいほど速いがファイルは大きい）
+# page_compression: reportlabのページ圧縮（1で有効）
+# image_dpi: PDFに埋め込む画像の解像度の上限（これより細かい画像は縮小して埋め込む）
+PROFILES = {
+    'preview': {
+        'dpi': 72,
+        'radar_size': (10, 10),
+        'wordcloud_size': (8, 4.8),
+        'wordcloud_scale': 0.5,
+        'png_compress_level': 1,
+        'page_compression': 0,
+        'image_dpi': 72,
+    },
+    'screen': {
+        'dpi': 120,
+        'radar_size': (14, 14),
+        'wordcloud_size': (10, 6),
+        'wordcloud_scale': 1.0,
+        'png_compress_level': 6,
+        'page_compression': 1,
+        'image_dpi': 150,
+    },
+    'print': {
+        'dpi': 300,
+        'radar_size': (14, 14),
+        'wordcloud_size': (10, 6),
+        'wordcloud_scale': 1.0,
+        'png_compress_level': 6,
+        'page_compression': 1,
+        'image_dpi': 300,
+    },
+}
+
+# 既定のプロファイル
+DEFAULT_PROFILE = 'print'
+
+def get_profile(name=None):
+    """プロファイル名から設定を取得（Noneなら既定のプロファイル）"""
+    try:
+        return PROFILES[name or DEFAULT_PROFILE]
+    except KeyError:
+        raise ValueError(f'不明な品質プロファイル: {name}（{", ".join(PROFILES)}から選択）') from None
+
+def savefig_options(profile):
+    """matplotlibのsavefigに渡す解像度とPNGの圧縮レベル"""
+    return {'dpi': profile['dpi'], 'pil_kwargs': {'compress_level': profile['png_compress_level']}}
+
+def downsampled_image(path, draw_width, profile):
+    """
+    PDFに埋め込む画像を表示幅（ポイント）とimage_dpiに合わせて縮小
+
+    Returns:
+        縮小した画像のPNGデータ（BytesIO）。縮小が不要ならpathをそのまま返す
+    """
+    from PIL import Image
+    max_pixels = int(draw_width / 72 * profile['image_dpi'])
+    with Image.open(path) as img:
+        if img.width <= max_pixels:
+            return path
+        height = round(img.height * max_pixels / img.width)
+        small = img.resize((max_pixels, height), Image.LANCZOS)
+    data = io.BytesIO()
+    small.save(data, format='PNG', compress_level=profile['png_compress_level'])
+    data.seek(0)
+    return data
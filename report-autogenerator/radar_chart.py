@@ -1,25 +1,22 @@
-import pandas as pd
 import os
-from collections import Counter
-import matplotlib.pyplot as plt
 import numpy as np
-import glob
-from matplotlib import font_manager
-
-# 日本語フォントの設定
-font_manager.fontManager.addfont('/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf')
-plt.rcParams['font.family'] = 'IPAGothic'
+from entry_store import iter_students
+from aggregate import cohort_count_matrices, category_totals, cohort_summary, cohort_category_values, displayed_cohort
+from fonts import FONT_NAME, setup_matplotlib_font
+from instrument import span
+from quality import get_profile, savefig_options
 
 # 定数定義
-CHART_SIZE = (14, 14)         # グラフのサイズをさらに大きく
 MARKER_STYLE = 'o-'          # マーカーと線のスタイル
 LINE_WIDTH = 2               # 線の太さ
 FILL_ALPHA = 0.25           # 塗りつぶしの透明度
 MIN_RADIUS = 6              # 最小半径（データが少ない場合の見やすさ確保）
 TICK_INTERVAL = 5           # 目盛りの間隔
 BASE_VALUE = 1              # 基準値（0点に相当する値）
-DPI = 300                   # 画像の解像度
 LABEL_PADDING = 1.25        # ラベルの余白調整（グラフをより外側に広げる）を増加
+LINE_COLOR = '#1f77b4'      # ベクター版の線・塗りの色（matplotlibの既定色と同じ）
+COHORT_COLOR = '#7f7f7f'    # 全体平均の比較線の色
+COHORT_LABEL = '全体平均'    # 全体平均の凡例
 
 def prepare_plot_data(counts):
     """データを12時方向から時計回りに準備"""
@@ -48,9 +45,15 @@ def prepare_plot_data(counts):
     
     return values, [category_names[h] for h in hours]
 
-def setup_radar_chart():
-    """レーダーチャートの基本設定"""
-    fig, ax = plt.subplots(figsize=CHART_SIZE, subplot_kw={'polar': True})
+def setup_radar_chart(size):
+    """レーダーチャートの基本設定（pyplotを使わず、図ごとに独立したキャンバスで描画、sizeはインチ）"""
+    # matplotlibは画像を書き出すときだけ読み込む（ベクター版では不要）
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    setup_matplotlib_font()
+    fig = Figure(figsize=size)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(projection='polar')
     ax.set_theta_zero_location('N')    # 0°を北（12時）に
     ax.set_theta_direction(-1)         # 時計回り
     return fig, ax
@@ -90,36 +93,163 @@ def configure_axes(ax, labels, values):
         label.set_horizontalalignment(ha)
         label.set_verticalalignment(va)
 
-def create_radar_chart(counts, sheet_name, out_dir):
+def create_radar_chart(counts, sheet_name, out_dir, cohort=None, profile=None):
     """
     API分類のレーダーチャートを生成
     
     Parameters:
-        counts (Counter): 1-12の値を持つCounterオブジェクト
+        counts (dict): 分類(1-12)ごとの記録数（aggregate.category_totalsの戻り値など）
         sheet_name (str): シート名（タイトルとファイル名に使用）
         out_dir (str): 出力ディレクトリのパス
+        cohort (dict): 比較用の全体平均 {分類: 記録数}（aggregate.cohort_category_valuesの戻り値）
+        profile (str): 出力品質のプロファイル名（quality.PROFILES参照、省略時は印刷用）
     """
+    settings = get_profile(profile)
     # データの準備
     values, labels = prepare_plot_data(counts)
     angles = np.linspace(0, 2*np.pi, len(values), endpoint=True)
     
     # グラフの基本設定
-    fig, ax = setup_radar_chart()
+    fig, ax = setup_radar_chart(settings['radar_size'])
+    try:
+        # データのプロット
+        plot_data(ax, values, angles, sheet_name)
+        if cohort:
+            # 全体平均を破線で重ねる
+            cohort_values, _ = prepare_plot_data(cohort)
+            ax.plot(angles, cohort_values, '--', color=COHORT_COLOR, linewidth=LINE_WIDTH, label=COHORT_LABEL)
+            ax.legend(loc='upper right', bbox_to_anchor=(1.15, 1.1), fontsize=14)
+        
+        # 軸と目盛りの設定
+        configure_axes(ax, labels, values)
+        
+        # タイトルの設定（フォントサイズを大きく）
+        ax.set_title(f'{sheet_name}の臨床実習経験レーダーチャート', fontsize=18, pad=20)
+        
+        # 画像の保存
+        out_path = os.path.join(out_dir, f'{sheet_name}_radar.png')
+        with span('radar.savefig'):
+            fig.savefig(out_path, bbox_inches='tight', **savefig_options(settings))
+    finally:
+        # 例外時も図を確実に破棄する
+        fig.clear()
+    print(f'レーダーチャート画像を保存: {out_path}')
+
+def create_radar_drawing(counts, sheet_name, width=400, font_name=FONT_NAME, cohort=None, series=None,
+                         title=None):
+    """
+    API分類のレーダーチャートをreportlabのDrawing（ベクター図形）として生成
     
-    # データのプロット
-    plot_data(ax, values, angles, sheet_name)
+    画像ファイルを経由せずPDFに直接埋め込める。フォントはreportlabに登録済みのものを使う
     
-    # 軸と目盛りの設定
-    configure_axes(ax, labels, values)
+    Parameters:
+        counts (dict): 分類(1-12)ごとの記録数
+        sheet_name (str): シート名（タイトルに使用）
+        width (float): 図の幅（pt）
+        font_name (str): 文字に使うreportlabのフォント名
+        cohort (dict): 比較用の全体平均 {分類: 記録数}。渡すと破線で重ねる
+        series (list): 重ねて描く他の系列 (凡例, {分類: 記録数}, 色) のリスト（前回までの実習など、塗りつぶさない）
+        title (str): タイトル（省略時は「〇〇の臨床実習経験レーダーチャート」）
     
-    # タイトルの設定（フォントサイズを大きく）
-    ax.set_title(f'{sheet_name}の臨床実習経験レーダーチャート', fontsize=18, pad=20)
+    Returns:
+        Drawing: PDFのstoryに追加できる図
+    """
+    from reportlab.graphics.shapes import Drawing, Circle, Line, Polygon, String
+    from reportlab.lib import colors
     
-    # 画像の保存
-    out_path = os.path.join(out_dir, f'{sheet_name}_radar.png')
-    plt.savefig(out_path, bbox_inches='tight', dpi=DPI)
-    plt.close()
-    print(f'レーダーチャート画像を保存: {out_path}')
+    values, labels = prepare_plot_data(counts)
+    values = values[:-1]  # 閉じるための末尾の値は不要
+    cohort_values = prepare_plot_data(cohort)[0][:-1] if cohort else []
+    series = [(label, prepare_plot_data(c)[0][:-1], color) for label, c, color in (series or [])]
+    
+    # 配置（左右は最長ラベルが収まる半径にし、上にタイトル分の高さを確保）
+    title_size = width * 0.03
+    label_size = width * 0.02
+    label_extent = max(len(label) for label in labels) * label_size
+    radius = (width / 2 - label_extent) / LABEL_PADDING
+    label_radius = radius * (1 + (LABEL_PADDING - 1) / 3)
+    chart_height = 2 * (label_radius + label_size * 1.5)
+    title_height = title_size * 2.5
+    drawing = Drawing(width, chart_height + title_height)
+    cx, cy = width / 2, chart_height / 2
+    
+    # 半径方向の目盛り（TICK_INTERVALごと、最小でもMIN_RADIUS）
+    rmax = max(max(values), max(cohort_values, default=0), *(max(v) for _, v, _ in series), MIN_RADIUS)
+    rmax = int(-(-rmax // TICK_INTERVAL) * TICK_INTERVAL)
+    scale = radius / rmax
+    
+    def point(index, value):
+        """12時方向から時計回りに30度ずつの位置"""
+        theta = np.deg2rad(index * 30)
+        return cx + value * scale * np.sin(theta), cy + value * scale * np.cos(theta)
+    
+    # グリッド線（同心円と放射線）
+    grid_color = colors.Color(0.7, 0.7, 0.7)
+    for r in range(TICK_INTERVAL, rmax + 1, TICK_INTERVAL):
+        drawing.add(Circle(cx, cy, r * scale, fillColor=None, strokeColor=grid_color, strokeWidth=0.5))
+        drawing.add(String(cx + 2, cy + r * scale + 2, str(r), fontName=font_name,
+                           fontSize=label_size * 0.8, fillColor=colors.grey))
+    for i in range(len(values)):
+        x, y = point(i, rmax)
+        drawing.add(Line(cx, cy, x, y, strokeColor=grid_color, strokeWidth=0.5))
+    
+    # 他の系列の線とマーカー（主の系列の下に描く）
+    legend = []
+    for label, series_values, color in series:
+        color = colors.HexColor(color)
+        series_points = [point(i, v) for i, v in enumerate(series_values)]
+        drawing.add(Polygon([c for xy in series_points for c in xy], fillColor=None, strokeColor=color,
+                            strokeWidth=LINE_WIDTH * 0.6))
+        for x, y in series_points:
+            drawing.add(Circle(x, y, LINE_WIDTH * 0.8, fillColor=color, strokeColor=None))
+        legend.append((label, color, None))
+    
+    # データの塗りつぶしと線・マーカー
+    line_color = colors.HexColor(LINE_COLOR)
+    fill_color = colors.Color(line_color.red, line_color.green, line_color.blue, alpha=FILL_ALPHA)
+    points = [point(i, v) for i, v in enumerate(values)]
+    drawing.add(Polygon([c for xy in points for c in xy], fillColor=fill_color,
+                        strokeColor=line_color, strokeWidth=LINE_WIDTH * 0.75))
+    for x, y in points:
+        drawing.add(Circle(x, y, LINE_WIDTH * 1.2, fillColor=line_color, strokeColor=None))
+    
+    legend.append((sheet_name, line_color, None))
+    
+    if cohort_values:
+        # 全体平均の破線
+        cohort_color = colors.HexColor(COHORT_COLOR)
+        cohort_points = [point(i, v) for i, v in enumerate(cohort_values)]
+        drawing.add(Polygon([c for xy in cohort_points for c in xy], fillColor=None, strokeColor=cohort_color,
+                            strokeWidth=LINE_WIDTH * 0.6, strokeDashArray=[4, 3]))
+        legend.append((COHORT_LABEL, cohort_color, [4, 3]))
+    
+    if len(legend) > 1:
+        # 凡例（右下の空いている位置、上から系列の順に並べる）
+        legend_chars = max(len(label) for label, _, _ in legend)
+        legend_x, legend_y = width - label_size * (2.5 + 0.9 * legend_chars), label_size
+        for row, (label, color, dash) in enumerate(legend):
+            y = legend_y + (len(legend) - 1 - row) * label_size * 1.5
+            drawing.add(Line(legend_x, y, legend_x + label_size * 1.5, y, strokeColor=color,
+                             strokeWidth=LINE_WIDTH * 0.6, strokeDashArray=dash))
+            drawing.add(String(legend_x + label_size * 2, y - label_size / 3, label, fontName=font_name,
+                               fontSize=label_size * 0.9))
+    
+    # 分類ラベル（位置に応じて寄せ方を変える）
+    for i, label in enumerate(labels):
+        x, y = point(i, rmax * label_radius / radius)
+        dx, dy = x - cx, y - cy
+        anchor = 'middle' if abs(dx) < 1 else ('start' if dx > 0 else 'end')
+        if abs(dx) < 1:
+            y += label_size * 0.3 if dy > 0 else -label_size
+        else:
+            y -= label_size / 3
+        drawing.add(String(x, y, label, fontName=font_name, fontSize=label_size, textAnchor=anchor))
+    
+    # タイトル
+    title = title or f'{sheet_name}の臨床実習経験レーダーチャート'
+    drawing.add(String(cx, chart_height + title_height / 2, title,
+                       fontName=font_name, fontSize=title_size, textAnchor='middle'))
+    return drawing
 
 # メインの処理
 if __name__ == '__main__':
@@ -127,25 +257,14 @@ if __name__ == '__main__':
     out_dir = os.path.join(os.path.dirname(__file__), 'output')
     os.makedirs(out_dir, exist_ok=True)
     
-    # 既存の画像ファイルを削除
-    for f in glob.glob(os.path.join(out_dir, '*_radar.png')):
-        os.remove(f)
-    
-    # Excelファイルの処理
-    data_dir = os.path.join(os.path.dirname(__file__), 'source_data')
-    for excel_file in [f for f in os.listdir(data_dir) if f.endswith('.xlsx')]:
-        file_path = os.path.join(data_dir, excel_file)
-        xls = pd.ExcelFile(file_path)
+    # 各学生シートの処理（キャッシュ経由で各ワークブックは1回だけ解析）
+    sheets = list(iter_students())
+    matrices = cohort_count_matrices([df for _, df in sheets])
+    cohort = cohort_category_values(displayed_cohort(cohort_summary(matrices), 'radar')) if len(sheets) else None
+    for (sheet, _), matrix in zip(sheets, matrices):
+        # 分類ごとの記録数
+        api_counts = category_totals(matrix)
+        print(f'{sheet} のAPI分類値カウント:', [api_counts.get(i, 0) for i in range(1, 13)])
         
-        # 各シートの処理
-        for sheet in xls.sheet_names:
-            if sheet == 'overall':
-                continue
-            
-            # シートからデータ取得とカウント
-            df = pd.read_excel(xls, sheet_name=sheet)
-            api_counts = Counter(df['API検証'])
-            print(f'{sheet} のAPI分類値カウント:', [api_counts.get(i, 0) for i in range(1, 13)])
-            
-            # レーダーチャート生成
-            create_radar_chart(api_counts, sheet, out_dir)
\ No newline at end of file
+        # レーダーチャート生成
+        create_radar_chart(api_counts, sheet, out_dir, cohort)
\ No newline at end of file
@@ -0,0 +1,314 @@
+import argparse
+import sqlite3
+import sys
+import time
+import unicodedata
+from data_ingest import DATA_DIR
+from entry_store import EntryStore, FRAME_COLUMNS, default_store_path, ingest_workbooks
+from instrument import span
+
+# 索引に入れる品詞（助詞・助動詞・記号などは検索に使わない）
+INDEX_POS = ('名詞', '動詞', '形容詞', '形状詞', '形容動詞', '副詞')
+# 活用する品詞（基本形で索引する。それ以外は表層形のまま）
+INFLECTED_POS = ('動詞', '形容詞')
+
+# BM25のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 索引の形式のバージョン（形式を変えたら上げる。記録ストアから作り直せるため古い索引は捨てる）
+SEARCH_VERSION = 1
+
+# 検索結果の既定の件数
+DEFAULT_LIMIT = 50
+
+SCHEMA = (
+    # 索引済みのシートと内容ハッシュ（記録ストアのsheetsと比べて変わったシートだけ索引し直す）
+    'CREATE TABLE IF NOT EXISTS search_sheets ('
+    ' source TEXT NOT NULL, student TEXT NOT NULL, hash TEXT NOT NULL, PRIMARY KEY (source, student))',
+    # 記録ごとの番号・語数（BM25の文書長）と絞り込み用の日・分類（順位付けでは本文を読まない）
+    'CREATE TABLE IF NOT EXISTS search_docs ('
+    ' doc INTEGER PRIMARY KEY, source TEXT NOT NULL, student TEXT NOT NULL, seq INTEGER NOT NULL,'
+    ' day INTEGER, category INTEGER, length INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS search_docs_sheet ON search_docs(source, student)',
+    # 語 -> 記録番号の転置索引（tfは記録内の出現回数）
+    'CREATE TABLE IF NOT EXISTS search_postings ('
+    ' term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc)) WITHOUT ROWID',
+    # 索引の形式・索引を作ったMeCab辞書・更新回数（他のプロセスが更新したら読み込んだ索引を捨てる）
+    'CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)',
+)
+
+def index_terms(tokens):
+    """
+    形態素解析の結果から索引の語を取り出す（tokenizer.tokenizeの形式）
+
+    活用する語は基本形、英数字は全角・半角と大文字・小文字をそろえる
+    """
+    terms = []
+    for surface, pos, base in tokens:
+        if pos not in INDEX_POS:
+            continue
+        term = base if pos in INFLECTED_POS and base != '*' else surface
+        term = unicodedata.normalize('NFKC', term).lower().strip()
+        if term:
+            terms.append(term)
+    return terms
+
+class SearchIndex:
+    """
+    記録ストアの入力内容の全文検索索引（記録ストアと同じSQLiteファイルに持つ）
+
+    語はword_cloudと同じ形態素解析の結果（tokenizer.TokenCache）から作るため、
+    ワードクラウドを生成済みの記録は解析し直さない。検索はBM25で順位付けする。
+    検索に使った記録の情報と語ごとの転置リストはnumpy配列としてメモリに保持し、
+    同じプロセスでの2回目以降の検索ではSQLiteを読まない。
+    Streamlitのように複数のスレッドから使う場合は、呼び出し側で同時に使わないよう排他する
+    """
+
+    def __init__(self, path, mecab=None, cache=None):
+        # 記録ストアの表を用意してから、スレッドをまたいで使える接続を開き直す
+        EntryStore(path).close()
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.mecab = mecab
+        self.cache = cache
+        tables = [name for name, in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'search%'"
+        )]
+        if tables and ('search_meta' not in tables or self._meta('version') != str(SEARCH_VERSION)):
+            for name in tables:
+                self.conn.execute(f'DROP TABLE {name}')
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.execute("INSERT OR REPLACE INTO search_meta VALUES ('version', ?)", (str(SEARCH_VERSION),))
+        self.conn.commit()
+        self._generation = None  # メモリ上の索引を読み込んだときの更新回数
+        self._docs = None        # 記録番号で引く {列名: 配列}
+        self._postings = {}      # 語 -> (記録番号の配列, tfの配列)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _tagger(self):
+        """MeCab.Taggerを必要になったときに用意"""
+        if self.mecab is None:
+            import MeCab
+            self.mecab = MeCab.Tagger()
+        return self.mecab
+
+    def _meta(self, key):
+        row = self.conn.execute('SELECT value FROM search_meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def update(self, workers=None):
+        """
+        記録ストアと索引を同期（内容が変わった・増えたシートだけ索引し直し、なくなったシートは削除）
+
+        Returns:
+            int: 索引し直したシート数
+        """
+        from tokenizer import TokenCache, dictionary_version
+        stale = self._stale_sheets()
+        if not stale:
+            return 0
+        mecab = self._tagger()
+        version = dictionary_version(mecab)
+        # 解析結果のキャッシュを渡されていなければこの更新の間だけ開く（接続をスレッドをまたいで使わない）
+        cache = self.cache or TokenCache(version)
+        try:
+            with span('search.update'), self.conn:
+                return self._reindex(stale, version, mecab, cache, workers)
+        finally:
+            if cache is not self.cache:
+                cache.close()
+
+    def _reindex(self, stale, version, mecab, cache, workers):
+        """古いシートの記録を解析して索引し直し、索引し直したシート数を返す（updateのトランザクション内で呼ばれる）"""
+        from tokenizer import batch_tokenize
+        if self._meta('dictionary') != version:
+            # 辞書が変わったら語の区切りが変わるため全体を作り直す
+            for table in ('search_sheets', 'search_docs', 'search_postings'):
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.execute("INSERT OR REPLACE INTO search_meta VALUES ('dictionary', ?)", (version,))
+            stale = self._stale_sheets()
+
+        entries = []
+        for source, student, h in stale:
+            self._delete(source, student)
+            if h is None:
+                continue
+            entries.extend(self.conn.execute(
+                'SELECT source, student, seq, day, category, text FROM entries'
+                ' WHERE source = ? AND student = ? AND text IS NOT NULL', (source, student)
+            ))
+            self.conn.execute('INSERT INTO search_sheets VALUES (?, ?, ?)', (source, student, h))
+        tokens = batch_tokenize([text for *_, text in entries], workers, cache, mecab)
+
+        postings = []
+        for source, student, seq, day, category, text in entries:
+            terms = index_terms(tokens[text])
+            doc = self.conn.execute(
+                'INSERT INTO search_docs (source, student, seq, day, category, length) VALUES (?, ?, ?, ?, ?, ?)',
+                (source, student, seq, day, category, len(terms))
+            ).lastrowid
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            postings.extend((term, doc, tf) for term, tf in counts.items())
+        self.conn.executemany('INSERT INTO search_postings VALUES (?, ?, ?)', postings)
+        generation = int(self._meta('generation') or 0) + 1
+        self.conn.execute("INSERT OR REPLACE INTO search_meta VALUES ('generation', ?)", (str(generation),))
+        return len(stale)
+
+    def _stale_sheets(self):
+        """索引が古いシートの (ワークブック名, 学生, 新しいハッシュ) 一覧（なくなったシートのハッシュはNone）"""
+        return self.conn.execute(
+            'SELECT s.source, s.student, s.hash FROM sheets s LEFT JOIN search_sheets i USING (source, student)'
+            ' WHERE i.hash IS NULL OR i.hash != s.hash'
+            ' UNION ALL SELECT i.source, i.student, NULL FROM search_sheets i'
+            ' LEFT JOIN sheets s USING (source, student) WHERE s.hash IS NULL'
+        ).fetchall()
+
+    def _delete(self, source, student):
+        self.conn.execute(
+            'DELETE FROM search_postings WHERE doc IN (SELECT doc FROM search_docs WHERE source = ? AND student = ?)',
+            (source, student)
+        )
+        self.conn.execute('DELETE FROM search_docs WHERE source = ? AND student = ?', (source, student))
+        self.conn.execute('DELETE FROM search_sheets WHERE source = ? AND student = ?', (source, student))
+
+    def _load_docs(self):
+        """記録の情報を記録番号で引ける配列として読み込む（索引が更新されていれば読み直す）"""
+        import numpy as np
+        generation = self._meta('generation')
+        if self._docs is not None and generation == self._generation:
+            return self._docs
+        rows = self.conn.execute('SELECT doc, source, student, seq, day, category, length FROM search_docs').fetchall()
+        size = max((row[0] for row in rows), default=0) + 1
+        docs = {
+            'valid': np.zeros(size, dtype=bool),
+            'source': np.empty(size, dtype=object),
+            'student': np.empty(size, dtype=object),
+            'seq': np.zeros(size, dtype=np.int64),
+            'day': np.zeros(size, dtype=np.int64),
+            'category': np.zeros(size, dtype=np.int64),
+            'length': np.zeros(size, dtype=np.float64),
+        }
+        if rows:
+            columns = list(zip(*rows))
+            ids = np.array(columns[0])
+            docs['valid'][ids] = True
+            for name, values in zip(('source', 'student', 'seq', 'day', 'category', 'length'), columns[1:]):
+                docs[name][ids] = [-1 if v is None and name in ('day', 'category') else v for v in values]
+        self._docs, self._postings, self._generation = docs, {}, generation
+        return docs
+
+    def _load_postings(self, term):
+        """語の転置リストを (記録番号の配列, tfの配列) で取得（読み込んだものはメモリに保持）"""
+        import numpy as np
+        if term not in self._postings:
+            rows = np.array(
+                self.conn.execute('SELECT doc, tf FROM search_postings WHERE term = ?', (term,)).fetchall(),
+                dtype=np.int64,
+            ).reshape(-1, 2)
+            self._postings[term] = (rows[:, 0], rows[:, 1])
+        return self._postings[term]
+
+    def search(self, query, limit=DEFAULT_LIMIT, student=None, day=None, category=None, sources=None):
+        """
+        入力内容を全文検索し、BM25のスコア順に返す
+
+        Parameters:
+            query (str): 検索語（形態素解析して索引と同じ語に分ける。いずれかの語を含む記録が対象）
+            limit (int): 返す件数
+            student, day, category, sources: 絞り込み（EntryStore.entriesと同じ、値のリストも可）
+
+        Returns:
+            DataFrame: source（ワークブック名）・student・DAY・API検証・入力内容・score の列
+        """
+        import numpy as np
+        import pandas as pd
+        from tokenizer import tokenize
+        columns = ['source', 'student', *FRAME_COLUMNS.values(), 'score']
+        terms = sorted(set(index_terms(tokenize(query, self._tagger()))))
+        if not terms:
+            return pd.DataFrame(columns=columns)
+
+        with span('search.query'):
+            docs = self._load_docs()
+            count = int(docs['valid'].sum())
+            average = docs['length'][docs['valid']].mean() if count else 1.0
+            scores = np.zeros(len(docs['valid']))
+            for term in terms:
+                ids, tf = self._load_postings(term)
+                if not len(ids):
+                    continue
+                # 語ごとの出現記録数（IDF）は絞り込みによらず全記録で数える
+                idf = np.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * docs['length'][ids] / average)
+                scores[ids] += idf * tf * (BM25_K1 + 1) / norm
+
+            mask = scores > 0
+            for name, value in (('student', student), ('day', day), ('category', category), ('source', sources)):
+                if value is not None:
+                    values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+                    mask &= np.isin(docs[name], values)
+            candidates = np.flatnonzero(mask)
+            # 同じスコアは記録番号順（取り込み順）
+            ranked = candidates[np.lexsort((candidates, -scores[candidates]))]
+
+            hits = []
+            for doc in ranked:
+                if len(hits) >= limit:
+                    break
+                source, name, seq = docs['source'][doc], docs['student'][doc], int(docs['seq'][doc])
+                row = self.conn.execute(
+                    'SELECT text FROM entries WHERE source = ? AND student = ? AND seq = ?', (source, name, seq)
+                ).fetchone()
+                if row is None:
+                    # 索引の更新（update）より後に取り込み直されて消えた記録は飛ばす
+                    continue
+                hits.append((source, name, int(docs['day'][doc]), int(docs['category'][doc]), row[0],
+                             round(float(scores[doc]), 3)))
+        return pd.DataFrame(hits, columns=columns)
+
+def open_index(data_dir=DATA_DIR, store_path=None, workers=None):
+    """データフォルダのワークブックを記録ストアに取り込み、索引を最新にして返す（呼び出し側で閉じる）"""
+    store, _ = ingest_workbooks(data_dir, store_path)
+    path = store.path
+    store.close()
+    index = SearchIndex(path)
+    index.update(workers)
+    return index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='記録の入力内容を全文検索する（索引は記録ストアに保存）')
+    parser.add_argument('query', help='検索語（例: 在宅）')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='Excelファイルのフォルダ')
+    parser.add_argument('--store', default=None, help='記録ストアのパス（既定: データフォルダと同じ階層の store/）')
+    parser.add_argument('--student', default=None, help='学生（シート名）で絞り込む')
+    parser.add_argument('--day', type=int, default=None, help='日（1〜）で絞り込む')
+    parser.add_argument('--category', type=int, default=None, help='API分類（1〜12）で絞り込む')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help='表示する件数')
+    args = parser.parse_args(argv)
+
+    with open_index(args.data_dir, args.store or default_store_path(args.data_dir)) as index:
+        index.search(args.query, 1)  # MeCabと索引の読み込みは検索時間に含めない
+        start = time.perf_counter()
+        hits = index.search(args.query, args.limit, args.student, args.day, args.category)
+        elapsed = (time.perf_counter() - start) * 1000
+    for row in hits.itertuples(index=False):
+        print(f'{row.score:.2f} | {row.student} | Day {row.DAY} | {row.API検証} | '
+              f'{str(row.入力内容).replace(chr(10), " ")[:80]}')
+    print(f'{len(hits)}件（{elapsed:.1f}ms）')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,46 +1,41 @@
-import pandas as pd
 import os
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak, Image
+from fonts import FONT_NAME, register_pdf_font
+from instrument import span
+from quality import get_profile, downsampled_image
+from aggregate import (
+    CATEGORY_NAMES, NUM_DAYS, cohort_count_matrices, count_matrix, category_totals, day_totals,
+    cohort_summary, cohort_category_values, displayed_cohort,
+)
 
-# フォント設定
-FONT_NAME = 'IPAGothic'
-FONT_PATH = '/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf'
-pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+# reportlabと記録ストアは使う関数の中で読み込む（importしただけでは読み込まない）
 
-# API分類の名称定義
-CATEGORY_NAMES = {
-    1: '医療倫理',
-    2: '地域医療',
-    3: '医学的知識',
-    4: '診察・手技',
-    5: '問題解決能力',
-    6: '統合的臨床能力',
-    7: '多職種連携',
-    8: 'コミュニケーション',
-    9: '一般教養',
-    10: '保健・福祉',
-    11: '行政',
-    12: '社会医学'
-}
+# レーダーチャートの埋め込み方法
+# 'vector': reportlabの図形として直接描画（既定）
+# 'png': radar_chart.pyで保存した {シート名}_radar.png を読み込む
+RADAR_MODES = ('vector', 'png')
+RADAR_WIDTH = 400  # A4幅の約2/3
 
-def create_daily_stats_table(df, styles):
-    """日別投稿数テーブルを作成"""
-    daily_counts = df.groupby('DAY').size()
-    total_posts = len(df)
+def _cohort_value(values, index):
+    """全体の統計値を表示用の文字列にする（範囲外は空欄）"""
+    return f'{values[index]:.1f}' if index < len(values) else ''
+
+def create_daily_stats_table(matrix, styles, cohort=None):
+    """日別投稿数テーブルを作成（cohortを渡すと全体平均の列を追加）"""
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+    daily_counts = day_totals(matrix)
+    total_posts = int(matrix.sum())
     
-    daily_data = [['日付', '投稿数']]
-    for day in range(1, 6):
+    daily_data = [['日付', '投稿数'] + (['全体平均'] if cohort else [])]
+    for day in range(1, NUM_DAYS + 1):
         count = daily_counts.get(day, 0)
-        daily_data.append([f'Day {day}', str(count)])
-    daily_data.append(['合計', str(total_posts)])
+        row = [f'Day {day}', str(count)]
+        if cohort:
+            row.append(_cohort_value(cohort['day']['mean'], day - 1))
+        daily_data.append(row)
+    daily_data.append(['合計', str(total_posts)] + ([f"{cohort['total']['mean']:.1f}"] if cohort else []))
     
-    table = Table(daily_data, colWidths=[60, 60])
+    table = Table(daily_data, colWidths=[60, 60] + ([60] if cohort else []))
     table.setStyle(TableStyle([
         ('FONT', (0, 0), (-1, -1), FONT_NAME),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -50,10 +45,12 @@ def create_daily_stats_table(df, styles):
     ]))
     return table, total_posts
 
-def create_ranking_table(df, total_posts, styles):
-    """分類別ランキングテーブルを作成（割合の高い順）"""
-    category_counts = df['API検証'].value_counts().reindex(range(1, 13), fill_value=0)
-    ranking_data = [['順位', '分類', '記録数', '割合']]
+def create_ranking_table(matrix, total_posts, styles, cohort=None):
+    """分類別ランキングテーブルを作成（割合の高い順、cohortを渡すと全体平均の列を追加）"""
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+    category_counts = category_totals(matrix)
+    ranking_data = [['順位', '分類', '記録数', '割合'] + (['全体平均'] if cohort else [])]
     
     # カテゴリーごとの記録数とパーセンテージを計算し、パーセンテージでソート
     category_stats = []
@@ -66,14 +63,22 @@ def create_ranking_table(df, total_posts, styles):
     
     # ソートされた順でデータを追加
     for rank, (category, count, percentage) in enumerate(category_stats, 1):
-        ranking_data.append([
+        row = [
             str(rank),
             f'{CATEGORY_NAMES[category]}',
             str(count),
             f'{percentage:.1f}%'
-        ])
+        ]
+        if cohort:
+            row.append(_cohort_value(cohort['category']['mean'], category))
+        ranking_data.append(row)
     
-    table = Table(ranking_data, colWidths=[30, 150, 50, 50])
+    if cohort:
+        # 列を1つ増やしても半ページに収まるよう分類名の列を狭める
+        col_widths = [30, 110, 40, 45, 50]
+    else:
+        col_widths = [30, 150, 50, 50]
+    table = Table(ranking_data, colWidths=col_widths)
     table.setStyle(TableStyle([
         ('FONT', (0, 0), (-1, -1), FONT_NAME),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -84,41 +89,36 @@ def create_ranking_table(df, total_posts, styles):
     ]))
     return table
 
-def create_detail_table(df, styles):
-    """詳細な日別・分類別記録数テーブルを作成"""
-    # ピボットテーブルを作成
-    pivot_data = pd.pivot_table(
-        df,
-        values='入力内容',
-        index='API検証',
-        columns='DAY',
-        aggfunc='count',
-        fill_value=0
-    ).reindex(range(1, 13), fill_value=0)
+def create_detail_table(matrix, styles, cohort=None):
+    """詳細な日別・分類別記録数テーブルを作成（cohortを渡すと全体平均・中央値の列を追加）"""
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+    # 分類1〜12・表示する日の範囲に絞った行列
+    shown = matrix[1:, :NUM_DAYS]
     
     # テーブルデータの作成
-    matrix_data = [['分類 \\ Day', 'Day 1', 'Day 2', 'Day 3', 'Day 4', 'Day 5', '合計']]
+    cohort_header = ['全体平均', '中央値'] if cohort else []
+    matrix_data = [['分類 \\ Day'] + [f'Day {day}' for day in range(1, NUM_DAYS + 1)] + ['合計'] + cohort_header]
     for category in range(1, 13):
         row = [CATEGORY_NAMES[category]]
-        category_total = 0
-        for day in range(1, 6):
-            count = pivot_data.get(day, pd.Series())[category] if day in pivot_data else 0
-            category_total += count
-            row.append(str(count))
-        row.append(str(category_total))  # 合計列を追加
+        row.extend(str(count) for count in shown[category - 1])
+        row.append(str(shown[category - 1].sum()))  # 合計列を追加
+        if cohort:
+            row.append(_cohort_value(cohort['category']['mean'], category))
+            row.append(_cohort_value(cohort['category']['p50'], category))
         matrix_data.append(row)
     
     # 日別合計行を追加
-    daily_totals = ['合計']
-    total_sum = 0
-    for day in range(1, 6):
-        day_total = sum(int(row[day]) for row in matrix_data[1:])
-        daily_totals.append(str(day_total))
-        total_sum += day_total
-    daily_totals.append(str(total_sum))
+    daily_totals = ['合計'] + [str(count) for count in shown.sum(axis=0)] + [str(shown.sum())]
+    if cohort:
+        daily_totals += [f"{cohort['classified']['mean']:.1f}", f"{cohort['classified']['p50']:.1f}"]
     matrix_data.append(daily_totals)
     
-    table = Table(matrix_data, colWidths=[200] + [45]*6)  # 列幅を調整
+    if cohort:
+        col_widths = [130] + [40]*6 + [42]*2
+    else:
+        col_widths = [200] + [45]*6  # 列幅を調整
+    table = Table(matrix_data, colWidths=col_widths)
     table.setStyle(TableStyle([
         ('FONT', (0, 0), (-1, -1), FONT_NAME),
         ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
@@ -126,15 +126,37 @@ def create_detail_table(df, styles):
         ('GRID', (0, 0), (-1, -1), 1, colors.black),
         ('BACKGROUND', (0, 0), (-1, 0), colors.grey),  # ヘッダー行の背景
         ('BACKGROUND', (0, -1), (-1, -1), colors.grey),  # 合計行の背景
-        ('BACKGROUND', (-1, 0), (-1, -2), colors.lightgrey),  # 合計列の背景
+        ('BACKGROUND', (NUM_DAYS + 1, 0), (NUM_DAYS + 1, -2), colors.lightgrey),  # 合計列の背景
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
         ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
         ('FONTSIZE', (0, 0), (-1, -1), 9),
     ]))
     return table
 
-def create_page_one(df, student_name, radar_path, styles, doc_width):
-    """1ページ目：レーダーチャートと基本統計を生成"""
+def create_radar_flowable(matrix, student_name, radar_path, radar_mode, cohort=None, profile=None):
+    """レーダーチャートのflowableを作成（PNGモードで画像がなければNone、画像はprofileの解像度まで縮小）"""
+    from reportlab.platypus import Image
+    if radar_mode == 'vector':
+        from radar_chart import create_radar_drawing
+        return create_radar_drawing(
+            category_totals(matrix), student_name, RADAR_WIDTH, FONT_NAME,
+            cohort=cohort_category_values(cohort) if cohort else None
+        )
+    
+    if not os.path.exists(radar_path):
+        # 実行順の誤りでグラフが抜けたPDFにならないよう警告する
+        print(f"警告: レーダーチャート画像がありません: {radar_path}（pipeline.py の利用を推奨）")
+        return None
+    radar_img = Image(downsampled_image(radar_path, RADAR_WIDTH, get_profile(profile)))
+    aspect_ratio = radar_img.imageHeight / radar_img.imageWidth
+    radar_img.drawWidth = RADAR_WIDTH
+    radar_img.drawHeight = RADAR_WIDTH * aspect_ratio
+    return radar_img
+
+def create_page_one(matrix, student_name, radar_path, styles, doc_width, radar_mode='vector', cohort=None,
+                    profile=None):
+    """1ページ目：レーダーチャートと基本統計を生成（cohortは全体との比較に使う）"""
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
     story = []
     
     # タイトル
@@ -143,15 +165,10 @@ def create_page_one(df, student_name, radar_path, styles, doc_width):
     story.append(Spacer(1, 10))
     
     # 上半分：レーダーチャート
-    if os.path.exists(radar_path):
-        radar_img = Image(radar_path)
-        radar_width = 400  # A4幅の約2/3
-        aspect_ratio = radar_img.imageHeight / radar_img.imageWidth
-        radar_img.drawWidth = radar_width
-        radar_img.drawHeight = radar_width * aspect_ratio
-        
+    radar = create_radar_flowable(matrix, student_name, radar_path, radar_mode, cohort, profile)
+    if radar is not None:
         # レーダーチャートを中央に配置
-        chart_table = Table([[radar_img]], colWidths=[doc_width])
+        chart_table = Table([[radar]], colWidths=[doc_width])
         chart_table.setStyle(TableStyle([
             ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
             ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
@@ -161,8 +178,8 @@ def create_page_one(df, student_name, radar_path, styles, doc_width):
     story.append(Spacer(1, 20))
     
     # 下半分のデータを準備
-    daily_stats_table, total_posts = create_daily_stats_table(df, styles)
-    ranking_table = create_ranking_table(df, total_posts, styles)
+    daily_stats_table, total_posts = create_daily_stats_table(matrix, styles, cohort)
+    ranking_table = create_ranking_table(matrix, total_posts, styles, cohort)
     
     # 左右に分けて配置
     bottom_data = [[
@@ -183,35 +200,23 @@ def create_page_one(df, student_name, radar_path, styles, doc_width):
     
     return story
 
-def create_page_two(df, styles):
+def create_page_two(matrix, styles, cohort=None):
     """2ページ目：分類別・日別の詳細データを生成"""
+    from reportlab.platypus import Paragraph, Spacer
     story = []
     
     story.append(Paragraph('③日別・分類別記録数', styles['StatsHeading']))
     story.append(Spacer(1, 10))
     
     # 詳細テーブルを作成
-    detail_table = create_detail_table(df, styles)
+    detail_table = create_detail_table(matrix, styles, cohort)
     story.append(detail_table)
     
     return story
 
-def create_stats_report(df, student_name, output_path):
-    """統計レポートを生成"""
-    doc = SimpleDocTemplate(
-        output_path,
-        pagesize=A4,
-        rightMargin=25*mm,
-        leftMargin=25*mm,
-        topMargin=20*mm,
-        bottomMargin=20*mm
-    )
-    
-    # 利用可能な幅を計算
-    doc_width = A4[0] - (doc.leftMargin + doc.rightMargin)
-    
-    # スタイル設定
-    styles = getSampleStyleSheet()
+def add_stats_styles(styles):
+    """統計レポート用の段落スタイルをスタイルシートに追加"""
+    from reportlab.lib.styles import ParagraphStyle
     styles.add(ParagraphStyle(
         name='StatsTitle',
         fontName=FONT_NAME,
@@ -229,47 +234,94 @@ def create_stats_report(df, student_name, output_path):
         spaceAfter=4,
         alignment=1  # 中央揃え
     ))
-    
-    # レーダーチャート画像のパス
-    radar_path = os.path.join(
-        os.path.dirname(output_path),
-        f"{os.path.splitext(os.path.basename(output_path))[0].replace('_stats', '')}_radar.png"
-    )
-    
-    # ドキュメントの構築
+    return styles
+
+def create_stats_story(matrix, student_name, radar_path, styles, doc_width, radar_mode='vector', cohort=None,
+                       profile=None):
+    """1人分の統計レポート（2ページ）のflowable一覧を作成"""
+    from reportlab.platypus import PageBreak
     story = []
     
     # 1ページ目の要素を追加
-    story.extend(create_page_one(df, student_name, radar_path, styles, doc_width))
+    story.extend(create_page_one(matrix, student_name, radar_path, styles, doc_width, radar_mode, cohort, profile))
     
     # ページ区切りを追加
     story.append(PageBreak())
     
     # 2ページ目の要素を追加
-    story.extend(create_page_two(df, styles))
+    story.extend(create_page_two(matrix, styles, cohort))
+    return story
+
+def create_stats_report(df, student_name, output_path, matrix=None, radar_mode='vector', cohort=None,
+                        profile=None):
+    """
+    統計レポートを生成
+    
+    Parameters:
+        df (DataFrame): 学生の記録
+        student_name (str): 学生名（シート名）
+        output_path (str): 出力PDFのパス
+        matrix (np.ndarray): 集計済みの分類×日別記録数（省略時はdfから集計）
+        radar_mode (str): レーダーチャートの埋め込み方法（RADAR_MODES参照）
+        cohort (dict): 全体の統計（aggregate.cohort_summaryの戻り値）。渡すと全体平均などを併記する
+        profile (str): 出力品質のプロファイル名（quality.PROFILES参照、省略時は印刷用）
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate
+    register_pdf_font()
+    if matrix is None:
+        matrix = count_matrix(df)
+    
+    doc = SimpleDocTemplate(
+        output_path,
+        pagesize=A4,
+        rightMargin=25*mm,
+        leftMargin=25*mm,
+        topMargin=20*mm,
+        bottomMargin=20*mm,
+        pageCompression=get_profile(profile)['page_compression']
+    )
+    
+    # 利用可能な幅を計算
+    doc_width = A4[0] - (doc.leftMargin + doc.rightMargin)
+    
+    # スタイル設定
+    styles = add_stats_styles(getSampleStyleSheet())
+    
+    # レーダーチャート画像のパス
+    radar_path = os.path.join(
+        os.path.dirname(output_path),
+        f"{os.path.splitext(os.path.basename(output_path))[0].replace('_stats', '')}_radar.png"
+    )
+    
+    # ドキュメントの構築
+    story = create_stats_story(matrix, student_name, radar_path, styles, doc_width, radar_mode, cohort, profile)
     
     # PDFの生成
-    doc.build(story)
+    with span('stats.build'):
+        doc.build(story)
 
-def generate_stats():
+def generate_stats(radar_mode='vector'):
     """全学生の統計レポートを生成"""
+    from entry_store import iter_students
     output_dir = os.path.join(os.path.dirname(__file__), 'output')
     os.makedirs(output_dir, exist_ok=True)
     
-    data_dir = os.path.join(os.path.dirname(__file__), 'source_data')
-    for excel_file in [f for f in os.listdir(data_dir) if f.endswith('.xlsx')]:
-        file_path = os.path.join(data_dir, excel_file)
-        xls = pd.ExcelFile(file_path)
-        
-        for sheet in xls.sheet_names:
-            if sheet == 'overall':
-                continue
-            
-            print(f"{sheet}の統計レポートを生成中...")
-            df = pd.read_excel(file_path, sheet_name=sheet)
-            output_path = os.path.join(output_dir, f"{sheet}_stats.pdf")
-            create_stats_report(df, sheet, output_path)
-            print(f"統計レポートを保存しました: {output_path}")
+    # 全学生分の記録数を1回で集計
+    sheets = list(iter_students())
+    matrices = cohort_count_matrices([df for _, df in sheets])
+    # 一括生成と同じく表示の桁数に丸めた値を表示する
+    cohort = displayed_cohort(cohort_summary(matrices), 'stats') if len(sheets) else None
+    
+    for (sheet, df), matrix in zip(sheets, matrices):
+        print(f"{sheet}の統計レポートを生成中...")
+        output_path = os.path.join(output_dir, f"{sheet}_stats.pdf")
+        create_stats_report(df, sheet, output_path, matrix, radar_mode, cohort)
+        print(f"統計レポートを保存しました: {output_path}")
 
 if __name__ == '__main__':
-    generate_stats()
\ No newline at end of file
+    import sys
+    # --radar-png: radar_chart.pyで保存したPNGを埋め込む
+    generate_stats('png' if '--radar-png' in sys.argv[1:] else 'vector')
\ No newline at end of file
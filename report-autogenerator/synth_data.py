@@ -0,0 +1,128 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+
+# 実データのAPI分類の出現割合（0は未分類）
+CATEGORY_WEIGHTS = {
+    0: 3, 1: 13, 2: 79, 3: 59, 4: 57, 5: 2, 6: 2,
+    7: 23, 8: 36, 9: 2, 10: 3, 11: 7, 12: 3,
+}
+
+# 実データの日ごとの記録数の割合（Day1〜Day5）
+DAY_WEIGHTS = [56, 72, 49, 84, 28]
+
+# 実習初日（overallシートのdate/timeに使う）
+START_DATE = datetime.datetime(2025, 7, 28)
+
+# 学生名の材料（組み合わせて重複しない名前を作る）
+SURNAMES = [
+    '佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '小林', '加藤',
+    '吉田', '山田', '佐々木', '山口', '松本', '井上', '木村', '林', '斎藤', '清水',
+    '山崎', '森', '池田', '橋本', '阿部', '石川', '山下', '中島', '石井', '小川',
+]
+GIVEN_NAMES = [
+    '陽菜', '結衣', '葵', '美咲', 'さくら', '花子', '悠真', '大翔', '蓮', '湊',
+    '健太', '翔太', '拓海', '陽斗', '千尋', '彩花', '真央', '優斗', '遥', '凛',
+]
+
+# 入力内容の材料（MeCabで動詞が抽出されるよう動詞を含む文にする）
+SCENES = [
+    '外来診療', '病棟回診', '訪問診療', '在宅医療の現場', '救急外来', '地域の診療所',
+    '保健所', '多職種カンファレンス', '健診会場', '手術室', 'リハビリ室', '薬局',
+]
+SUBJECTS = [
+    '高齢の患者さん', '糖尿病の患者さん', '認知症の患者さん', '看護師さん', '薬剤師さん',
+    'ケアマネージャーさん', '指導医の先生', '家族の方', '保健師さん', '理学療法士さん',
+]
+ACTIONS = [
+    '問診の様子を見学した', '血圧を測定させていただいた', '服薬状況を確認していた',
+    '退院後の生活について話し合っていた', '検査結果を説明していた', '聴診を体験した',
+    '紹介状の書き方を教わった', '生活習慣の指導を行っていた', '制度の仕組みを調べた',
+    '地域の医療資源について学んだ', '患者さんの話をじっくり聞いた', '処置の補助に入った',
+]
+REFLECTIONS = [
+    '患者さんの生活背景を知ることの大切さを感じた。',
+    'チームで情報を共有する重要性を学んだ。',
+    '限られた資源の中で工夫していることに驚いた。',
+    '教科書で読んだ内容を実際に確認できた。',
+    '分かりやすく伝える難しさを実感した。',
+    '今後の学習につなげたいと考えた。',
+]
+
+def student_names(count, rng):
+    """M1/M4の学年とシート名・IDの組を重複なく作成"""
+    names = []
+    for i in range(count):
+        surname = SURNAMES[i % len(SURNAMES)]
+        given = GIVEN_NAMES[(i // len(SURNAMES)) % len(GIVEN_NAMES)]
+        # 姓名の組み合わせを使い切ったら番号を付けて区別する
+        suffix = '' if i < len(SURNAMES) * len(GIVEN_NAMES) else str(i // (len(SURNAMES) * len(GIVEN_NAMES)))
+        grade = rng.choice(('M1', 'M4'))
+        names.append((f'{grade}_{surname}{given}{suffix}', f'{surname} {given}{suffix}'))
+    return names
+
+def entry_text(day, rng):
+    """1件分の入力内容（実データと同程度の長さの日本語テキスト）"""
+    sentences = [f'{day}日目。{rng.choice(SCENES)}で{rng.choice(SUBJECTS)}の{rng.choice(ACTIONS)}。']
+    for _ in range(rng.randint(0, 3)):
+        sentences.append(f'{rng.choice(SUBJECTS)}が{rng.choice(ACTIONS)}。{rng.choice(REFLECTIONS)}')
+    return '\n'.join(sentences)
+
+def student_entries(entries, rng):
+    """1人分の (DAY, 入力内容, API検証) を日順に作成"""
+    days = sorted(rng.choices(range(1, len(DAY_WEIGHTS) + 1), weights=DAY_WEIGHTS, k=entries))
+    categories = rng.choices(list(CATEGORY_WEIGHTS), weights=list(CATEGORY_WEIGHTS.values()), k=entries)
+    return [(day, entry_text(day, rng), category) for day, category in zip(days, categories)]
+
+def generate_workbook(path, students=100, entries=100, seed=0):
+    """
+    実データと同じ形式の合成ワークブックを作成
+
+    先頭にoverallシート（全学生の記録）、続けて学生ごとのシート（DAY・ID・入力内容・API検証）を置く
+
+    Parameters:
+        path (str): 出力するxlsxファイルのパス
+        students (int): 学生数
+        entries (int): 1人あたりの記録数
+        seed (int): 乱数のシード（同じ値なら同じ内容になる）
+    """
+    from openpyxl import Workbook
+
+    rng = random.Random(seed)
+    names = student_names(students, rng)
+    data = {sheet: student_entries(entries, rng) for sheet, _ in names}
+
+    # 大きなワークブックでもメモリを使いすぎないよう書き込み専用モードで作成
+    wb = Workbook(write_only=True)
+    overall = wb.create_sheet('overall')
+    overall.append(['date/time', 'DAY', 'ID', '入力内容', 'API検証', None])
+    for sheet, student_id in names:
+        for day, text, category in data[sheet]:
+            timestamp = START_DATE + datetime.timedelta(days=day - 1, minutes=rng.randint(8 * 60, 24 * 60 - 1))
+            overall.append([timestamp, day, student_id, text, category, '手動' if category == 0 else 'AI分類'])
+    for sheet, student_id in names:
+        ws = wb.create_sheet(sheet)
+        ws.append(['DAY', 'ID', '入力内容', 'API検証'])
+        for day, text, category in data[sheet]:
+            ws.append([day, student_id, text, category])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb.save(path)
+    return [sheet for sheet, _ in names]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='実データと同じ形式の合成ワークブックを作成（性能測定用）')
+    parser.add_argument('path', help='出力するxlsxファイル')
+    parser.add_argument('--students', type=int, default=100, help='学生数')
+    parser.add_argument('--entries', type=int, default=100, help='1人あたりの記録数')
+    parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+    args = parser.parse_args(argv)
+
+    sheets = generate_workbook(args.path, args.students, args.entries, args.seed)
+    print(f'{len(sheets)}人 x {args.entries}件のワークブックを作成しました: {args.path}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
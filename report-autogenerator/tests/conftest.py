@@ -0,0 +1,5 @@
+import os
+import sys
+
+# モジュールはreport-autogenerator/直下に並んでいるため、テストからもそのままimportできるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
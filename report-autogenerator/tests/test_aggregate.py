@@ -0,0 +1,58 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+from aggregate import (
+    NUM_DAYS, category_totals, cohort_count_matrices, cohort_summary, count_matrix, day_totals, displayed_cohort,
+)
+
+def _frame(seed, rows=200):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'DAY': rng.integers(1, NUM_DAYS + 1, rows),
+        # 0は未分類
+        'API検証': rng.integers(0, 13, rows),
+        '入力内容': [f'記録{i}' for i in range(rows)],
+    })
+
+def test_counts_match_counter_and_value_counts():
+    df = _frame(1)
+    matrix = count_matrix(df)
+    counts = Counter(df['API検証'])
+    assert category_totals(matrix) == {c: counts.get(c, 0) for c in range(1, 13)}
+    assert category_totals(matrix) == df['API検証'].value_counts().reindex(range(1, 13), fill_value=0).to_dict()
+    assert day_totals(matrix) == df.groupby('DAY').size().to_dict()
+
+def test_cells_match_pivot_table():
+    df = _frame(2)
+    pivot = pd.pivot_table(df, values='入力内容', index='API検証', columns='DAY',
+                           aggfunc='count', fill_value=0).reindex(range(0, 13), fill_value=0)
+    assert (count_matrix(df) == pivot.to_numpy()).all()
+
+def test_cohort_matrices_match_per_student_counts():
+    frames = [_frame(seed, rows) for seed, rows in [(3, 50), (4, 0), (5, 120)]]
+    frames[1] = frames[1].astype({'DAY': int, 'API検証': int})
+    matrices = cohort_count_matrices(frames)
+    assert matrices.shape == (3, 13, NUM_DAYS)
+    for df, matrix in zip(frames, matrices):
+        assert (matrix == count_matrix(df, NUM_DAYS)).all()
+    assert matrices[1].sum() == 0
+
+def test_missing_and_out_of_range_values():
+    df = pd.DataFrame({'DAY': [1, None, 7, 2], 'API検証': [3, 4, 5, 99]})
+    matrix = count_matrix(df)
+    # 日の欠損は除外し、データ中の最大日まで列を広げる
+    assert matrix.shape == (13, 7)
+    assert matrix[3, 0] == 1 and matrix[5, 6] == 1
+    # 分類外の値は未分類（行0）
+    assert matrix[0, 1] == 1
+    assert matrix.sum() == 3
+
+def test_displayed_cohort_rounds_only_the_shown_values():
+    matrices = cohort_count_matrices([_frame(seed, rows) for seed, rows in [(6, 31), (7, 45), (8, 52)]])
+    summary = cohort_summary(matrices)
+    radar = displayed_cohort(summary, 'radar')
+    assert radar == {'category': {'mean': [round(v, 1) for v in summary['category']['mean']]}}
+    stats = displayed_cohort(summary, 'stats')
+    assert set(stats) == {'category', 'day', 'total', 'classified'}
+    assert stats['total']['mean'] == round(summary['total']['mean'], 1)
+    assert 'cell' not in stats and 'p90' not in stats['category']
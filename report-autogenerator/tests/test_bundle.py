@@ -0,0 +1,46 @@
+import io
+import os
+import zipfile
+from bundle import bundle_files, iter_zip, write_bundle
+from manifest import Manifest
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+def test_iter_zip_round_trip_across_chunks(tmp_path):
+    png = os.urandom(300_000)
+    text = ('記録\n' * 50_000).encode('utf-8')
+    files = [('a/a_radar.png', _write(tmp_path / 'a_radar.png', png)),
+             ('a/notes.txt', _write(tmp_path / 'notes.txt', text))]
+    chunks = list(iter_zip(files, chunk_size=64 * 1024))
+    assert len(chunks) > 2
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+        assert zf.testzip() is None
+        assert zf.read('a/a_radar.png') == png
+        assert zf.read('a/notes.txt') == text
+        # PNG・PDFは再圧縮しない
+        assert zf.getinfo('a/a_radar.png').compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo('a/notes.txt').compress_type == zipfile.ZIP_DEFLATED
+
+def test_bundle_groups_files_by_student(tmp_path):
+    output = tmp_path / 'output'
+    output.mkdir()
+    for name in ['M1_a_report.pdf', 'M1_a_category3_wordcloud.png', 'M4_b_stats.pdf', 'memo.txt']:
+        _write(output / name, b'data')
+    # manifestの記録はファイル名より優先する
+    _write(output / 'extra.pdf', b'data')
+    manifest = Manifest(str(output))
+    manifest.record('M4_b', 'stats', 'key', 1, ['M4_b_stats.pdf', 'extra.pdf'])
+    manifest.save()
+
+    arcnames = {arcname for arcname, _ in bundle_files(str(output))}
+    assert arcnames == {'M1_a/M1_a_report.pdf', 'M1_a/M1_a_category3_wordcloud.png',
+                        'M4_b/M4_b_stats.pdf', 'M4_b/extra.pdf'}
+
+    dest = str(tmp_path / 'out.zip')
+    assert write_bundle(dest, str(output), students={'M4_b'}) == 2
+    with zipfile.ZipFile(dest) as zf:
+        assert sorted(zf.namelist()) == ['M4_b/M4_b_stats.pdf', 'M4_b/extra.pdf']
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+import cohort_pdf
+from cohort_pdf import create_cohort_pdf
+
+pymupdf = pytest.importorskip('pymupdf')
+
+def _students(events):
+    for i, name in enumerate(['M1_a', 'M1_b', 'M4_c']):
+        events.append(('read', name))
+        rows = 40 * (i + 1)
+        df = pd.DataFrame({'DAY': [d % 5 + 1 for d in range(rows)], 'API検証': [d % 12 + 1 for d in range(rows)],
+                           '入力内容': [f'{name}の記録{d}' for d in range(rows)]})
+        yield name, df, {}
+
+def test_one_pdf_with_a_bookmark_per_student_and_section(tmp_path, monkeypatch):
+    events = []
+    draw = cohort_pdf.Bookmark.draw
+    monkeypatch.setattr(cohort_pdf.Bookmark, 'draw', lambda self: events.append(('draw', self.title)) or draw(self))
+    path = str(tmp_path / 'cohort.pdf')
+    assert create_cohort_pdf(_students(events), path, sections=('stats', 'report')) == 3
+    # 前の学生の分を描画し終えてから次の学生の記録を読む
+    assert events == [
+        ('read', 'M1_a'), ('draw', 'M1_a'), ('draw', '統計'), ('draw', '記録'),
+        ('read', 'M1_b'), ('draw', 'M1_b'), ('draw', '統計'), ('draw', '記録'),
+        ('read', 'M4_c'), ('draw', 'M4_c'), ('draw', '統計'), ('draw', '記録'),
+    ]
+
+    with pymupdf.open(path) as pdf:
+        toc = [(level, title) for level, title, _ in pdf.get_toc()]
+        assert toc == [(1, 'M1_a'), (2, '統計'), (2, '記録'), (1, 'M1_b'), (2, '統計'), (2, '記録'),
+                       (1, 'M4_c'), (2, '統計'), (2, '記録')]
+        pages = {title: page for _, title, page in pdf.get_toc() if title.startswith('M')}
+        # 各学生は新しいページから始まり、長い記録は次のページに続く
+        assert pages['M1_a'] == 1 and pages['M1_a'] < pages['M1_b'] < pages['M4_c']
+        assert 'M4_cの記録119' in ''.join(page.get_text() for page in pdf)
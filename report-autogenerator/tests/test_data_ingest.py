@@ -0,0 +1,43 @@
+import numpy as np
+import pyarrow as pa
+from aggregate import NUM_DAYS, count_matrix
+from data_ingest import compact_table, frame_memory
+
+def _table():
+    return pa.table({
+        'student': pa.array(['M1_a', 'M1_a', 'M4_b', 'M4_b', 'M4_b'], pa.string()),
+        'DAY': pa.array([1, 2, None, 3, 500], pa.int64()),
+        'API検証': pa.array([3, 12, 5, None, -1], pa.int64()),
+        '入力内容': pa.array(['記録1', None, '記録3', '記録4', '記録5'], pa.string()),
+    })
+
+def test_compact_schema():
+    df = compact_table(_table())
+    assert df['DAY'].dtype == np.int8
+    assert df['API検証'].dtype == np.int8
+    assert df['student'].dtype == 'category'
+    assert list(df['student'].cat.categories) == ['M1_a', 'M4_b']
+    assert df['入力内容'].dtype.storage == 'pyarrow'
+
+def test_compact_values_round_trip():
+    df = compact_table(_table())
+    assert df['student'].astype(str).tolist() == ['M1_a', 'M1_a', 'M4_b', 'M4_b', 'M4_b']
+    # 空欄・int8に収まらない値はコード0（日は集計外、分類は未分類）
+    assert df['DAY'].tolist() == [1, 2, 0, 3, 0]
+    assert df['API検証'].tolist() == [3, 12, 5, 0, 0]
+    assert df['入力内容'].iloc[0] == '記録1'
+    assert df['入力内容'].isna().tolist() == [False, True, False, False, False]
+
+def test_renderers_count_the_same_as_the_plain_form():
+    table = _table()
+    # 実習日数の範囲内では同じ（範囲外の日はどちらの形式でも数えない）
+    assert (count_matrix(compact_table(table), NUM_DAYS) == count_matrix(table.to_pandas(), NUM_DAYS)).all()
+
+def test_compact_form_is_smaller():
+    table = pa.table({
+        'student': pa.array(['M1_学生'] * 1000, pa.string()),
+        'DAY': pa.array([1] * 1000, pa.int64()),
+        'API検証': pa.array([3] * 1000, pa.int64()),
+    })
+    plain, compact = frame_memory(table.to_pandas()), frame_memory(compact_table(table))
+    assert all(compact[c] < plain[c] for c in plain)
@@ -0,0 +1,38 @@
+from dedup import THRESHOLD, find_duplicates, shingles
+
+BASE = '地域の診療所では聴診・打診・エコー・心電図などの大掛かりな機械がなくてもできる検査が重要だとわかった'
+
+def _entries():
+    return [
+        ('r1', 'A', 0, BASE),
+        ('r1', 'A', 1, '訪問診療に同行し、在宅酸素療法を受けている患者さんの生活環境を見学した。'),
+        # 同じ学生が句読点だけ変えて貼り直した記録
+        ('r1', 'A', 2, BASE + '。'),
+        # 他の学生がほぼ同じ内容を書いた記録
+        ('r1', 'B', 0, BASE.replace('重要だと', '大切だと')),
+        ('r1', 'B', 1, '特になし'),
+        ('r1', 'B', 2, '特になし'),
+    ]
+
+def test_short_texts_are_not_compared():
+    assert shingles('特になし') is None
+
+def test_finds_near_duplicates_within_and_across_students():
+    rows = find_duplicates(_entries())
+    found = {(student, seq): (match_student, match_seq, similarity, excluded)
+             for _, student, seq, _, _, match_student, match_seq, similarity, excluded in rows}
+
+    assert set(found) == {('A', 0), ('A', 2), ('B', 0)}
+    assert found[('A', 2)][:2] == ('A', 0)
+    assert all(similarity >= THRESHOLD for _, _, similarity, _ in found.values())
+    # 同じ学生の2件目だけを集計から除き、他の学生と同じ内容の記録は数える
+    assert found[('A', 2)][3] is True
+    assert found[('A', 0)][3] is False
+    assert found[('B', 0)][3] is False
+
+def test_all_rows_of_a_group_share_the_group_number():
+    rows = find_duplicates(_entries())
+    assert len({row[3] for row in rows}) == 1
+
+def test_threshold_is_applied():
+    assert find_duplicates(_entries(), threshold=1.01) == []
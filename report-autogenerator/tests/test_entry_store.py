@@ -0,0 +1,63 @@
+import os
+import pytest
+from openpyxl import load_workbook
+from aggregate import count_matrix
+from entry_store import EntryStore
+from synth_data import generate_workbook
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'round1.xlsx')
+    generate_workbook(path, students=3, entries=10, seed=1)
+    return path
+
+def test_ingest_is_idempotent(tmp_path, workbook):
+    cache_dir = str(tmp_path / 'cache')
+    with EntryStore(str(tmp_path / 'entries.sqlite3')) as store:
+        assert store.ingest(workbook, cache_dir) == 3
+        entries = store.entries()
+        assert len(entries) == 30
+
+        assert store.ingest(workbook, cache_dir) == 0
+        assert len(store.entries()) == 30
+        assert store.rounds() == [('round1.xlsx', 'round1', '2025-07-28', 3)]
+
+def test_ingest_replaces_only_changed_sheets(tmp_path, workbook):
+    cache_dir = str(tmp_path / 'cache')
+    with EntryStore(str(tmp_path / 'entries.sqlite3')) as store:
+        store.ingest(workbook, cache_dir)
+        wb = load_workbook(workbook)
+        sheet = wb.worksheets[1]
+        sheet.cell(2, 3).value = '書き換えた記録'
+        wb.save(workbook)
+        # mtimeの解像度が粗い環境でもハッシュを計算し直すようにする
+        os.utime(workbook, ns=(0, 0))
+
+        assert store.ingest(workbook, cache_dir) == 1
+        entries = store.entries(sheet.title)
+        assert len(entries) == 10
+        assert '書き換えた記録' in set(entries['入力内容'])
+        assert len(store.entries()) == 30
+
+def test_count_matrices_match_the_entries(tmp_path, workbook):
+    with EntryStore(str(tmp_path / 'entries.sqlite3')) as store:
+        store.ingest(workbook, str(tmp_path / 'cache'))
+        students = {student: source for student, (source, _) in store.students().items()}
+        matrices = store.count_matrices(students)
+        for student, matrix in zip(students, matrices):
+            assert (matrix == count_matrix(store.entries(student), matrices.shape[2])).all()
+
+def test_rounds_append_and_latest_round_wins(tmp_path, workbook):
+    cache_dir = str(tmp_path / 'cache')
+    later = str(tmp_path / 'round2.xlsx')
+    # 同じ学生（同じシード）の次の回
+    generate_workbook(later, students=3, entries=5, seed=1)
+    with EntryStore(str(tmp_path / 'entries.sqlite3')) as store:
+        store.ingest(later, cache_dir, start_date='2025-09-01')
+        store.ingest(workbook, cache_dir)
+        assert [r[:3] for r in store.rounds()] == [
+            ('round1.xlsx', 'round1', '2025-07-28'), ('round2.xlsx', 'round2', '2025-09-01')]
+        # 以前の回の記録も残る
+        assert len(store.entries()) == 45
+        assert {source for source, _ in store.students().values()} == {'round2.xlsx'}
+        assert store.day_dates('round2.xlsx')[1] == '2025/9/1'
@@ -0,0 +1,59 @@
+from manifest import Manifest, artifact_key
+from pipeline import stage_options
+
+SUMMARY = {
+    'students': 2,
+    'category': {'mean': [0.0] + [1.04] * 12, 'p50': [0.0] + [1.0] * 12},
+    'day': {'mean': [2.5] * 5},
+    'total': {'mean': 12.5},
+    'classified': {'mean': 12.48, 'p50': 12.0},
+    'cell': {'mean': [[0.0] * 5] * 13},
+}
+
+def test_artifact_key_changes_with_each_input():
+    base = artifact_key('hash', 'stats', 1, ['dep'])
+    assert artifact_key('hash', 'stats', 1, ['dep']) == base
+    assert artifact_key('other', 'stats', 1, ['dep']) != base
+    assert artifact_key('hash', 'report', 1, ['dep']) != base
+    assert artifact_key('hash', 'stats', 2, ['dep']) != base
+    assert artifact_key('hash', 'stats', 1, ['other']) != base
+    assert artifact_key('hash', 'stats', 1, ['dep'], {'profile': 'screen'}) != base
+
+def test_manifest_is_fresh_only_with_same_key_and_outputs(tmp_path):
+    manifest = Manifest(str(tmp_path))
+    (tmp_path / 'a_stats.pdf').write_bytes(b'pdf')
+    manifest.record('a', 'stats', 'key1', 1, ['a_stats.pdf'])
+    assert manifest.is_fresh('a', 'stats', 'key1')
+    assert not manifest.is_fresh('a', 'stats', 'key2')
+    (tmp_path / 'a_stats.pdf').unlink()
+    assert not manifest.is_fresh('a', 'stats', 'key1')
+
+def test_record_removes_outputs_no_longer_produced(tmp_path):
+    manifest = Manifest(str(tmp_path))
+    (tmp_path / 'a_1.png').write_bytes(b'png')
+    (tmp_path / 'a_2.png').write_bytes(b'png')
+    manifest.record('a', 'wordcloud', 'key1', 1, ['a_1.png', 'a_2.png'])
+    manifest.record('a', 'wordcloud', 'key2', 1, ['a_1.png'])
+    assert not (tmp_path / 'a_2.png').exists()
+    assert (tmp_path / 'a_1.png').exists()
+
+def test_cohort_key_ignores_changes_below_display_precision():
+    options = {'radar_mode': 'vector', 'cohort': SUMMARY}
+    nudged = dict(SUMMARY, category={'mean': [0.0] + [1.03] * 12, 'p50': SUMMARY['category']['p50']},
+                  cell={'mean': [[1.0] * 5] * 13})
+    assert stage_options('stats', options) == stage_options('stats', dict(options, cohort=nudged))
+
+    changed = dict(SUMMARY, total={'mean': 13.0})
+    assert stage_options('stats', options) != stage_options('stats', dict(options, cohort=changed))
+    # レーダーチャートは分類ごとの平均しか表示しない
+    assert stage_options('radar', options) == stage_options('radar', dict(options, cohort=changed))
+
+def test_duplicate_digests_only_key_the_stages_that_use_them():
+    options = {
+        'radar_mode': 'vector', 'duplicates': {'a': {'marks': 'm', 'excluded': 'x'}},
+    }
+    assert stage_options('report', options, 'a')['duplicates'] == 'm'
+    assert 'duplicates' not in stage_options('report', options, 'b')
+    assert 'excluded' not in stage_options('stats', options, 'a')
+    assert stage_options('stats', dict(options, exclude_duplicates=True), 'a')['excluded'] == 'x'
+    assert stage_options('wordcloud', dict(options, exclude_duplicates=True), 'a') == {'profile': 'print'}
@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import LongTable, Paragraph
+import pdf_report
+from fonts import register_pdf_font
+
+@pytest.fixture
+def story():
+    register_pdf_font()
+    styles = pdf_report.add_report_styles(getSampleStyleSheet())
+    return lambda df: pdf_report.create_report_story(df, '学生', styles, 450)
+
+def _sections(story):
+    """storyを [(分類見出し, [(Day表記, [記録...])...])...] にまとめる"""
+    sections = []
+    for flowable in story:
+        if isinstance(flowable, Paragraph) and flowable.getPlainText().startswith('■'):
+            sections.append((flowable.getPlainText(), []))
+        elif isinstance(flowable, LongTable):
+            cells = [row[0].getPlainText() for row in flowable._cellvalues]
+            sections[-1][1].append((cells[0], cells[1:]))
+    return sections
+
+def _nested_loop_sections(df):
+    """分類×日ごとに絞り込んでいた以前の組み立て方"""
+    sections = []
+    for category, name in pdf_report.CATEGORY_NAMES.items():
+        category_entries = df[df['API検証'] == category]
+        if category_entries.empty:
+            continue
+        days = []
+        for day in sorted(category_entries['DAY'].unique()):
+            day_entries = category_entries[category_entries['DAY'] == day]
+            days.append((f'Day {day}', day_entries['入力内容'].astype(str).tolist()))
+        sections.append((f'■ {name}（API分類{category}）', days))
+    return sections
+
+def test_groups_match_the_nested_loop(story):
+    df = pd.DataFrame({
+        'DAY': [2, 1, 1, 3, 2, 1, 5, 1],
+        'API検証': [3, 3, 12, 3, 0, 3, 1, 12],
+        '入力内容': ['c3d2', 'c3d1a', 'c12d1a', 'c3d3', '未分類', 'c3d1b', 'c1d5', 'c12d1b'],
+    })
+    sections = _sections(story(df))
+    assert sections == _nested_loop_sections(df)
+    # 分類は番号順、同じ日の記録は元の行順
+    assert [title for title, _ in sections] == [
+        '■ 医療倫理（API分類1）', '■ 医学的知識（API分類3）', '■ 社会医学（API分類12）']
+    assert sections[1][1][0] == ('Day 1', ['c3d1a', 'c3d1b'])
+
+def test_long_days_split_with_repeated_header(story):
+    df = pd.DataFrame({'DAY': [1] * 80, 'API検証': [2] * 80, '入力内容': ['記録'] * 80})
+    tables = [f for f in story(df) if isinstance(f, LongTable)]
+    assert len(tables) == 1
+    assert tables[0].repeatRows == 1
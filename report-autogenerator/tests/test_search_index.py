@@ -0,0 +1,79 @@
+import os
+import pytest
+from openpyxl import Workbook
+from entry_store import EntryStore
+from search_index import SearchIndex
+
+pytest.importorskip('MeCab')
+
+def _write_workbook(path, sheets):
+    """{シート名: [入力内容, ...]} からoverall＋学生シートのワークブックを作成"""
+    wb = Workbook()
+    wb.active.title = 'overall'
+    wb.active.append(['date/time', 'DAY', 'ID', '入力内容', 'API検証', None])
+    for sheet, texts in sheets.items():
+        ws = wb.create_sheet(sheet)
+        ws.append(['DAY', 'ID', '入力内容', 'API検証'])
+        for i, text in enumerate(texts):
+            ws.append([i + 1, sheet, text, 2])
+    wb.save(path)
+    # mtimeの解像度が粗い環境でもハッシュを計算し直すようにする
+    os.utime(path, ns=(0, 0))
+
+SHEETS = {
+    'M1_a': ['在宅医療の現場を見学した', '心電図の読み方を学んだ'],
+    'M1_b': ['在宅酸素療法の患者さんを訪問し、在宅での生活を見た',
+             '在宅医療について、地域の診療所の医師が訪問診療の流れや多職種との連携を丁寧に説明してくれた'],
+}
+
+@pytest.fixture
+def ingest(tmp_path):
+    """シートの内容でワークブックを書き直し、記録ストアに取り込む"""
+    def ingest(sheets):
+        workbook = str(tmp_path / 'round1.xlsx')
+        _write_workbook(workbook, sheets)
+        with EntryStore(str(tmp_path / 'entries.sqlite3')) as store:
+            store.ingest(workbook, str(tmp_path / 'cache'))
+    return ingest
+
+@pytest.fixture
+def index(tmp_path, ingest):
+    from tokenizer import TokenCache
+    ingest(SHEETS)
+    cache = TokenCache('test', str(tmp_path / 'tokens.sqlite3'))
+    with SearchIndex(str(tmp_path / 'entries.sqlite3'), cache=cache) as index:
+        yield index
+    cache.close()
+
+def test_bm25_ranks_by_term_frequency_and_length(index):
+    assert index.update() == 2
+    hits = index.search('在宅')
+    # 語を2回含む記録が先、同じ1回なら短い記録が先
+    assert hits['入力内容'].tolist() == [
+        '在宅酸素療法の患者さんを訪問し、在宅での生活を見た',
+        '在宅医療の現場を見学した',
+        '在宅医療について、地域の診療所の医師が訪問診療の流れや多職種との連携を丁寧に説明してくれた',
+    ]
+    assert hits['score'].is_monotonic_decreasing
+    assert index.search('在宅', student='M1_a')['student'].tolist() == ['M1_a']
+    # 活用する語は基本形で引ける
+    assert index.search('学ぶ')['入力内容'].tolist() == ['心電図の読み方を学んだ']
+    assert index.search('腹部エコー').empty
+
+def test_update_reindexes_only_changed_sheets(index, ingest):
+    index.update()
+    assert index.update() == 0
+    assert len(index.search('在宅')) == 3
+
+    ingest({
+        'M1_a': ['在宅医療の現場を見学した', '心電図の読み方を学んだ'],
+        'M1_b': ['腹部エコーの手技を見学した'],
+    })
+    assert index.update() == 1
+    assert index.search('在宅')['student'].tolist() == ['M1_a']
+    assert index.search('エコー')['student'].tolist() == ['M1_b']
+
+    # なくなったシートは索引からも消える
+    ingest({'M1_b': ['腹部エコーの手技を見学した']})
+    assert index.update() == 1
+    assert index.search('在宅').empty
@@ -0,0 +1,55 @@
+import itertools
+import json
+import pytest
+import tokenizer
+from tokenizer import TokenCache, tokenize_texts
+
+def _tokens(text):
+    return [[text, '名詞', '*']]
+
+@pytest.fixture
+def clock(monkeypatch):
+    """last_usedの順序が確定するよう、呼ばれるたびに1秒進む時計にする"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(tokenizer.time, 'time', lambda: float(next(ticks)))
+
+def _size(text):
+    return len(json.dumps(_tokens(text), ensure_ascii=False).encode('utf-8'))
+
+def _cached(cache, texts):
+    """last_usedを更新せずに、キャッシュに残っているテキストを返す"""
+    keys = {row[0] for row in cache.conn.execute('SELECT key FROM tokens')}
+    return {t for t in texts if cache.key(t) in keys}
+
+def test_round_trip_is_keyed_by_dictionary_version(tmp_path):
+    path = str(tmp_path / 'tokens.sqlite3')
+    cache = TokenCache('dict-1', path)
+    cache.put_many({'診療所': _tokens('診療所')})
+    assert cache.get_many(['診療所', '訪問']) == {'診療所': _tokens('診療所')}
+    cache.close()
+    # 辞書が変わると同じテキストでも使わない
+    assert TokenCache('dict-2', path).get_many(['診療所']) == {}
+
+def test_evicts_least_recently_used_down_to_ratio(tmp_path, clock):
+    texts = ['記録1', '記録2', '記録3', '記録4', '記録5']
+    cache = TokenCache('dict', str(tmp_path / 'tokens.sqlite3'), max_bytes=int(_size('記録1') * 4.5))
+    for text in texts[:4]:
+        cache.put_many({text: _tokens(text)})
+    assert _cached(cache, texts) == set(texts[:4])
+
+    # 読み出した記録は最近使ったものとして残る
+    cache.get_many(['記録1'])
+    cache.put_many({'記録5': _tokens('記録5')})
+    assert cache.total_bytes() <= cache.max_bytes * tokenizer.EVICT_RATIO
+    assert _cached(cache, texts) == {'記録1', '記録4', '記録5'}
+
+def test_tokenize_texts_parses_only_uncached_texts(tmp_path, monkeypatch):
+    cache = TokenCache('dict', str(tmp_path / 'tokens.sqlite3'))
+    cache.put_many({'既知': _tokens('既知')})
+    parsed = []
+    monkeypatch.setattr(tokenizer, 'tokenize', lambda text, mecab: parsed.append(text) or _tokens(text))
+
+    results = tokenize_texts(['既知', '未知', '未知', None], mecab=None, cache=cache)
+    assert results == {'既知': _tokens('既知'), '未知': _tokens('未知')}
+    assert parsed == ['未知']
+    assert _cached(cache, ['未知']) == {'未知'}
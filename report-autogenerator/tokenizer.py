@@ -0,0 +1,229 @@
+import os
+import json
+import contextlib
+import time
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from instrument import span
+
+# トークンキャッシュの保存先と上限サイズ
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'tokens.sqlite3')
+MAX_CACHE_BYTES = 64 * 1024 * 1024  # 超えたら古いものから削除
+EVICT_RATIO = 0.8                   # 削除後のサイズ（上限に対する割合）
+
+# 並列解析で1回にワーカーへ送るテキスト数
+BATCH_CHUNK_SIZE = 256
+
+# ワーカープロセスごとのMeCab.Tagger
+_worker_tagger = None
+
+def dictionary_version(mecab):
+    """MeCab辞書の識別子（辞書が変わるとキャッシュは使われなくなる）"""
+    parts = []
+    info = mecab.dictionary_info()
+    while info:
+        parts.append(f'{os.path.basename(info.filename)}:{info.version}:{info.size}')
+        info = info.next
+    return '|'.join(parts)
+
+def tokenize(text, mecab):
+    """
+    テキストを形態素解析
+
+    Returns:
+        list: [表層形, 品詞, 基本形] のリスト（基本形がない語は '*'）
+    """
+    tokens = []
+    node = mecab.parseToNode(text)
+    while node:
+        # 品詞情報を分割
+        features = node.feature.split(',')
+        if features[0] != 'BOS/EOS':
+            tokens.append([node.surface, features[0], features[6] if len(features) > 6 else '*'])
+        node = node.next
+    return tokens
+
+def actions_from_tokens(tokens):
+    """トークン列から動詞の基本形（原形）を抽出"""
+    return [base for _, pos, base in tokens if pos == '動詞' and base != '*']
+
+class TokenCache:
+    """
+    形態素解析結果のディスクキャッシュ（SQLite）
+
+    キーはテキストと辞書バージョンのハッシュ。合計サイズがmax_bytesを超えると
+    最後に使われた時刻が古いものから削除する
+    """
+
+    def __init__(self, dict_version, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.dict_version = dict_version
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 複数のワーカープロセスから同時に使えるようにWALモードにする
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS tokens ('
+            ' key TEXT PRIMARY KEY, tokens TEXT NOT NULL,'
+            ' size INTEGER NOT NULL, last_used REAL NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tokens_last_used ON tokens(last_used)')
+        self.conn.commit()
+
+    def key(self, text):
+        return hashlib.sha1(f'{self.dict_version}\0{text}'.encode('utf-8')).hexdigest()
+
+    def get_many(self, texts):
+        """キャッシュ済みのテキストについて {テキスト: トークン列} を返す"""
+        keys = {self.key(t): t for t in set(texts)}
+        found = {}
+        key_list = list(keys)
+        # SQLiteの変数上限を超えないよう分割して問い合わせる
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i:i + 500]
+            rows = self.conn.execute(
+                f'SELECT key, tokens FROM tokens WHERE key IN ({",".join("?" * len(chunk))})', chunk
+            )
+            for key, tokens in rows:
+                found[keys[key]] = json.loads(tokens)
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                'UPDATE tokens SET last_used = ? WHERE key = ?',
+                [(now, self.key(t)) for t in found]
+            )
+            self.conn.commit()
+        return found
+
+    def put_many(self, results):
+        """{テキスト: トークン列} を保存し、上限を超えていれば古いものを削除"""
+        if not results:
+            return
+        now = time.time()
+        rows = []
+        for text, tokens in results.items():
+            data = json.dumps(tokens, ensure_ascii=False)
+            rows.append((self.key(text), data, len(data.encode('utf-8')), now))
+        self.conn.executemany('INSERT OR REPLACE INTO tokens VALUES (?, ?, ?, ?)', rows)
+        self.conn.commit()
+        self.evict()
+
+    def total_bytes(self):
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM tokens').fetchone()[0]
+
+    def evict(self):
+        """合計サイズが上限を超えたら、新しいものからEVICT_RATIO分だけ残して削除"""
+        if self.total_bytes() <= self.max_bytes:
+            return
+        self.conn.execute(
+            'DELETE FROM tokens WHERE key IN ('
+            ' SELECT key FROM (SELECT key, SUM(size) OVER ('
+            '  ORDER BY last_used DESC, key ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW) AS kept FROM tokens)'
+            ' WHERE kept > ?)',
+            (int(self.max_bytes * EVICT_RATIO),)
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def tokenize_texts(texts, mecab, cache=None):
+    """
+    複数テキストを形態素解析（キャッシュがあれば未解析のものだけ解析）
+
+    Returns:
+        dict: {テキスト: トークン列}
+    """
+    texts = [t for t in texts if isinstance(t, str)]
+    results = cache.get_many(texts) if cache is not None else {}
+    with span('tokenize.mecab'):
+        missing = {t: tokenize(t, mecab) for t in set(texts) - set(results)}
+    if cache is not None:
+        cache.put_many(missing)
+    results.update(missing)
+    return results
+
+def init_tokenizer_worker(mecab=None):
+    """
+    ワーカー起動時にMeCab.Taggerを1つだけ用意（batch_tokenizeのpoolに渡すプールの初期化で呼ぶ）
+
+    mecabを渡すとそのTaggerを使う（ワーカーが他の用途で作成済みの場合）
+    """
+    global _worker_tagger
+    if mecab is None:
+        import MeCab
+        mecab = MeCab.Tagger()
+    _worker_tagger = mecab
+
+def _tokenize_chunk(texts):
+    return [tokenize(t, _worker_tagger) for t in texts]
+
+def batch_tokenize(texts, workers=None, cache=None, mecab=None, pool=None):
+    """
+    全テキストをプロセスプールで並列に形態素解析（キャッシュ済みのものは解析しない）
+
+    Parameters:
+        texts (iterable): テキスト（文字列以外は無視）
+        workers (int): 並列プロセス数（既定: CPUコア数）
+        cache (TokenCache): 解析結果のキャッシュ
+        mecab (MeCab.Tagger): 件数が少なく並列化しない場合に使うTagger
+        pool (ProcessPoolExecutor): 指定するとプロセスを起動せずこのプールで解析する
+            （ワーカーの初期化でinit_tokenizer_workerを呼んだもの）
+
+    Returns:
+        dict: {テキスト: トークン列}
+    """
+    texts = {t for t in texts if isinstance(t, str)}
+    results = cache.get_many(texts) if cache is not None else {}
+    missing = sorted(texts - set(results))
+
+    with span('tokenize.batch'):
+        if len(missing) <= BATCH_CHUNK_SIZE or (workers == 1 and pool is None):
+            # プロセス起動のほうが高くつく件数は親プロセスで解析
+            if mecab is None:
+                import MeCab
+                mecab = MeCab.Tagger()
+            parsed = {t: tokenize(t, mecab) for t in missing}
+        else:
+            chunks = [missing[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(missing), BATCH_CHUNK_SIZE)]
+            parsed = {}
+            if pool is None:
+                executor = ProcessPoolExecutor(max_workers=workers, initializer=init_tokenizer_worker)
+            else:
+                # 呼び出し側のプールは終了させない
+                executor = contextlib.nullcontext(pool)
+            with executor as pool:
+                for chunk, chunk_tokens in zip(chunks, pool.map(_tokenize_chunk, chunks)):
+                    parsed.update(zip(chunk, chunk_tokens))
+
+    if cache is not None:
+        cache.put_many(parsed)
+    results.update(parsed)
+    return results
+
+def cohort_texts(sheets):
+    """
+    全学生のテキストを (シート名, API分類, テキスト) の一覧にする
+
+    Parameters:
+        sheets (iterable): (シート名, DataFrame) の組
+    """
+    records = []
+    for sheet, df in sheets:
+        for category, text in zip(df['API検証'], df['入力内容']):
+            if isinstance(text, str) and 1 <= category <= 12:
+                records.append((sheet, int(category), text))
+    return records
+
+def group_actions(records, tokens):
+    """
+    解析結果から (シート名, API分類) ごとの動詞の基本形を集める
+
+    Returns:
+        dict: {(シート名, API分類): [動詞の基本形, ...]}
+    """
+    grouped = {}
+    for sheet, category, text in records:
+        grouped.setdefault((sheet, category), []).extend(actions_from_tokens(tokens[text]))
+    return grouped
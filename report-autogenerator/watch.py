@@ -0,0 +1,215 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from data_ingest import DATA_DIR, OVERALL_SHEET, list_workbooks, workbook_key, sheet_hashes, discard_cached
+from manifest import Manifest
+from pipeline import (
+    OUTPUT_DIR, DEFAULT_STAGES, STAGES, COHORT_STAGES, make_pool, resolve_stages, stage_table, run_pipeline,
+)
+from quality import PROFILES, DEFAULT_PROFILE
+
+# ワークブックの更新を確認する間隔（秒）
+POLL_SECONDS = 1.0
+# ファイルの書き込みがこの秒数止まってから読み込む（書き出し途中のファイルを読まない）
+DEBOUNCE_SECONDS = 2.0
+
+class Watcher:
+    """
+    source_data/ のワークブックを監視し、記録が変わった学生の成果物だけを作り直す
+
+    ワーカープロセスは起動時に1回だけ作り、フォント・matplotlib・MeCabを読み込んだまま使い回す。
+    更新を検出したらシートごとの内容ハッシュを前回と比べ、変わった学生の全ステージを先に生成する。
+    全体平均を重ねるステージ（radar・stats）は全体の統計が変わるため、残りの学生の分は
+    その後にまとめて作り直す（途中で次の更新が来たら中断して、新しい変更を優先する）
+    """
+
+    def __init__(self, data_dir=DATA_DIR, output_dir=OUTPUT_DIR, stages=DEFAULT_STAGES, workers=None,
+                 radar_mode='vector', profile=DEFAULT_PROFILE, cohort=True,
+                 poll=POLL_SECONDS, debounce=DEBOUNCE_SECONDS):
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        self.stages = resolve_stages(stages, stage_table(radar_mode))
+        self.workers = workers
+        self.radar_mode = radar_mode
+        self.profile = profile
+        self.cohort = cohort
+        self.poll = poll
+        self.debounce = debounce
+        self.pool = None
+        self.signatures = {}  # ワークブック -> (mtime, サイズ)
+        self.keys = {}        # ワークブック -> キャッシュキー
+        self.hashes = {}      # ワークブック -> {シート名: 内容ハッシュ}
+        self._refresh = None  # 実行中の全体の作り直し (スレッド, キャンセル用のEvent)
+
+    def scan(self):
+        """ワークブックごとの (mtime, サイズ) を取得"""
+        signatures = {}
+        for path in list_workbooks(self.data_dir):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signatures[path] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def wait_for_change(self):
+        """ワークブックが更新され、書き込みがdebounce秒間止まるまで待つ"""
+        interval = min(self.poll, self.debounce)
+        while True:
+            time.sleep(self.poll)
+            current = self.scan()
+            if current == self.signatures:
+                continue
+            settled = time.monotonic()
+            while time.monotonic() - settled < self.debounce:
+                time.sleep(interval)
+                latest = self.scan()
+                if latest != current:
+                    current, settled = latest, time.monotonic()
+            return current
+
+    def diff(self, signatures):
+        """
+        更新されたワークブックをシートごとに前回と比較
+
+        Returns:
+            set: 記録が変わった・追加された学生
+            set: なくなった学生
+        """
+        changed, removed = set(), set()
+        for path in sorted(set(self.signatures) | set(signatures)):
+            if self.signatures.get(path) == signatures.get(path):
+                continue
+            old_key, old = self.keys.get(path), self.hashes.get(path, {})
+            new = {}
+            if path in signatures:
+                try:
+                    key = workbook_key(path)
+                    new = sheet_hashes(path)
+                except Exception as e:
+                    # 壊れたファイルは前回の内容のまま扱い、次に更新されたときに読み直す
+                    print(f'読み込めません: {os.path.basename(path)} ({e})', file=sys.stderr)
+                    continue
+                self.keys[path], self.hashes[path] = key, new
+            else:
+                self.keys.pop(path, None)
+                self.hashes.pop(path, None)
+            if old_key and old_key not in self.keys.values():
+                discard_cached(old_key)
+
+            changed |= {sheet for sheet, h in new.items() if old.get(sheet) != h}
+            removed |= set(old) - set(new)
+        changed.discard(OVERALL_SHEET)
+        removed.discard(OVERALL_SHEET)
+        # 別のワークブックに移っただけの学生は削除しない
+        present = {sheet for hashes in self.hashes.values() for sheet in hashes}
+        return changed, removed - present
+
+    def run_stages(self, sheets=None, cancel_event=None):
+        """ワーカーのプールで生成（sheetsを指定するとその学生だけ）"""
+        try:
+            failed = run_pipeline(
+                stages=self.stages, data_dir=self.data_dir, output_dir=self.output_dir, workers=self.workers,
+                radar_mode=self.radar_mode, cancel_event=cancel_event, cohort=self.cohort,
+                profile=self.profile, sheets=sheets, pool=self.pool,
+            )
+        except BrokenProcessPool:
+            # ワーカーが異常終了した場合はプールを作り直し、次の更新時に再実行する
+            print('ワーカーが異常終了したため再起動します', file=sys.stderr)
+            self.pool = make_pool(self.stages, self.workers, self.radar_mode)
+            return
+        for sheet, stage, error in failed:
+            print(f'--- {sheet} - {stage} ---\n{error}', file=sys.stderr)
+
+    def start_refresh(self):
+        """全学生の作り直しをバックグラウンドで開始（最新のものはmanifestで省略される）"""
+        cancel_event = threading.Event()
+        thread = threading.Thread(target=self.run_stages, args=(None, cancel_event), daemon=True)
+        thread.start()
+        self._refresh = (thread, cancel_event)
+
+    def stop_refresh(self):
+        """実行中の全体の作り直しを中断し、実行中のタスクが終わるまで待つ"""
+        if self._refresh is not None:
+            thread, cancel_event = self._refresh
+            cancel_event.set()
+            thread.join()
+            self._refresh = None
+
+    def run(self):
+        """監視を開始（Ctrl+Cで終了）"""
+        self.pool = make_pool(self.stages, self.workers, self.radar_mode)
+        try:
+            # 最初の更新を待つ間にワーカーを起動し、フォント・MeCabなどを読み込んでおく
+            self.pool.submit(os.getpid).result()
+            self.signatures = self.scan()
+            for path in self.signatures:
+                self.keys[path] = workbook_key(path)
+                self.hashes[path] = sheet_hashes(path)
+            print(f'監視中: {self.data_dir}（ステージ: {", ".join(self.stages)}）')
+            # 起動前に変わった分を作り直す（新しい更新が来たら中断）
+            self.start_refresh()
+
+            while True:
+                signatures = self.wait_for_change()
+                self.stop_refresh()
+                started = time.perf_counter()
+                changed, removed = self.diff(signatures)
+                self.signatures = signatures
+                if removed:
+                    manifest = Manifest(self.output_dir)
+                    for sheet in removed:
+                        manifest.forget(sheet)
+                    manifest.save()
+                    print(f'削除: {", ".join(sorted(removed))}')
+                if changed:
+                    self.run_stages(sorted(changed))
+                print(f'更新: {len(changed)}人・削除: {len(removed)}人（{time.perf_counter() - started:.1f}秒）')
+                if self.cohort and (changed or removed) and any(s in COHORT_STAGES for s in self.stages):
+                    # 他の学生の全体平均の表示を新しい統計で作り直す
+                    self.start_refresh()
+        except KeyboardInterrupt:
+            print('監視を終了します')
+        finally:
+            self.stop_refresh()
+            self.pool.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='source_data/ の更新を監視し、記録が変わった学生の成果物を作り直す')
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f'実行するステージ（カンマ区切り、依存ステージは自動で追加）: {",".join(STAGES)}')
+    parser.add_argument('--workers', type=int, default=None, help='並列プロセス数（既定: CPUコア数）')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='監視するExcelファイルのフォルダ')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='出力フォルダ')
+    parser.add_argument('--radar-png', action='store_true',
+                        help='統計PDFにレーダーチャートのPNG画像を埋め込む（既定はベクター図形で直接描画）')
+    parser.add_argument('--no-cohort', action='store_true',
+                        help='レーダーチャート・統計PDFに全体平均などを併記しない（他の学生の作り直しも不要になる）')
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE, help='出力品質のプロファイル')
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS, help='更新を確認する間隔（秒）')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help='ファイルの書き込みがこの秒数止まってから読み込む')
+    args = parser.parse_args(argv)
+
+    try:
+        watcher = Watcher(
+            data_dir=args.data_dir,
+            output_dir=args.output_dir,
+            stages=[s.strip() for s in args.stages.split(',') if s.strip()],
+            workers=args.workers,
+            radar_mode='png' if args.radar_png else 'vector',
+            profile=args.profile,
+            cohort=not args.no_cohort,
+            poll=args.poll,
+            debounce=args.debounce,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    watcher.run()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,98 +1,132 @@
-import pandas as pd
-import MeCab
 from collections import Counter
-from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-from matplotlib import font_manager
 import os
+from data_ingest import DATA_DIR
+from entry_store import iter_students
+from tokenizer import (
+    TokenCache, dictionary_version, tokenize, tokenize_texts, actions_from_tokens,
+    batch_tokenize, cohort_texts, group_actions,
+)
+from fonts import FONT_PATH, setup_matplotlib_font
+from instrument import span
+from quality import get_profile, savefig_options
 
-# 日本語フォントの設定
-font_path = '/usr/share/fonts/opentype/ipafont-gothic/ipag.ttf'
-font_manager.fontManager.addfont(font_path)
-plt.rcParams['font.family'] = 'IPAGothic'
+# 日本語フォント
+font_path = FONT_PATH
 
 def extract_actions(text, mecab):
     """テキストから動詞を抽出"""
-    actions = []
-    node = mecab.parseToNode(text)
-    while node:
-        # 品詞情報を分割
-        features = node.feature.split(',')
-        # 動詞の基本形を取得（動詞の原形）
-        if features[0] == '動詞' and features[6] != '*':
-            actions.append(features[6])  # 基本形を使用
-        node = node.next
-    return actions
+    return actions_from_tokens(tokenize(text, mecab))
 
-def create_wordcloud(word_freq, title):
-    """ワードクラウドの生成"""
-    wordcloud = WordCloud(
-        font_path=font_path,
-        width=800,
-        height=400,
-        background_color='white',
-        colormap='viridis',
-        prefer_horizontal=0.7,
-        min_font_size=12,
-        max_font_size=80
-    ).generate_from_frequencies(word_freq)
+def create_wordcloud(word_freq, title, settings=None):
+    """
+    ワードクラウドの生成
     
-    plt.figure(figsize=(10, 6))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    plt.title(title, fontsize=16, pad=20)
+    pyplotの状態を使わない独立したFigureを返す（呼び出し側で保存後にclear()する）
+    settingsは出力品質の設定（quality.get_profileの戻り値、省略時は印刷用）
+    """
+    settings = settings or get_profile()
+    scale = settings['wordcloud_scale']
+    # 描画ライブラリは実際に生成するときだけ読み込む
+    from wordcloud import WordCloud
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    setup_matplotlib_font()
     
-    return plt
+    with span('wordcloud.generate'):
+        wordcloud = WordCloud(
+            font_path=font_path,
+            width=round(800 * scale),
+            height=round(400 * scale),
+            background_color='white',
+            colormap='viridis',
+            prefer_horizontal=0.7,
+            min_font_size=round(12 * scale),
+            max_font_size=round(80 * scale)
+        ).generate_from_frequencies(word_freq)
+    
+    fig = Figure(figsize=settings['wordcloud_size'])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.imshow(wordcloud.to_array(), interpolation='bilinear')
+    ax.axis('off')
+    ax.set_title(title, fontsize=16, pad=20)
+    
+    return fig
+
+def create_student_wordclouds(df, sheet, output_dir, mecab=None, cache=None, actions=None, profile=None):
+    """
+    1人分のAPI分類ごとのワードクラウドを生成
+
+    cacheにTokenCacheを渡すと、前回解析済みのテキストは形態素解析を省略する
+    actionsに解析済みの {API分類: [動詞, ...]}（batch_tokenizeの結果など）を渡すと解析自体を行わない
+    profileは出力品質のプロファイル名（quality.PROFILES参照、省略時は印刷用）
+
+    Returns:
+        list: 保存した画像ファイルのパス
+    """
+    settings = get_profile(profile)
+    saved = []
+    if actions is None:
+        # 全テキストをまとめて解析（キャッシュの問い合わせも1回）
+        with span('wordcloud.tokenize'):
+            tokens = tokenize_texts(df['入力内容'], mecab, cache)
+        records = cohort_texts([(sheet, df)])
+        actions = {category: verbs for (_, category), verbs in group_actions(records, tokens).items()}
+    
+    # API分類ごとの分析
+    for category in range(1, 13):
+        # テキストから抽出した動詞
+        all_actions = actions.get(category, [])
+        
+        # 動詞の頻度をカウント
+        action_freq = Counter(all_actions)
+        
+        if action_freq:  # 動詞が存在する場合のみワードクラウドを生成
+            # ワードクラウドの生成と保存
+            fig = create_wordcloud(
+                action_freq,
+                f'{sheet} - API分類{category}の行動パターン',
+                settings
+            )
+            out_path = os.path.join(output_dir, f'{sheet}_category{category}_wordcloud.png')
+            try:
+                with span('wordcloud.savefig'):
+                    fig.savefig(
+                        out_path,
+                        bbox_inches='tight',
+                        **savefig_options(settings)
+                    )
+            finally:
+                fig.clear()
+            saved.append(out_path)
+            
+            print(f'{sheet} - API分類{category}のワードクラウドを生成しました')
+    return saved
 
-def analyze_student_actions(excel_path):
-    """学生ごとのテキスト分析とワードクラウド生成"""
+def analyze_student_actions(data_dir=DATA_DIR, workers=None, store_path=None):
+    """学生ごとのテキスト分析とワードクラウド生成（形態素解析は全学生分をまとめて並列実行）"""
+    import MeCab
     mecab = MeCab.Tagger()  # デフォルト設定を使用
-    xls = pd.ExcelFile(excel_path)
+    cache = TokenCache(dictionary_version(mecab))
     
     # 出力ディレクトリの準備
     output_dir = os.path.join(os.path.dirname(__file__), 'output')
     os.makedirs(output_dir, exist_ok=True)
     
-    for sheet in xls.sheet_names:
-        if sheet == 'overall':
-            continue
-            
-        df = pd.read_excel(excel_path, sheet_name=sheet)
-        
-        # API分類ごとの分析
-        for category in range(1, 13):
-            category_texts = df[df['API検証'] == category]['入力内容']
-            
-            if len(category_texts) == 0:
-                continue
-            
-            # テキストから動詞を抽出
-            all_actions = []
-            for text in category_texts:
-                if isinstance(text, str):  # テキストが文字列の場合のみ処理
-                    all_actions.extend(extract_actions(text, mecab))
-            
-            # 動詞の頻度をカウント
-            action_freq = Counter(all_actions)
-            
-            if action_freq:  # 動詞が存在する場合のみワードクラウドを生成
-                # ワードクラウドの生成と保存
-                plt = create_wordcloud(
-                    action_freq,
-                    f'{sheet} - API分類{category}の行動パターン'
-                )
-                plt.savefig(
-                    os.path.join(output_dir, f'{sheet}_category{category}_wordcloud.png'),
-                    bbox_inches='tight',
-                    dpi=300
-                )
-                plt.close()
-                
-                print(f'{sheet} - API分類{category}のワードクラウドを生成しました')
+    # 全学生のテキストを記録ストアから読み、一括で解析して (学生, API分類) ごとの動詞にまとめる
+    sheets = list(iter_students(data_dir, store_path=store_path))
+    records = cohort_texts(sheets)
+    try:
+        tokens = batch_tokenize([text for _, _, text in records], workers, cache, mecab)
+    finally:
+        cache.close()
+    actions = {}
+    for (sheet, category), verbs in group_actions(records, tokens).items():
+        actions.setdefault(sheet, {})[category] = verbs
+    
+    for sheet, df in sheets:
+        create_student_wordclouds(df, sheet, output_dir, actions=actions.get(sheet, {}))
 
 if __name__ == '__main__':
-    # データファイルの処理
-    data_dir = os.path.join(os.path.dirname(__file__), 'source_data')
-    for excel_file in [f for f in os.listdir(data_dir) if f.endswith('.xlsx')]:
-        file_path = os.path.join(data_dir, excel_file)
-        analyze_student_actions(file_path)
\ No newline at end of file
+    # データフォルダの全ワークブックを記録ストアに取り込んで処理
+    analyze_student_actions()